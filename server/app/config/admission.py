@@ -0,0 +1,25 @@
+from app.config.settings import get_settings
+from app.utils.admission import AdmissionController, AdmissionGate
+
+settings = get_settings()
+
+# Health checks must answer under load, and SSE streams would hold a slot for hours
+EXEMPT_PREFIXES = ("/health", "/events", "/docs", "/redoc", "/openapi.json")
+
+# Resumable upload bodies arrive at the speed of a phone's connection; creating
+# and completing uploads stay behind the write gate
+EXEMPT_METHOD_PREFIXES = (("PATCH", "/upload/sessions/"),)
+
+admission_controller = AdmissionController(
+    {
+        name: AdmissionGate(limit, settings.admission_queue_size, settings.admission_queue_timeout_seconds)
+        for name, limit in (
+            ("read", settings.admission_read_limit),
+            ("write", settings.admission_write_limit),
+            ("auth", settings.admission_auth_limit),
+        )
+        if limit > 0
+    },
+    exempt_prefixes=EXEMPT_PREFIXES,
+    exempt_method_prefixes=EXEMPT_METHOD_PREFIXES
+)
@@ -1,4 +1,11 @@
-from sqlalchemy import create_engine, text
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, Session
 from app.config.settings import get_settings
 
@@ -14,6 +21,247 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replicas (e.g. Neon read replicas of the same branch)
+replica_engines = [
+    create_engine(url.strip(), echo=settings.debug, pool_pre_ping=True)
+    for url in settings.database_replica_urls.split(",")
+    if url.strip()
+]
+ReplicaSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    for replica_engine in replica_engines
+]
+
+
+class _ReplicaState:
+    def __init__(self):
+        self.lag: Optional[float] = None  # Seconds behind the primary, None if unknown or unreachable
+        self.sampled_at = float("-inf")  # time.monotonic() when lag was measured
+
+
+class ReplicaRouter:
+    """
+    Decide whether a read can go to a replica.
+
+    Each replica's lag is sampled once per check interval by a background
+    thread, started on first use, so choosing a replica never waits on one: a
+    replica whose replay LSN has reached the primary's current LSN has no lag,
+    otherwise the lag is the age of its last replayed transaction. Replicas
+    lagging more than max_lag are skipped, and so are replicas whose last
+    sample is older than a few check intervals (a hung or unreachable replica
+    stalls only its own sampler).
+
+    For read-your-writes, every commit made on behalf of a user records the
+    time of that write. A replica only serves that user once it is known to
+    have replayed everything up to that moment; until then the user's reads
+    go to the primary. Write times are kept per process, so a read handled
+    by a different worker than the write is only bounded by max_lag.
+    """
+
+    def __init__(self, primary, replicas, max_lag: float, check_interval: float):
+        self._primary = primary
+        self._replicas = replicas
+        self._max_lag = max_lag
+        self._check_interval = check_interval
+        self._states = [_ReplicaState() for _ in replicas]
+        self._writes: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._started = False
+
+    @property
+    def _write_token_ttl(self) -> float:
+        # Past this age any replica that passes the lag check has replayed the write
+        return self._max_lag + 2 * self._check_interval
+
+    def record_write(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._writes[user_id] = now
+            if len(self._writes) > 10000:
+                cutoff = now - self._write_token_ttl
+                self._writes = {uid: at for uid, at in self._writes.items() if at > cutoff}
+
+    def _last_write(self, user_id: Optional[int]) -> Optional[float]:
+        if user_id is None:
+            return None
+        with self._lock:
+            written_at = self._writes.get(user_id)
+            if written_at is not None and time.monotonic() - written_at > self._write_token_ttl:
+                del self._writes[user_id]
+                return None
+            return written_at
+
+    def _measure_lag(self, index: int) -> Optional[float]:
+        with self._primary.connect() as conn:
+            primary_lsn = conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+        with self._replicas[index].connect() as conn:
+            row = conn.execute(text("""
+                SELECT pg_is_in_recovery(),
+                       pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn),
+                       EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+            """), {"lsn": primary_lsn}).fetchone()
+        in_recovery, caught_up, replay_age = row
+        if not in_recovery or caught_up:
+            return 0.0
+        return float(replay_age) if replay_age is not None else None
+
+    @property
+    def _stale_after(self) -> float:
+        return 3 * self._check_interval
+
+    def _sample(self, index: int) -> None:
+        """Measure one replica's lag forever, once per check interval."""
+        state = self._states[index]
+        while True:
+            sampled_at = time.monotonic()
+            try:
+                lag = self._measure_lag(index)
+            except Exception:
+                lag = None  # Unreachable replicas are skipped until the next sample
+            with self._lock:
+                state.lag = lag
+                state.sampled_at = sampled_at
+            time.sleep(max(0.0, self._check_interval - (time.monotonic() - sampled_at)))
+
+    def start(self) -> None:
+        """Start the lag samplers. choose() calls this; calling it again does nothing."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for index in range(len(self._replicas)):
+            threading.Thread(target=self._sample, args=(index,), name=f"replica-lag-{index}", daemon=True).start()
+
+    def choose(self, user_id: Optional[int] = None) -> Optional[int]:
+        """Return the index of a replica that may serve this user, or None for the primary."""
+        if not self._replicas:
+            return None
+
+        if not self._started:
+            self.start()
+
+        written_at = self._last_write(user_id)
+        now = time.monotonic()
+        candidates = []
+        for index, state in enumerate(self._states):
+            with self._lock:
+                lag, sampled_at = state.lag, state.sampled_at
+            if lag is None or lag > self._max_lag or now - sampled_at > self._stale_after:
+                continue
+            # The replica reflected the primary as of (sampled_at - lag); it must postdate the write
+            if written_at is not None and sampled_at - lag <= written_at:
+                continue
+            candidates.append(index)
+
+        if not candidates:
+            return None
+        return candidates[next(self._round_robin) % len(candidates)]
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "replica": index,
+                    "lag_seconds": state.lag,
+                    "sampled_seconds_ago": now - state.sampled_at if state.sampled_at > float("-inf") else None
+                }
+                for index, state in enumerate(self._states)
+            ]
+
+
+replica_router = ReplicaRouter(
+    engine,
+    replica_engines,
+    max_lag=settings.replica_max_lag_seconds,
+    check_interval=settings.replica_check_interval_seconds,
+)
+
+# Optional album shards. Shard 0 is the primary database, which also holds the
+# users table; albums and everything under them live on exactly one shard.
+shard_engines = [engine] + [
+    create_engine(url.strip(), echo=settings.debug, pool_pre_ping=True)
+    for url in settings.database_shard_urls.split(",")
+    if url.strip()
+]
+ShardSessionLocals = [SessionLocal] + [
+    sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+    for shard_engine in shard_engines[1:]
+]
+
+# IDs per table per shard (about 134 million); 16 shards fill the INTEGER range.
+# Images use up their range first: GET /health/shards reports how much of each
+# range is used, and README "Album shards" describes the way past it.
+SHARD_ID_SPAN = 1 << 27
+INTEGER_MAX = 2 ** 31 - 1
+SHARD_ID_WARN_RATIO = 0.8  # Share of a shard's ID range used before migrate and /health/shards warn
+
+# Tables whose IDs reach clients and route requests to a shard
+SHARDED_ID_TABLES = ("albums", "album_members", "images", "audio", "upload_sessions")
+
+T = TypeVar("T")
+
+
+class ShardRouter:
+    """
+    Map albums, and the images, audio and memberships under them, to shards.
+
+    The directory is the ID itself: when sharding is enabled, shard k's
+    sequences hand out IDs in [k * SHARD_ID_SPAN + 1, (k + 1) * SHARD_ID_SPAN]
+    (set up by app.jobs.migrate), so any album-scoped ID names its shard
+    without a lookup and rows created before sharding stay on shard 0.
+    Everything under an album is written on the album's shard, so an image,
+    audio or membership ID routes to the same database as its album.
+
+    New albums are spread over the shards round-robin.
+    """
+
+    def __init__(self, engines, id_span: int):
+        if len(engines) * id_span > INTEGER_MAX + 1:
+            raise RuntimeError(f"At most {(INTEGER_MAX + 1) // id_span} shards fit the INTEGER ID range")
+        self._engines = engines
+        self._id_span = id_span
+        self._round_robin = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(engines), thread_name_prefix="shard-fan-out")
+
+    @property
+    def count(self) -> int:
+        return len(self._engines)
+
+    def id_range(self, shard: int) -> Tuple[int, int]:
+        """First and last ID shard allocates. Without sharding, the whole INTEGER range."""
+        if self.count == 1:
+            return 1, INTEGER_MAX
+        return shard * self._id_span + 1, min((shard + 1) * self._id_span, INTEGER_MAX)
+
+    def shard_for_id(self, row_id: int) -> int:
+        """Shard holding an album-scoped row. IDs outside every range map to shard 0, which doesn't have them."""
+        if self.count == 1:
+            return 0
+        shard = row_id // self._id_span
+        return shard if 0 <= shard < self.count else 0
+
+    def shard_for_new_album(self) -> int:
+        return next(self._round_robin) % self.count
+
+    def fan_out(self, sessions: List[Session], fn: Callable[[Session], T]) -> List[T]:
+        """Call fn with each shard's session concurrently; results are in shard order."""
+        if len(sessions) == 1:
+            return [fn(sessions[0])]
+        return list(self._executor.map(fn, sessions))
+
+
+shard_router = ShardRouter(shard_engines, SHARD_ID_SPAN)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_user_write(session: Session) -> None:
+    """Route the committing user's next reads to the primary until replicas catch up."""
+    user_id = session.info.get("user_id")
+    if user_id is not None:
+        replica_router.record_write(user_id)
+
 
 def get_db() -> Session:
     """Dependency for FastAPI routes to get database session."""
@@ -21,4 +269,85 @@ def get_db() -> Session:
     try:
         yield db
     finally:
+        close_shard_sessions(db)
         db.close()
+
+
+@contextmanager
+def unit_of_work(db: Session):
+    """
+    Run one service operation as a single transaction.
+
+    Repositories only execute statements; the operation commits once when the
+    block completes and rolls back if it raises (including HTTPExceptions).
+    """
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def open_read_session(user_id: Optional[int] = None) -> Session:
+    """Open a session on a replica that is fresh enough for this user, or on the primary."""
+    index = replica_router.choose(user_id)
+    if index is None:
+        return SessionLocal()
+    session = ReplicaSessionLocals[index]()
+    session.info["replica"] = index
+    return session
+
+
+def primary_session(db: Session) -> Session:
+    """
+    A primary session for reads that must not see replica lag, such as filling
+    a cache. db itself unless it is a replica session; otherwise a primary
+    session opened on first use and closed by close_shard_sessions with db.
+    """
+    if db.info.get("replica") is None:
+        return db
+    if "primary_session" not in db.info:
+        db.info["primary_session"] = SessionLocal()
+    return db.info["primary_session"]
+
+
+def shard_session(db: Session, shard: int) -> Session:
+    """
+    The session to use for a shard while serving the request db belongs to.
+
+    Shard 0 is db itself. Other shards get a session opened on first use and
+    kept in db.info, so a request reuses it; close_shard_sessions closes them
+    together with db.
+    """
+    if shard == 0:
+        return db
+    sessions = db.info.setdefault("shard_sessions", {})
+    if shard not in sessions:
+        sessions[shard] = ShardSessionLocals[shard]()
+    return sessions[shard]
+
+
+def album_session(db: Session, row_id: int) -> Session:
+    """The session for the shard holding an album, image, audio, membership or upload session ID."""
+    return shard_session(db, shard_router.shard_for_id(row_id))
+
+
+def all_shard_sessions(db: Session) -> List[Session]:
+    """One session per shard, in shard order."""
+    return [shard_session(db, shard) for shard in range(shard_router.count)]
+
+
+def close_shard_sessions(db: Session) -> None:
+    """Close the shard sessions, and primary session of a replica session, opened for db."""
+    for session in db.info.pop("shard_sessions", {}).values():
+        session.close()
+    primary = db.info.pop("primary_session", None)
+    if primary is not None:
+        close_shard_sessions(primary)
+        primary.close()
+
+
+def open_shard_session(shard: int) -> Session:
+    """Open a standalone session on a shard, for jobs and background tasks."""
+    return ShardSessionLocals[shard]()
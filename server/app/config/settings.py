@@ -9,11 +9,48 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24  # 24 hours
     
+    # Read replicas (optional)
+    database_replica_urls: str = ""  # Comma-separated replica URLs; empty sends every query to the primary
+    replica_max_lag_seconds: float = 5.0  # Replicas further behind than this are skipped
+    replica_check_interval_seconds: float = 1.0  # How often each replica's lag is sampled
+    
+    # Album shards (optional); database_url is shard 0 and also holds the global users table
+    database_shard_urls: str = ""  # Comma-separated URLs of shards 1..N; empty keeps every album on database_url
+    
+    # Admission control (per worker process); a limit of 0 disables that class's gate
+    admission_read_limit: int = 10  # Concurrent GET requests
+    admission_write_limit: int = 5  # Concurrent POST/PUT/PATCH/DELETE requests
+    admission_auth_limit: int = 2  # Concurrent logins/registrations (bcrypt is CPU-bound)
+    admission_queue_size: int = 20  # Requests allowed to wait per class before shedding load
+    admission_queue_timeout_seconds: float = 2.0  # Longest a request waits for a slot
+    admission_retry_after_seconds: int = 1  # Retry-After sent with 503 responses
+    
     # Cloudinary settings
     cloudinary_cloud_name: str = ""
     cloudinary_api_key: str = ""
     cloudinary_api_secret: str = ""
 
+    # Media storage: "cloudinary", or "local" for content-addressed files served by this API
+    storage_backend: str = "cloudinary"
+    local_storage_path: str = "media"  # Directory holding local media files
+    public_base_url: str = "http://localhost:8000"  # Base of the /media URLs stored for local files
+    local_storage_accel_redirect: str = ""  # e.g. "/protected-media/": let nginx send files (X-Accel-Redirect)
+    media_max_upload_bytes: int = 100 * 1024 * 1024  # Largest file the upload endpoints accept
+    upload_staging_path: str = "media/.uploads"  # Partial resumable uploads; every API instance must see the same directory
+    upload_session_ttl_hours: int = 24  # How long a resumable upload can be continued
+
+    # Image ingest pipeline settings
+    image_ingest_workers: int = 2  # Size of the process pool used for Pillow work
+    image_ingest_max_bytes: int = 25 * 1024 * 1024  # Refuse to download originals larger than this
+    image_ingest_allowed_hosts: str = "res.cloudinary.com"  # Comma-separated hosts originals may be fetched from
+
+    # Read-through cache for album listings
+    cache_backend: str = "memory"  # "memory" (per-process LRU), "redis" (shared) or "none"
+    redis_url: str = "redis://localhost:6379/0"
+    cache_max_entries: int = 10000  # LRU capacity of the memory backend
+    cache_ttl_seconds: int = 300  # Upper bound on entry lifetime; invalidation normally happens sooner
+    cache_warm_albums: int = 0  # Busiest albums to preload at startup, 0 disables warming
+
     class Config:
         env_file = ".env"
 
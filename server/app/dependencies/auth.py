@@ -9,14 +9,8 @@ from app.repositories.user_repository import get_user_by_id
 security = HTTPBearer()
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> dict:
-    """
-    Dependency to get the current authenticated user.
-    Use this in your protected routes like: current_user = Depends(get_current_user)
-    """
+def get_token_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
+    """Dependency to get the user ID from a valid access token, without a database lookup."""
     token = credentials.credentials
 
     # Decode token
@@ -47,13 +41,31 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    return user_id
+
+
+def user_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="User not found",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def get_current_user(
+    user_id: int = Depends(get_token_user_id),
+    db: Session = Depends(get_db)
+) -> dict:
+    """
+    Dependency to get the current authenticated user.
+    Use this in your protected routes like: current_user = Depends(get_current_user)
+    """
     # Get user from database
     user = get_user_by_id(db, user_id)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise user_not_found()
+
+    # Lets the session attribute its commits to this user (see app.config.db.replica_router)
+    db.info["user_id"] = user["id"]
 
     return user
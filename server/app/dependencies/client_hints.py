@@ -0,0 +1,41 @@
+from typing import Optional
+from fastapi import Request, Response
+from app.utils.responsive_images import ClientHints, MAX_DPR
+
+# Hints we ask browsers to send; the Android client sends the same headers explicitly
+ACCEPT_CH = "Sec-CH-DPR, Sec-CH-Viewport-Width, DPR, Viewport-Width, Save-Data"
+VARY = "Sec-CH-DPR, Sec-CH-Viewport-Width, DPR, Viewport-Width, Save-Data"
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        parsed = int(float(value)) if value else None
+    except (ValueError, OverflowError):  # OverflowError: "inf", "1e400"
+        return None
+    # Ignore nonsense widths rather than generating huge renditions
+    return parsed if parsed and 0 < parsed <= 4096 else None
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        parsed = float(value) if value else None
+    except ValueError:
+        return None
+    return parsed if parsed and 0 < parsed <= MAX_DPR * 2 else None
+
+
+def get_client_hints(request: Request, response: Response) -> ClientHints:
+    """
+    Dependency that reads Save-Data, viewport width and DPR client hints.
+
+    Also advertises the hints we accept and marks the response as varying on them.
+    """
+    headers = request.headers
+    response.headers["Accept-CH"] = ACCEPT_CH
+    response.headers["Vary"] = VARY
+
+    return ClientHints(
+        save_data=headers.get("save-data", "").strip().lower() == "on",
+        viewport_width=_parse_int(headers.get("sec-ch-viewport-width") or headers.get("viewport-width")),
+        dpr=_parse_float(headers.get("sec-ch-dpr") or headers.get("dpr")),
+    )
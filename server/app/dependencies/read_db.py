@@ -0,0 +1,35 @@
+from fastapi import Depends
+from sqlalchemy.orm import Session
+from app.config.db import close_shard_sessions, open_read_session, primary_session
+from app.dependencies.auth import get_token_user_id, user_not_found
+from app.repositories.user_repository import get_user_by_id
+
+
+def get_read_db(user_id: int = Depends(get_token_user_id)) -> Session:
+    """
+    Dependency for read-only routes: a replica session when one is fresh enough
+    for this user, otherwise a primary session.
+    """
+    db = open_read_session(user_id)
+    try:
+        yield db
+    finally:
+        close_shard_sessions(db)
+        db.close()
+
+
+def get_read_user(user_id: int = Depends(get_token_user_id), db: Session = Depends(get_read_db)) -> dict:
+    """
+    get_current_user for read-only routes: looks the user up through the read
+    session, so the request never opens a primary connection just to
+    authenticate. Use it together with get_read_db.
+    """
+    user = get_user_by_id(db, user_id)
+    if user is None:
+        # A user registered moments ago may not have reached the replica yet
+        user = get_user_by_id(primary_session(db), user_id)
+    if user is None:
+        raise user_not_found()
+    # End the lookup's transaction so the route starts its own (sync opens a REPEATABLE READ snapshot)
+    db.rollback()
+    return user
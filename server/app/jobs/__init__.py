@@ -0,0 +1 @@
+# Background jobs, run with `python -m app.jobs.<name>`
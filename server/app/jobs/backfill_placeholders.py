@@ -0,0 +1,82 @@
+"""
+Backfill BlurHash placeholders and perceptual hashes for images created before
+they were computed at ingest.
+
+Usage:
+    python -m app.jobs.backfill_placeholders [--batch-size 200] [--workers 8]
+
+Images are read in keyset-paginated batches. Each batch is downloaded by a
+thread pool (network bound) and decoded in the ingest process pool (CPU
+bound), then written back with a single executemany UPDATE. The job is safe
+to stop and re-run: it only picks up rows still missing a placeholder or hash.
+With album shards, each shard is backfilled in turn.
+"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.config.db import SessionLocal, all_shard_sessions, close_shard_sessions, unit_of_work
+from app.repositories import image_repository
+from app.services import album_cache_service, image_ingest_service
+
+logger = logging.getLogger(__name__)
+
+
+def _analyze(image: dict) -> Optional[dict]:
+    try:
+        result = image_ingest_service.analyze_image(image["image_url"])
+    except Exception:
+        logger.exception("Skipping image %s", image["id"])
+        return None
+    return {
+        "id": image["id"],
+        "album_id": image["album_id"],
+        "image_url": image["image_url"],
+        "placeholder": result["placeholder"],
+        "phash": result["phash"]
+    }
+
+
+def backfill_placeholders(batch_size: int = 200, workers: int = 8) -> int:
+    """Analyze every image missing a placeholder or hash. Returns the number of rows updated."""
+    updated = 0
+    db = SessionLocal()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for shard_db in all_shard_sessions(db):
+                last_id = 0
+                while True:
+                    batch = image_repository.get_images_without_analysis(shard_db, last_id, batch_size)
+                    if not batch:
+                        break
+                    # Failed rows are skipped, not retried, so the loop always advances
+                    last_id = batch[-1]["id"]
+
+                    results = [row for row in executor.map(_analyze, batch) if row is not None]
+                    with unit_of_work(shard_db):
+                        updated += image_repository.set_image_analysis(shard_db, results)
+                    # Only reaches the API's cache when it is shared (CACHE_BACKEND=redis)
+                    for album_id in {image["album_id"] for image in batch}:
+                        album_cache_service.album_contents_changed(db, album_id)
+                    logger.info("Backfilled %d images (through image %d)", updated, last_id)
+    finally:
+        close_shard_sessions(db)
+        db.close()
+        image_ingest_service.shutdown_pool()
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill BlurHash placeholders and perceptual hashes for existing images")
+    parser.add_argument("--batch-size", type=int, default=200, help="Images read and written per batch")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent downloads")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    total = backfill_placeholders(batch_size=args.batch_size, workers=args.workers)
+    logger.info("Done, %d images updated", total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Report duplicate, unused and missing indexes.
+
+Usage:
+    python -m app.jobs.index_audit [--json] [--strict] [--shard N]
+
+- duplicate: a plain btree index whose columns lead another index on the same
+  table; the other index serves the same lookups, so this one only costs
+  writes. Indexes backing a constraint are never reported.
+- unused: no scans in pg_stat_user_indexes since statistics were last reset.
+  Only meaningful against a database that has served real traffic.
+- missing: an access path from app.repositories.query_catalog, or a foreign
+  key's columns, that no index leads with (or that a unique index on a
+  prefix of them doesn't pin down).
+
+--strict exits with status 1 when anything is reported, for use in CI.
+Every shard has the same schema but its own traffic, so with album shards
+run it once per shard (--shard, default 0) to judge unused indexes.
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import List, Tuple
+
+from app.config.db import open_shard_session
+from app.repositories import schema_repository
+from app.repositories.query_catalog import QUERY_CATALOG
+
+logger = logging.getLogger(__name__)
+
+
+def _is_plain(index: dict) -> bool:
+    return index["method"] == "btree" and not index["has_expressions"] and not index["partial"]
+
+
+def _leads(columns: List[str], index: dict) -> bool:
+    # Expression columns are compared by their SQL text, e.g. "image_month_day(date_added)"
+    return index["columns"][:len(columns)] == list(columns)
+
+
+def find_duplicates(indexes: List[dict]) -> List[Tuple[dict, dict]]:
+    """Return (redundant, covering) index pairs."""
+    duplicates = []
+    for index in indexes:
+        if not _is_plain(index) or index["constraint"] or index["primary"]:
+            continue
+        for other in indexes:
+            if other is index or other["table"] != index["table"] or not _is_plain(other):
+                continue
+            if not _leads(index["columns"], other):
+                continue
+            # A unique index only duplicates an index enforcing the same uniqueness
+            if index["unique"] and not (other["unique"] and other["columns"] == index["columns"]):
+                continue
+            # Of two identical indexes, keep the constraint-backed one, else the first by name
+            if len(other["columns"]) == len(index["columns"]) and not other["constraint"] and other["name"] > index["name"]:
+                continue
+            duplicates.append((index, other))
+            break
+    return duplicates
+
+
+def find_unused(indexes: List[dict]) -> List[dict]:
+    return [
+        index for index in indexes
+        if index["scans"] == 0 and not (index["unique"] or index["primary"] or index["constraint"])
+    ]
+
+
+def _serves(columns: List[str], index: dict) -> bool:
+    # A unique index on a prefix finds at most one row, so the rest of the columns are free
+    prefix = columns[:len(index["columns"])]
+    return _leads(columns, index) or (index["unique"] and not index["partial"] and _leads(prefix, index))
+
+
+def find_missing(indexes: List[dict], foreign_keys: List[dict]) -> List[Tuple[str, List[str], str]]:
+    """Return (table, columns, reason) for access paths no index serves."""
+    wanted = [(path.table, list(path.columns), path.used_by) for path in QUERY_CATALOG]
+    wanted += [(fk["table"], fk["columns"], f"foreign key {fk['name']}") for fk in foreign_keys]
+    return [
+        (table, columns, reason)
+        for table, columns, reason in wanted
+        if not any(index["table"] == table and _serves(columns, index) for index in indexes)
+    ]
+
+
+def audit(shard: int = 0) -> dict:
+    db = open_shard_session(shard)
+    try:
+        indexes = schema_repository.get_indexes(db)
+        foreign_keys = schema_repository.get_foreign_keys(db)
+        stats_reset = schema_repository.get_stats_reset(db)
+    finally:
+        db.close()
+
+    needed = {(path.table, path.columns) for path in QUERY_CATALOG}
+    return {
+        "stats_reset": stats_reset,
+        "duplicate": [
+            {
+                "table": index["table"],
+                "index": index["name"],
+                "covered_by": other["name"],
+                "size_bytes": index["size_bytes"]
+            }
+            for index, other in find_duplicates(indexes)
+        ],
+        "unused": [
+            {
+                "table": index["table"],
+                "index": index["name"],
+                "size_bytes": index["size_bytes"],
+                # Still needed by a catalog path; the queries just haven't run yet
+                "in_catalog": any(
+                    (index["table"], tuple(index["columns"][:len(columns)])) == (table, columns)
+                    for table, columns in needed
+                )
+            }
+            for index in find_unused(indexes)
+        ],
+        "missing": [
+            {"table": table, "columns": columns, "reason": reason}
+            for table, columns, reason in find_missing(indexes, foreign_keys)
+        ]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report duplicate, unused and missing indexes")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--strict", action="store_true", help="Exit with status 1 if anything is reported")
+    parser.add_argument("--shard", type=int, default=0, help="Album shard to audit (0 is DATABASE_URL)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    report = audit(args.shard)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for item in report["duplicate"]:
+            logger.info("Duplicate: %s.%s is covered by %s", item["table"], item["index"], item["covered_by"])
+        for item in report["unused"]:
+            logger.info(
+                "Unused since %s: %s.%s (%d bytes)%s", report["stats_reset"] or "stats were created",
+                item["table"], item["index"], item["size_bytes"], " [in query catalog]" if item["in_catalog"] else ""
+            )
+        for item in report["missing"]:
+            logger.info("Missing: %s(%s) for %s", item["table"], ", ".join(item["columns"]), item["reason"])
+        if not (report["duplicate"] or report["unused"] or report["missing"]):
+            logger.info("No index issues found")
+
+    if args.strict and (report["duplicate"] or report["unused"] or report["missing"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Garbage-collect stored media that no database row references anymore.
+
+Usage:
+    python -m app.jobs.media_gc [--min-age-hours 24] [--concurrency 4] [--dry-run]
+
+Deleting an image, audio clip or album only removes database rows (albums
+cascade through ON DELETE CASCADE), so the files stay in media storage.
+This job reconciles the two sides for the configured STORAGE_BACKEND:
+
+1. Stream every media URL from the images, audio and upload_sessions tables
+   (keyset pagination).
+2. List everything in storage: the memento/user_*/ folders on Cloudinary,
+   or the files under LOCAL_STORAGE_PATH.
+3. Delete what is unreferenced and older than --min-age-hours. Cloudinary
+   assets go in batches of up to 100 (the Admin API limit) with bounded
+   concurrency and retries; local files go through StorageBackend.delete.
+
+The age threshold matters: clients upload before creating the database
+record, so a fresh file without a row is usually an upload in flight.
+"""
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Protocol, Set, Tuple
+
+import cloudinary.api
+
+from app.config.db import SessionLocal, all_shard_sessions, close_shard_sessions
+from app.repositories import audio_repository, image_repository, upload_session_repository
+from app.storage import LocalStorage, get_storage
+from app.utils.cloudinary_utils import public_id_from_url
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = "memento/user_"
+RESOURCE_TYPES = ("image", "raw", "video")  # Audio is uploaded as raw; "auto" uploads may land in video
+DELETE_BATCH_SIZE = 100  # Cloudinary Admin API maximum per delete_resources call
+LIST_PAGE_SIZE = 500
+DB_PAGE_SIZE = 5000
+MAX_ATTEMPTS = 5
+
+
+class MediaClient(Protocol):
+    """The subset of the Cloudinary Admin API the collector needs."""
+
+    def list_resources(
+        self, prefix: str, resource_type: str, cursor: Optional[str]
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Return one page of {"public_id", "created_at"} dicts and the next cursor."""
+        ...
+
+    def delete_resources(self, public_ids: List[str], resource_type: str) -> Dict[str, str]:
+        """Delete up to 100 assets; return {public_id: "deleted" | "not_found" | ...}."""
+        ...
+
+
+class CloudinaryMediaClient:
+    """MediaClient backed by the real Cloudinary Admin API."""
+
+    def list_resources(self, prefix, resource_type, cursor):
+        params = {"type": "upload", "prefix": prefix, "resource_type": resource_type, "max_results": LIST_PAGE_SIZE}
+        if cursor:
+            params["next_cursor"] = cursor
+        result = cloudinary.api.resources(**params)
+        return result.get("resources", []), result.get("next_cursor")
+
+    def delete_resources(self, public_ids, resource_type):
+        result = cloudinary.api.delete_resources(public_ids, resource_type=resource_type, type="upload")
+        return result.get("deleted", {})
+
+
+@dataclass
+class InMemoryMediaClient:
+    """
+    Local stand-in for the Cloudinary Admin API.
+
+    Holds assets as {resource_type: {public_id: created_at}} and records every
+    delete call, so the collector can be exercised without network access.
+    """
+    assets: Dict[str, Dict[str, datetime]] = field(default_factory=dict)
+    delete_calls: List[Tuple[str, List[str]]] = field(default_factory=list)
+    page_size: int = LIST_PAGE_SIZE
+
+    def add(self, public_id: str, resource_type: str = "image", created_at: Optional[datetime] = None) -> None:
+        created = created_at or datetime.now(timezone.utc)
+        self.assets.setdefault(resource_type, {})[public_id] = created
+
+    def list_resources(self, prefix, resource_type, cursor):
+        matching = sorted(pid for pid in self.assets.get(resource_type, {}) if pid.startswith(prefix))
+        start = int(cursor or 0)
+        page = matching[start:start + self.page_size]
+        next_cursor = str(start + self.page_size) if start + self.page_size < len(matching) else None
+        resources = [
+            {"public_id": pid, "created_at": self.assets[resource_type][pid].isoformat()}
+            for pid in page
+        ]
+        return resources, next_cursor
+
+    def delete_resources(self, public_ids, resource_type):
+        if len(public_ids) > DELETE_BATCH_SIZE:
+            raise ValueError("delete_resources accepts at most 100 public_ids")
+        self.delete_calls.append((resource_type, list(public_ids)))
+        stored = self.assets.get(resource_type, {})
+        return {pid: "deleted" if stored.pop(pid, None) else "not_found" for pid in public_ids}
+
+
+@dataclass
+class CollectionResult:
+    scanned: int = 0
+    referenced: int = 0
+    orphaned: int = 0
+    deleted: int = 0
+    failed: int = 0
+
+
+def _referenced_urls(batch_size: int = DB_PAGE_SIZE) -> Iterator[str]:
+    """Every media URL stored on any shard."""
+    db = SessionLocal()
+    try:
+        for shard_db in all_shard_sessions(db):
+            last_id = 0
+            while True:
+                rows = image_repository.get_image_media_urls(shard_db, last_id, batch_size)
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                for row in rows:
+                    yield from row["urls"]
+
+            last_id = 0
+            while True:
+                rows = audio_repository.get_audio_urls(shard_db, last_id, batch_size)
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                for row in rows:
+                    yield row["url"]
+
+            # Stored resumable uploads whose record isn't created yet
+            last_id = 0
+            while True:
+                rows = upload_session_repository.get_upload_session_urls(shard_db, last_id, batch_size)
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                for row in rows:
+                    yield row["url"]
+    finally:
+        close_shard_sessions(db)
+        db.close()
+
+
+def _referenced_public_ids(batch_size: int = DB_PAGE_SIZE) -> Set[Tuple[str, str]]:
+    """Collect (resource_type, public_id) for every Cloudinary URL stored on any shard."""
+    referenced: Set[Tuple[str, str]] = set()
+    for url in _referenced_urls(batch_size):
+        parsed = public_id_from_url(url)
+        if parsed:
+            referenced.add(parsed)
+    return referenced
+
+
+def _parse_created_at(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _list_assets(client: MediaClient, resource_type: str) -> Iterator[dict]:
+    cursor = None
+    while True:
+        resources, cursor = client.list_resources(MEDIA_PREFIX, resource_type, cursor)
+        yield from resources
+        if not cursor:
+            return
+
+
+def _delete_with_retry(client: MediaClient, public_ids: List[str], resource_type: str) -> int:
+    """Delete one batch, retrying with exponential backoff. Returns how many were removed."""
+    delay = 1.0
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            result = client.delete_resources(public_ids, resource_type)
+            # not_found means someone else already removed it, which is what we wanted
+            return sum(1 for status in result.values() if status in ("deleted", "not_found"))
+        except Exception:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            logger.warning("Delete batch failed (attempt %d/%d), retrying in %.0fs", attempt, MAX_ATTEMPTS, delay)
+            time.sleep(delay)
+            delay *= 2
+    return 0
+
+
+def collect_garbage(
+    client: MediaClient,
+    min_age: timedelta = timedelta(hours=24),
+    concurrency: int = 4,
+    dry_run: bool = False
+) -> CollectionResult:
+    """Find and delete orphaned media assets."""
+    result = CollectionResult()
+    referenced = _referenced_public_ids()
+    result.referenced = len(referenced)
+    cutoff = datetime.now(timezone.utc) - min_age
+
+    # List everything before deleting anything so deletes can't shift the listing cursor
+    orphans: Dict[str, List[str]] = {}
+    for resource_type in RESOURCE_TYPES:
+        for asset in _list_assets(client, resource_type):
+            result.scanned += 1
+            if (resource_type, asset["public_id"]) in referenced:
+                continue
+            if _parse_created_at(asset["created_at"]) > cutoff:
+                continue
+            orphans.setdefault(resource_type, []).append(asset["public_id"])
+    result.orphaned = sum(len(public_ids) for public_ids in orphans.values())
+
+    if dry_run:
+        return result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {}
+        for resource_type, public_ids in orphans.items():
+            for start in range(0, len(public_ids), DELETE_BATCH_SIZE):
+                batch = public_ids[start:start + DELETE_BATCH_SIZE]
+                futures[executor.submit(_delete_with_retry, client, batch, resource_type)] = len(batch)
+
+        for future in as_completed(futures):
+            try:
+                result.deleted += future.result()
+            except Exception:
+                logger.exception("Giving up on a delete batch")
+                result.failed += futures[future]
+
+    return result
+
+
+def collect_local_garbage(
+    storage: LocalStorage,
+    min_age: timedelta = timedelta(hours=24),
+    dry_run: bool = False
+) -> CollectionResult:
+    """Find and delete orphaned files of the local storage backend."""
+    result = CollectionResult()
+    # Match file names rather than whole URLs, so a changed PUBLIC_BASE_URL
+    # can't make every file look unreferenced
+    referenced = {url.rsplit("/", 1)[-1] for url in _referenced_urls()}
+    result.referenced = len(referenced)
+    cutoff = (datetime.now(timezone.utc) - min_age).timestamp()
+
+    # Each file is stat'ed just before it is considered, so one stored again
+    # since the listing started (which refreshes its mtime) is kept
+    for url, modified_at in storage.list_files():
+        result.scanned += 1
+        if url.rsplit("/", 1)[-1] in referenced or modified_at > cutoff:
+            continue
+        result.orphaned += 1
+        if dry_run:
+            continue
+        if storage.delete(url):
+            result.deleted += 1
+        else:
+            result.failed += 1
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delete stored media no longer referenced by the database")
+    parser.add_argument("--min-age-hours", type=float, default=24, help="Never delete assets younger than this")
+    parser.add_argument("--concurrency", type=int, default=4, help="Cloudinary delete batches in flight at once")
+    parser.add_argument("--dry-run", action="store_true", help="Report orphans without deleting them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    storage = get_storage()
+    if isinstance(storage, LocalStorage):
+        result = collect_local_garbage(storage, min_age=timedelta(hours=args.min_age_hours), dry_run=args.dry_run)
+    else:
+        result = collect_garbage(
+            CloudinaryMediaClient(),
+            min_age=timedelta(hours=args.min_age_hours),
+            concurrency=args.concurrency,
+            dry_run=args.dry_run
+        )
+    logger.info(
+        "Scanned %d files, %d referenced, %d orphaned, %d deleted, %d failed",
+        result.scanned, result.referenced, result.orphaned, result.deleted, result.failed
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Apply database/schema/*.sql migrations that haven't been applied yet.
+
+Usage:
+    python -m app.jobs.migrate [--dry-run] [--baseline VERSION]
+
+Applied files are recorded in a schema_migrations table with a checksum;
+files are applied in name order, each in its own transaction. A file whose
+first line is "-- migrate:no-transaction" is run statement by statement in
+autocommit mode instead, which CREATE/DROP INDEX CONCURRENTLY requires, so
+index changes don't block writes to large tables. Such files must be
+idempotent (IF [NOT] EXISTS), since a failure leaves earlier statements
+applied; an INVALID index left by a failed concurrent build is dropped
+before it is rebuilt on the next run.
+
+Databases whose schema was applied by hand before the runner existed should
+be marked up to date once with --baseline (e.g. --baseline 013).
+
+A session-level advisory lock keeps two deploys from migrating at once.
+
+With album shards (DATABASE_SHARD_URLS) every shard is migrated in turn, and
+the ID sequences of the album-scoped tables are then limited to the shard's
+range, which is how ShardRouter finds the shard holding a row. Shard 0's
+range starts at 1, so rows created before sharding keep their IDs; the run
+stops if a shard has already handed out IDs beyond its range.
+"""
+import argparse
+import hashlib
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from app.config.db import SHARD_ID_WARN_RATIO, SHARDED_ID_TABLES, shard_engines, shard_router
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_DIR = Path(__file__).resolve().parents[2] / "database" / "schema"
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+LOCK_ID = 727_001  # pg_advisory_lock key shared by every runner
+
+CONCURRENT_INDEX_PATTERN = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a SQL script on top-level semicolons, respecting quotes, comments and $$ bodies."""
+    statements = []
+    start = 0
+    i = 0
+    while i < len(sql):
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = len(sql) if end == -1 else end + 1
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = len(sql) if end == -1 else end + 2
+        elif sql[i] in ("'", '"'):
+            end = sql.find(sql[i], i + 1)
+            # Doubled quotes are escapes; the scan resumes after them
+            i = len(sql) if end == -1 else end + 1
+        elif sql[i] == "$":
+            match = re.match(r"\$[A-Za-z_]*\$", sql[i:])
+            if match:
+                end = sql.find(match.group(0), i + len(match.group(0)))
+                i = len(sql) if end == -1 else end + len(match.group(0))
+            else:
+                i += 1
+        elif sql[i] == ";":
+            statements.append(sql[start:i])
+            start = i = i + 1
+        else:
+            i += 1
+    statements.append(sql[start:])
+
+    def has_code(statement: str) -> bool:
+        return any(line.strip() and not line.strip().startswith("--") for line in statement.splitlines())
+
+    return [statement.strip() for statement in statements if has_code(statement)]
+
+
+def _migration_files() -> Iterator[Path]:
+    return iter(sorted(SCHEMA_DIR.glob("*.sql")))
+
+
+def _checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode()).hexdigest()
+
+
+def _applied(cursor) -> Dict[str, str]:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(255) PRIMARY KEY,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+
+def _record(cursor, version: str, checksum: str) -> None:
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, checksum) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING",
+        (version, checksum)
+    )
+
+
+def _drop_invalid_index(cursor, name: str) -> None:
+    """Drop an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY."""
+    cursor.execute("""
+        SELECT 1
+        FROM pg_index ix
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        WHERE i.relname = %s AND NOT ix.indisvalid
+    """, (name,))
+    if cursor.fetchone():
+        logger.warning("Dropping invalid index %s left by an earlier failed build", name)
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def _apply(connection, path: Path, sql: str) -> None:
+    cursor = connection.cursor()
+    if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+        connection.autocommit = True
+        for statement in split_statements(sql):
+            match = CONCURRENT_INDEX_PATTERN.search(statement)
+            if match:
+                _drop_invalid_index(cursor, match.group(1))
+            cursor.execute(statement)
+        _record(cursor, path.stem, _checksum(sql))
+        return
+
+    connection.autocommit = False
+    try:
+        cursor.execute(sql)
+        _record(cursor, path.stem, _checksum(sql))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.autocommit = True
+
+
+def _claim_id_range(cursor, shard: int) -> None:
+    """Limit the shard's album-scoped ID sequences to its range."""
+    first, last = shard_router.id_range(shard)
+    for table in SHARDED_ID_TABLES:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+        last_value, is_called = cursor.fetchone()
+        used = last_value if is_called else last_value - 1
+        if used > last:
+            raise RuntimeError(f"{sequence} on shard {shard} has handed out IDs past its range ({first}-{last})")
+        if used - first + 1 > SHARD_ID_WARN_RATIO * (last - first + 1):
+            logger.warning("%s on shard %d has used %d of its %d IDs", sequence, shard, used - first + 1, last - first + 1)
+        restart = f" RESTART WITH {first}" if used < first else ""
+        cursor.execute(f"ALTER SEQUENCE {sequence} MINVALUE {first} MAXVALUE {last} START WITH {first}{restart}")
+
+
+def _migrate_shard(shard: int, engine, dry_run: bool, baseline: Optional[str]) -> List[str]:
+    pooled = engine.raw_connection()
+    connection = pooled.driver_connection
+    connection.autocommit = True
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (LOCK_ID,))
+        applied = _applied(cursor)
+        pending = []
+        for path in _migration_files():
+            sql = path.read_text()
+            if path.stem in applied:
+                if applied[path.stem] != _checksum(sql):
+                    logger.warning("%s changed after it was applied; edits to applied migrations are not re-run", path.name)
+                continue
+
+            pending.append(path.stem)
+            if dry_run:
+                logger.info("Pending: %s", path.name)
+            elif baseline is not None and path.stem.split("_", 1)[0] <= baseline:
+                logger.info("Baselined: %s", path.name)
+                _record(cursor, path.stem, _checksum(sql))
+            else:
+                logger.info("Applying: %s", path.name)
+                _apply(connection, path, sql)
+        if shard_router.count > 1 and not dry_run:
+            _claim_id_range(cursor, shard)
+        return pending
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+        # The connection goes back to the engine's pool; sessions expect transactions
+        connection.autocommit = False
+        pooled.close()
+
+
+def migrate(dry_run: bool = False, baseline: Optional[str] = None) -> List[str]:
+    """Apply (or with dry_run, list) pending migrations on every shard. Returns their versions."""
+    pending: List[str] = []
+    for shard, engine in enumerate(shard_engines):
+        if len(shard_engines) > 1:
+            logger.info("Shard %d", shard)
+        # Only the primary can predate the runner; shards are created by it
+        shard_baseline = baseline if shard == 0 else None
+        versions = _migrate_shard(shard, engine, dry_run, shard_baseline)
+        pending.extend(version for version in versions if version not in pending)
+    return pending
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply pending database/schema migrations")
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    parser.add_argument(
+        "--baseline", metavar="VERSION",
+        help="Mark migrations up to this numeric prefix (e.g. 013) as applied without running them"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    versions = migrate(dry_run=args.dry_run, baseline=args.baseline)
+    if not versions:
+        logger.info("Database is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Cache every user's "on this day" memories for a date ahead of the daily
+notification fan-out, so the requests it triggers are served from the cache.
+
+Usage:
+    python -m app.jobs.precompute_on_this_day [--date YYYY-MM-DD]
+
+Run it shortly before notifications go out (the date defaults to today in
+UTC; pass the local date when scheduling per time zone). The API only sees
+the entries through a shared cache, so CACHE_BACKEND must be redis.
+"""
+import argparse
+import logging
+from datetime import date, datetime, timezone
+
+from app.config.settings import get_settings
+from app.services import on_this_day_service
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache each user's on-this-day memories for a date")
+    parser.add_argument("--date", type=date.fromisoformat, help="Day to precompute (default: today in UTC)")
+    args = parser.parse_args()
+
+    if get_settings().cache_backend != "redis":
+        parser.error("CACHE_BACKEND must be redis; the API can't see entries cached in this process")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    day = args.date or datetime.now(timezone.utc).date()
+    users = on_this_day_service.precompute(day)
+    logger.info("Done, %d users cached for %s", users, day.isoformat())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Delete old sync tombstones.
+
+Usage:
+    python -m app.jobs.prune_tombstones [--retention-days 30]
+
+Tombstones tell offline clients what was deleted while they were away. Once
+pruned, clients whose cursor predates them get a full resync instead of a
+delta (see sync_service).
+"""
+import argparse
+import logging
+
+from app.config.db import open_shard_session, shard_router, unit_of_work
+from app.repositories import sync_repository
+
+logger = logging.getLogger(__name__)
+
+
+def prune_tombstones(retention_days: int = 30) -> int:
+    """Delete tombstones older than retention_days on every shard. Returns how many were removed."""
+    removed = 0
+    for shard in range(shard_router.count):
+        db = open_shard_session(shard)
+        try:
+            with unit_of_work(db):
+                removed += sync_repository.prune_tombstones(db, retention_days)
+        finally:
+            db.close()
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delete sync tombstones older than the retention period")
+    parser.add_argument("--retention-days", type=int, default=30, help="Keep tombstones this many days")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    removed = prune_tombstones(args.retention_days)
+    logger.info("Pruned %d tombstones", removed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Delete expired resumable uploads.
+
+Usage:
+    python -m app.jobs.prune_upload_sessions
+
+Removes sessions past UPLOAD_SESSION_TTL_HOURS on every shard together with
+their staged bytes in UPLOAD_STAGING_PATH, then staged files whose session
+is gone for another reason (deleting an album cascades to its sessions).
+Run it on a host that sees the staging directory.
+"""
+import logging
+
+from app.config.db import open_shard_session, shard_router
+from app.services import upload_session_service
+
+logger = logging.getLogger(__name__)
+
+
+def prune_upload_sessions() -> int:
+    """Delete expired upload sessions and orphaned part files on every shard. Returns how many sessions were removed."""
+    removed = 0
+    orphans = 0
+    for shard in range(shard_router.count):
+        db = open_shard_session(shard)
+        try:
+            removed += upload_session_service.delete_expired(db)
+            orphans += upload_session_service.delete_orphaned_parts(db, shard)
+        finally:
+            db.close()
+    logger.info("Deleted %d orphaned part files", orphans)
+    return removed
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    removed = prune_upload_sessions()
+    logger.info("Pruned %d expired upload sessions", removed)
+
+
+if __name__ == "__main__":
+    main()
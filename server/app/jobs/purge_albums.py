@@ -0,0 +1,27 @@
+"""
+Purge soft-deleted albums that weren't cleaned up right after deletion
+(for example because the worker restarted).
+
+Usage:
+    python -m app.jobs.purge_albums [--chunk-size 500]
+"""
+import argparse
+import logging
+
+from app.services import album_purge_service
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hard-delete soft-deleted albums in small chunks")
+    parser.add_argument("--chunk-size", type=int, default=album_purge_service.CHUNK_SIZE, help="Rows deleted per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    purged = album_purge_service.purge_pending_albums(chunk_size=args.chunk_size)
+    logger.info("Done, %d albums purged", purged)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.config.admission import admission_controller
 from app.config.settings import get_settings
-from app.routers import health, auth, albums, images, audio, upload
+from app.routers import health, auth, albums, images, audio, upload, events, sync, timeline, media
+from app.services import album_cache_service, image_ingest_service
+from app.services.change_feed_service import feed
+from app.utils.admission import AdmissionMiddleware
+from app.utils.body_limit import BodySizeLimitMiddleware
 
 settings = get_settings()
 
+MULTIPART_SLACK_BYTES = 64 * 1024
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.cache_warm_albums > 0:
+        album_cache_service.warm_in_background(settings.cache_warm_albums)
+    await feed.start()
+    yield
+    await feed.stop()
+    # Stop background worker processes
+    image_ingest_service.shutdown_pool()
+
+
 app = FastAPI(
     title="Memento API",
     description="FastAPI server with Neon database backend",
     version="1.0.0",
     debug=settings.debug,
+    lifespan=lifespan,
 )
 
 
@@ -42,6 +63,9 @@ def custom_openapi():
             "/images",
             "/audio",
             "/upload",
+            "/events",
+            "/sync",
+            "/timeline",
         ]
         
         for path, methods in openapi_schema["paths"].items():
@@ -66,6 +90,24 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
+# Shed load with 503 + Retry-After instead of queueing on the DB pool.
+# Added before CORS so rejections still carry CORS headers.
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission_controller,
+    retry_after=settings.admission_retry_after_seconds,
+)
+
+# Refuse oversized multipart uploads while they arrive, before Starlette spools
+# them to disk; the slack covers the multipart framing around the file
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        ("POST", "/upload/image"): settings.media_max_upload_bytes + MULTIPART_SLACK_BYTES,
+        ("POST", "/upload/audio"): settings.media_max_upload_bytes + MULTIPART_SLACK_BYTES,
+    },
+)
+
 # CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
@@ -82,6 +124,10 @@ app.include_router(albums.router)
 app.include_router(images.router)
 app.include_router(audio.router)
 app.include_router(upload.router)
+app.include_router(events.router)
+app.include_router(sync.router)
+app.include_router(timeline.router)
+app.include_router(media.router)
 
 
 @app.get("/")
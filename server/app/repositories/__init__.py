@@ -2,11 +2,17 @@ from . import album_repository
 from . import album_member_repository
 from . import image_repository
 from . import audio_repository
+from . import sync_repository
+from . import schema_repository
+from . import upload_session_repository
 
 __all__ = [
     "album_repository",
     "album_member_repository",
     "image_repository",
     "audio_repository",
+    "sync_repository",
+    "schema_repository",
+    "upload_session_repository",
 ]
 
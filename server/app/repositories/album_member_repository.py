@@ -1,6 +1,6 @@
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 
 def add_album_member(db: Session, album_id: int, user_id: int) -> Optional[dict]:
@@ -12,25 +12,20 @@ def add_album_member(db: Session, album_id: int, user_id: int) -> Optional[dict]
         RETURNING id, album_id, user_id, created_at
     """)
     
-    try:
-        result = db.execute(query, {
-            "album_id": album_id,
-            "user_id": user_id
-        })
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "album_id": row[1],
-                "user_id": row[2],
-                "created_at": str(row[3])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {
+        "album_id": album_id,
+        "user_id": user_id
+    })
+    row = result.fetchone()
+    
+    if row:
+        return {
+            "id": row[0],
+            "album_id": row[1],
+            "user_id": row[2],
+            "created_at": str(row[3])
+        }
+    return None
 
 
 def remove_album_member(db: Session, album_id: int, user_id: int) -> bool:
@@ -40,39 +35,110 @@ def remove_album_member(db: Session, album_id: int, user_id: int) -> bool:
         WHERE album_id = :album_id AND user_id = :user_id
     """)
     
-    try:
-        result = db.execute(query, {
-            "album_id": album_id,
-            "user_id": user_id
-        })
-        db.commit()
-        return result.rowcount > 0
-    except Exception as e:
-        db.rollback()
-        raise e
-
-
-def get_album_members(db: Session, album_id: int) -> List[dict]:
-    """Get all members of an album."""
+    result = db.execute(query, {
+        "album_id": album_id,
+        "user_id": user_id
+    })
+    return result.rowcount > 0
+
+
+def add_album_members(db: Session, album_id: int, user_ids: List[int]) -> List[int]:
+    """
+    Add several users to an album in one statement.
+
+    Returns the user IDs that were added; existing members are skipped.
+    Users live in the primary database, which may not be the album's shard,
+    so callers pass only IDs they have checked exist.
+    """
+    if not user_ids:
+        return []
+    
+    query = text("""
+        INSERT INTO album_members (album_id, user_id)
+        SELECT DISTINCT :album_id, user_id
+        FROM unnest(CAST(:user_ids AS INTEGER[])) AS user_id
+        ORDER BY user_id
+        ON CONFLICT (album_id, user_id) DO NOTHING
+        RETURNING user_id
+    """)
+    
+    result = db.execute(query, {
+        "album_id": album_id,
+        "user_ids": list(user_ids)
+    })
+    return sorted(row[0] for row in result)
+
+
+def remove_album_members(db: Session, album_id: int, user_ids: List[int]) -> List[int]:
+    """Remove several users from an album in one statement. Returns the user IDs removed."""
+    if not user_ids:
+        return []
+    
+    query = text("""
+        DELETE FROM album_members
+        WHERE album_id = :album_id AND user_id = ANY(:user_ids)
+        RETURNING user_id
+    """)
+    
+    result = db.execute(query, {
+        "album_id": album_id,
+        "user_ids": list(user_ids)
+    })
+    return sorted(row[0] for row in result)
+
+
+def get_album_members_page(db: Session, album_id: int, after_id: int, limit: int) -> List[dict]:
+    """
+    Get a page of an album's members in membership ID order after after_id.
+
+    Names come from the users table in the primary database
+    (user_repository.get_user_names).
+    """
     query = text("""
         SELECT id, album_id, user_id, created_at
         FROM album_members
-        WHERE album_id = :album_id
-        ORDER BY created_at ASC
+        WHERE album_id = :album_id AND id > :after_id
+        ORDER BY id
+        LIMIT :limit
     """)
     
-    result = db.execute(query, {"album_id": album_id})
-    members = []
-    
-    for row in result:
-        members.append({
+    result = db.execute(query, {
+        "album_id": album_id,
+        "after_id": after_id,
+        "limit": limit
+    })
+    return [
+        {
             "id": row[0],
             "album_id": row[1],
             "user_id": row[2],
             "created_at": str(row[3])
-        })
+        }
+        for row in result
+    ]
+
+
+def get_album_members_by_ids(db: Session, member_ids: List[int]) -> List[dict]:
+    """Get several memberships by ID in one query. Missing IDs are skipped."""
+    if not member_ids:
+        return []
     
-    return members
+    query = text("""
+        SELECT id, album_id, user_id, created_at
+        FROM album_members
+        WHERE id = ANY(:member_ids)
+    """)
+    
+    result = db.execute(query, {"member_ids": list(member_ids)})
+    return [
+        {
+            "id": row[0],
+            "album_id": row[1],
+            "user_id": row[2],
+            "created_at": str(row[3])
+        }
+        for row in result
+    ]
 
 
 def is_album_member(db: Session, album_id: int, user_id: int) -> bool:
@@ -90,3 +156,45 @@ def is_album_member(db: Session, album_id: int, user_id: int) -> bool:
     })
     return result.fetchone() is not None
 
+
+
+def get_album_member_ids(db: Session, album_id: int) -> List[int]:
+    """Get the user IDs of all members of an album."""
+    query = text("""
+        SELECT user_id
+        FROM album_members
+        WHERE album_id = :album_id
+    """)
+    
+    result = db.execute(query, {"album_id": album_id})
+    return [row[0] for row in result]
+
+
+def get_user_album_ids(db: Session, user_id: int) -> List[int]:
+    """Get the IDs of the albums a user belongs to (owners are members too), skipping deleted ones."""
+    query = text("""
+        SELECT am.album_id
+        FROM album_members am
+        JOIN albums a ON a.id = am.album_id
+        WHERE am.user_id = :user_id AND a.deleted_at IS NULL
+    """)
+
+    result = db.execute(query, {"user_id": user_id})
+    return [row[0] for row in result]
+
+
+def get_member_ids_by_album(db: Session, album_ids: List[int]) -> Dict[int, List[int]]:
+    """Get the member user IDs of several albums in one query, keyed by album ID."""
+    if not album_ids:
+        return {}
+
+    query = text("""
+        SELECT album_id, user_id
+        FROM album_members
+        WHERE album_id = ANY(:album_ids)
+    """)
+
+    members: Dict[int, List[int]] = {}
+    for album_id, user_id in db.execute(query, {"album_ids": list(album_ids)}):
+        members.setdefault(album_id, []).append(user_id)
+    return members
@@ -4,33 +4,35 @@ from typing import Optional, List
 
 
 def create_album(db: Session, name: str, owner_id: int) -> Optional[dict]:
-    """Create a new album."""
+    """Create a new album with its owner as the first member, in one statement."""
     query = text("""
-        INSERT INTO albums (name, owner_id)
-        VALUES (:name, :owner_id)
-        RETURNING id, name, owner_id, created_at, updated_at
+        WITH album AS (
+            INSERT INTO albums (name, owner_id)
+            VALUES (:name, :owner_id)
+            RETURNING id, name, owner_id, created_at, updated_at
+        ), owner_membership AS (
+            INSERT INTO album_members (album_id, user_id)
+            SELECT id, owner_id FROM album
+        )
+        SELECT id, name, owner_id, created_at, updated_at
+        FROM album
     """)
     
-    try:
-        result = db.execute(query, {
-            "name": name,
-            "owner_id": owner_id
-        })
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "name": row[1],
-                "owner_id": row[2],
-                "created_at": str(row[3]),
-                "updated_at": str(row[4])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {
+        "name": name,
+        "owner_id": owner_id
+    })
+    row = result.fetchone()
+    
+    if row:
+        return {
+            "id": row[0],
+            "name": row[1],
+            "owner_id": row[2],
+            "created_at": str(row[3]),
+            "updated_at": str(row[4])
+        }
+    return None
 
 
 def get_album_by_id(db: Session, album_id: int) -> Optional[dict]:
@@ -38,7 +40,7 @@ def get_album_by_id(db: Session, album_id: int) -> Optional[dict]:
     query = text("""
         SELECT id, name, owner_id, created_at, updated_at
         FROM albums
-        WHERE id = :album_id
+        WHERE id = :album_id AND deleted_at IS NULL
     """)
     
     result = db.execute(query, {"album_id": album_id})
@@ -55,60 +57,90 @@ def get_album_by_id(db: Session, album_id: int) -> Optional[dict]:
     return None
 
 
+def get_albums_by_ids(db: Session, album_ids: List[int]) -> List[dict]:
+    """Get several live albums by ID in one query. Missing or deleted IDs are skipped."""
+    if not album_ids:
+        return []
+    
+    query = text("""
+        SELECT id, name, owner_id, created_at, updated_at
+        FROM albums
+        WHERE id = ANY(:album_ids) AND deleted_at IS NULL
+    """)
+    
+    result = db.execute(query, {"album_ids": list(album_ids)})
+    return [
+        {
+            "id": row[0],
+            "name": row[1],
+            "owner_id": row[2],
+            "created_at": str(row[3]),
+            "updated_at": str(row[4])
+        }
+        for row in result
+    ]
+
+
 def update_album(db: Session, album_id: int, name: str) -> Optional[dict]:
     """Update an album's name."""
     query = text("""
         UPDATE albums
         SET name = :name
-        WHERE id = :album_id
+        WHERE id = :album_id AND deleted_at IS NULL
         RETURNING id, name, owner_id, created_at, updated_at
     """)
     
-    try:
-        result = db.execute(query, {
-            "album_id": album_id,
-            "name": name
-        })
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "name": row[1],
-                "owner_id": row[2],
-                "created_at": str(row[3]),
-                "updated_at": str(row[4])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {
+        "album_id": album_id,
+        "name": name
+    })
+    row = result.fetchone()
+    
+    if row:
+        return {
+            "id": row[0],
+            "name": row[1],
+            "owner_id": row[2],
+            "created_at": str(row[3]),
+            "updated_at": str(row[4])
+        }
+    return None
 
 
 def delete_album(db: Session, album_id: int) -> bool:
-    """Delete an album."""
+    """
+    Soft-delete an album.
+
+    The album disappears from every read path immediately; its rows are
+    removed later in small chunks by album_purge_service.
+    """
     query = text("""
-        DELETE FROM albums
-        WHERE id = :album_id
+        UPDATE albums
+        SET deleted_at = CURRENT_TIMESTAMP
+        WHERE id = :album_id AND deleted_at IS NULL
     """)
     
-    try:
-        result = db.execute(query, {"album_id": album_id})
-        db.commit()
-        return result.rowcount > 0
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {"album_id": album_id})
+    return result.rowcount > 0
 
 
 def get_user_albums(db: Session, user_id: int) -> List[dict]:
-    """Get all albums where user is owner or member."""
+    """
+    Get all albums where user is owner or member, with their counters and
+    cover image from album_stats.
+    """
     query = text("""
-        SELECT DISTINCT a.id, a.name, a.owner_id, a.created_at, a.updated_at
+        SELECT a.id, a.name, a.owner_id, a.created_at, a.updated_at,
+               COALESCE(s.image_count, 0), COALESCE(s.audio_count, 0), COALESCE(s.member_count, 0),
+               s.cover_image_id, s.cover_image_url, s.cover_thumbnail_url, s.cover_placeholder,
+               s.last_activity_at
         FROM albums a
-        LEFT JOIN album_members am ON a.id = am.album_id
-        WHERE a.owner_id = :user_id OR am.user_id = :user_id
+        LEFT JOIN album_stats s ON s.album_id = a.id
+        WHERE a.id IN (
+            SELECT album_id FROM album_members WHERE user_id = :user_id
+            UNION
+            SELECT id FROM albums WHERE owner_id = :user_id
+        ) AND a.deleted_at IS NULL
         ORDER BY a.created_at DESC
     """)
     
@@ -121,8 +153,95 @@ def get_user_albums(db: Session, user_id: int) -> List[dict]:
             "name": row[1],
             "owner_id": row[2],
             "created_at": str(row[3]),
-            "updated_at": str(row[4])
+            "updated_at": str(row[4]),
+            "image_count": row[5],
+            "audio_count": row[6],
+            "member_count": row[7],
+            "cover_image_id": row[8],
+            "cover_image_url": row[9],
+            "cover_thumbnail_url": row[10],
+            "cover_placeholder": row[11],
+            "last_activity_at": str(row[12]) if row[12] else None
         })
     
     return albums
 
+
+def get_hottest_album_ids(db: Session, limit: int, days: int = 7) -> List[int]:
+    """Get IDs of the albums with the most images added in the last few days."""
+    query = text("""
+        SELECT i.album_id
+        FROM images i
+        JOIN albums a ON a.id = i.album_id
+        WHERE i.date_added > CURRENT_TIMESTAMP - make_interval(days => :days)
+          AND a.deleted_at IS NULL
+        GROUP BY i.album_id
+        ORDER BY COUNT(*) DESC
+        LIMIT :limit
+    """)
+    
+    result = db.execute(query, {"limit": limit, "days": days})
+    return [row[0] for row in result]
+
+
+def get_albums_pending_purge(db: Session, limit: int) -> List[int]:
+    """Get IDs of soft-deleted albums, oldest deletion first."""
+    query = text("""
+        SELECT id
+        FROM albums
+        WHERE deleted_at IS NOT NULL
+        ORDER BY deleted_at
+        LIMIT :limit
+    """)
+    
+    result = db.execute(query, {"limit": limit})
+    return [row[0] for row in result]
+
+
+def purge_album_images_chunk(db: Session, album_id: int, chunk_size: int) -> int:
+    """
+    Hard-delete up to chunk_size images (and their audio) from a soft-deleted album.
+    
+    Returns the number of images deleted; 0 means none are left.
+    """
+    query = text("""
+        DELETE FROM images
+        WHERE album_id = :album_id AND id = ANY(ARRAY(
+            SELECT i.id
+            FROM images i
+            JOIN albums a ON a.id = i.album_id
+            WHERE i.album_id = :album_id AND a.deleted_at IS NOT NULL
+            LIMIT :chunk_size
+        ))
+    """)
+    
+    result = db.execute(query, {"album_id": album_id, "chunk_size": chunk_size})
+    return result.rowcount
+
+
+def purge_album_members_chunk(db: Session, album_id: int, chunk_size: int) -> int:
+    """Hard-delete up to chunk_size memberships of a soft-deleted album."""
+    query = text("""
+        DELETE FROM album_members
+        WHERE id = ANY(ARRAY(
+            SELECT am.id
+            FROM album_members am
+            JOIN albums a ON a.id = am.album_id
+            WHERE am.album_id = :album_id AND a.deleted_at IS NOT NULL
+            LIMIT :chunk_size
+        ))
+    """)
+    
+    result = db.execute(query, {"album_id": album_id, "chunk_size": chunk_size})
+    return result.rowcount
+
+
+def purge_album(db: Session, album_id: int) -> bool:
+    """Hard-delete a soft-deleted album row once its children have been purged."""
+    query = text("""
+        DELETE FROM albums
+        WHERE id = :album_id AND deleted_at IS NOT NULL
+    """)
+    
+    result = db.execute(query, {"album_id": album_id})
+    return result.rowcount > 0
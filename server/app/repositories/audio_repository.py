@@ -6,41 +6,44 @@ from typing import Optional, List
 def create_audio(
     db: Session,
     image_id: int,
+    album_id: int,
     url: str
 ) -> Optional[dict]:
-    """Create a new audio record."""
+    """
+    Create a new audio record. Returns None if the image already has audio.
+
+    album_id must be the image's album; it is part of the image's key.
+    """
     query = text("""
-        INSERT INTO audio (image_id, url)
-        VALUES (:image_id, :url)
-        RETURNING id, image_id, url, created_at, updated_at
+        INSERT INTO audio (image_id, album_id, url)
+        VALUES (:image_id, :album_id, :url)
+        ON CONFLICT (image_id) DO NOTHING
+        RETURNING id, image_id, album_id, url, created_at, updated_at
     """)
     
-    try:
-        result = db.execute(query, {
-            "image_id": image_id,
-            "url": url
-        })
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "image_id": row[1],
-                "url": row[2],
-                "created_at": str(row[3]),
-                "updated_at": str(row[4])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {
+        "image_id": image_id,
+        "album_id": album_id,
+        "url": url
+    })
+    row = result.fetchone()
+    
+    if row:
+        return {
+            "id": row[0],
+            "image_id": row[1],
+            "album_id": row[2],
+            "url": row[3],
+            "created_at": str(row[4]),
+            "updated_at": str(row[5])
+        }
+    return None
 
 
 def get_audio_by_id(db: Session, audio_id: int) -> Optional[dict]:
     """Get an audio record by ID."""
     query = text("""
-        SELECT id, image_id, url, created_at, updated_at
+        SELECT id, image_id, album_id, url, created_at, updated_at
         FROM audio
         WHERE id = :audio_id
     """)
@@ -52,17 +55,43 @@ def get_audio_by_id(db: Session, audio_id: int) -> Optional[dict]:
         return {
             "id": row[0],
             "image_id": row[1],
-            "url": row[2],
-            "created_at": str(row[3]),
-            "updated_at": str(row[4])
+            "album_id": row[2],
+            "url": row[3],
+            "created_at": str(row[4]),
+            "updated_at": str(row[5])
         }
     return None
 
 
+def get_audio_by_ids(db: Session, audio_ids: List[int]) -> List[dict]:
+    """Get several audio records by ID in one query. Missing IDs are skipped."""
+    if not audio_ids:
+        return []
+    
+    query = text("""
+        SELECT id, image_id, album_id, url, created_at, updated_at
+        FROM audio
+        WHERE id = ANY(:audio_ids)
+    """)
+    
+    result = db.execute(query, {"audio_ids": list(audio_ids)})
+    return [
+        {
+            "id": row[0],
+            "image_id": row[1],
+            "album_id": row[2],
+            "url": row[3],
+            "created_at": str(row[4]),
+            "updated_at": str(row[5])
+        }
+        for row in result
+    ]
+
+
 def get_audio_by_image_id(db: Session, image_id: int) -> Optional[dict]:
     """Get audio record for a specific image."""
     query = text("""
-        SELECT id, image_id, url, created_at, updated_at
+        SELECT id, image_id, album_id, url, created_at, updated_at
         FROM audio
         WHERE image_id = :image_id
         LIMIT 1
@@ -75,13 +104,39 @@ def get_audio_by_image_id(db: Session, image_id: int) -> Optional[dict]:
         return {
             "id": row[0],
             "image_id": row[1],
-            "url": row[2],
-            "created_at": str(row[3]),
-            "updated_at": str(row[4])
+            "album_id": row[2],
+            "url": row[3],
+            "created_at": str(row[4]),
+            "updated_at": str(row[5])
         }
     return None
 
 
+def get_audio_by_image_ids(db: Session, image_ids: List[int]) -> List[dict]:
+    """Get the audio records of several images in one query. Images without audio are skipped."""
+    if not image_ids:
+        return []
+    
+    query = text("""
+        SELECT id, image_id, album_id, url, created_at, updated_at
+        FROM audio
+        WHERE image_id = ANY(:image_ids)
+    """)
+    
+    result = db.execute(query, {"image_ids": list(image_ids)})
+    return [
+        {
+            "id": row[0],
+            "image_id": row[1],
+            "album_id": row[2],
+            "url": row[3],
+            "created_at": str(row[4]),
+            "updated_at": str(row[5])
+        }
+        for row in result
+    ]
+
+
 def update_audio(
     db: Session,
     audio_id: int,
@@ -96,29 +151,25 @@ def update_audio(
         UPDATE audio
         SET url = :url
         WHERE id = :audio_id
-        RETURNING id, image_id, url, created_at, updated_at
+        RETURNING id, image_id, album_id, url, created_at, updated_at
     """)
     
-    try:
-        result = db.execute(query, {
-            "audio_id": audio_id,
-            "url": url
-        })
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "image_id": row[1],
-                "url": row[2],
-                "created_at": str(row[3]),
-                "updated_at": str(row[4])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {
+        "audio_id": audio_id,
+        "url": url
+    })
+    row = result.fetchone()
+    
+    if row:
+        return {
+            "id": row[0],
+            "image_id": row[1],
+            "album_id": row[2],
+            "url": row[3],
+            "created_at": str(row[4]),
+            "updated_at": str(row[5])
+        }
+    return None
 
 
 def delete_audio(db: Session, audio_id: int) -> bool:
@@ -128,13 +179,8 @@ def delete_audio(db: Session, audio_id: int) -> bool:
         WHERE id = :audio_id
     """)
     
-    try:
-        result = db.execute(query, {"audio_id": audio_id})
-        db.commit()
-        return result.rowcount > 0
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {"audio_id": audio_id})
+    return result.rowcount > 0
 
 
 def delete_audio_by_image_id(db: Session, image_id: int) -> bool:
@@ -144,11 +190,19 @@ def delete_audio_by_image_id(db: Session, image_id: int) -> bool:
         WHERE image_id = :image_id
     """)
     
-    try:
-        result = db.execute(query, {"image_id": image_id})
-        db.commit()
-        return result.rowcount > 0
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {"image_id": image_id})
+    return result.rowcount > 0
 
+
+def get_audio_urls(db: Session, after_id: int, limit: int) -> List[dict]:
+    """Get a batch of audio URLs ordered by ID (keyset pagination)."""
+    query = text("""
+        SELECT id, url
+        FROM audio
+        WHERE id > :after_id
+        ORDER BY id
+        LIMIT :limit
+    """)
+    
+    result = db.execute(query, {"after_id": after_id, "limit": limit})
+    return [{"id": row[0], "url": row[1]} for row in result]
@@ -1,6 +1,45 @@
+from datetime import datetime
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Tuple
+
+# Columns returned for every image row, in the order expected by _row_to_image
+IMAGE_COLUMNS = """
+    id, album_id, caption, image_url, latitude, longitude, date_added, user_id, created_at, updated_at,
+    thumbnail_url, medium_url, placeholder
+"""
+
+
+def _to_db_hash(value: Optional[int]) -> Optional[int]:
+    """Store unsigned 64-bit hashes in a signed BIGINT column."""
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _from_db_hash(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+
+def _row_to_image(row) -> dict:
+    """Convert a row selected with IMAGE_COLUMNS into an image dict."""
+    return {
+        "id": row[0],
+        "album_id": row[1],
+        "caption": row[2],
+        "image_url": row[3],
+        "latitude": float(row[4]) if row[4] is not None else None,
+        "longitude": float(row[5]) if row[5] is not None else None,
+        "date_added": str(row[6]),
+        "user_id": row[7],
+        "created_at": str(row[8]),
+        "updated_at": str(row[9]),
+        "thumbnail_url": row[10],
+        "medium_url": row[11],
+        "placeholder": row[12]
+    }
 
 
 def create_image(
@@ -10,76 +49,62 @@ def create_image(
     user_id: int,
     caption: Optional[str] = None,
     latitude: Optional[float] = None,
-    longitude: Optional[float] = None
+    longitude: Optional[float] = None,
+    phash: Optional[int] = None
 ) -> Optional[dict]:
-    """Create a new image."""
-    query = text("""
-        INSERT INTO images (album_id, caption, image_url, latitude, longitude, user_id)
-        VALUES (:album_id, :caption, :image_url, :latitude, :longitude, :user_id)
-        RETURNING id, album_id, caption, image_url, latitude, longitude, date_added, user_id, created_at, updated_at
-    """)
-    
-    try:
-        result = db.execute(query, {
-            "album_id": album_id,
-            "caption": caption,
-            "image_url": image_url,
-            "latitude": latitude,
-            "longitude": longitude,
-            "user_id": user_id
-        })
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "album_id": row[1],
-                "caption": row[2],
-                "image_url": row[3],
-                "latitude": float(row[4]) if row[4] is not None else None,
-                "longitude": float(row[5]) if row[5] is not None else None,
-                "date_added": str(row[6]),
-                "user_id": row[7],
-                "created_at": str(row[8]),
-                "updated_at": str(row[9])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+    """Create a new image. phash is an optional client-computed 64-bit dHash."""
+    query = text(f"""
+        INSERT INTO images (album_id, caption, image_url, latitude, longitude, user_id, phash)
+        VALUES (:album_id, :caption, :image_url, :latitude, :longitude, :user_id, :phash)
+        RETURNING {IMAGE_COLUMNS}
+    """)
 
+    result = db.execute(query, {
+        "album_id": album_id,
+        "caption": caption,
+        "image_url": image_url,
+        "latitude": latitude,
+        "longitude": longitude,
+        "user_id": user_id,
+        "phash": _to_db_hash(phash)
+    })
+    row = result.fetchone()
 
-def get_image_by_id(db: Session, image_id: int) -> Optional[dict]:
-    """Get an image by ID."""
-    query = text("""
-        SELECT id, album_id, caption, image_url, latitude, longitude, date_added, user_id, created_at, updated_at
+    if row:
+        return _row_to_image(row)
+    return None
+
+
+def get_image_by_id(db: Session, image_id: int, album_id: Optional[int] = None) -> Optional[dict]:
+    """
+    Get an image by ID.
+
+    Pass album_id when it is known. Without it (routes that carry only an
+    image ID) the album comes from image_albums, so either way only that
+    album's partition is read.
+    """
+    if album_id is not None:
+        album_filter = "AND album_id = :album_id"
+    else:
+        album_filter = "AND album_id = (SELECT album_id FROM image_albums WHERE image_id = :image_id)"
+    query = text(f"""
+        SELECT {IMAGE_COLUMNS}
         FROM images
-        WHERE id = :image_id
+        WHERE id = :image_id {album_filter}
     """)
-    
-    result = db.execute(query, {"image_id": image_id})
+
+    result = db.execute(query, {"image_id": image_id, "album_id": album_id})
     row = result.fetchone()
-    
+
     if row:
-        return {
-            "id": row[0],
-            "album_id": row[1],
-            "caption": row[2],
-            "image_url": row[3],
-            "latitude": float(row[4]) if row[4] is not None else None,
-            "longitude": float(row[5]) if row[5] is not None else None,
-            "date_added": str(row[6]),
-            "user_id": row[7],
-            "created_at": str(row[8]),
-            "updated_at": str(row[9])
-        }
+        return _row_to_image(row)
     return None
 
 
 def update_image(
     db: Session,
     image_id: int,
+    album_id: int,
     caption: Optional[str] = None,
     image_url: Optional[str] = None,
     latitude: Optional[float] = None,
@@ -88,100 +113,357 @@ def update_image(
     """Update an image."""
     # Build dynamic update query
     updates = []
-    params = {"image_id": image_id}
-    
+    params = {"image_id": image_id, "album_id": album_id}
+
     if caption is not None:
         updates.append("caption = :caption")
         params["caption"] = caption
-    
+
     if image_url is not None:
         updates.append("image_url = :image_url")
         params["image_url"] = image_url
-    
+        # Derived data belongs to the old original; the ingest pipeline regenerates it
+        updates.append("thumbnail_url = NULL")
+        updates.append("medium_url = NULL")
+        updates.append("placeholder = NULL")
+        updates.append("phash = NULL")
+
     if latitude is not None:
         updates.append("latitude = :latitude")
         params["latitude"] = latitude
-    
+
     if longitude is not None:
         updates.append("longitude = :longitude")
         params["longitude"] = longitude
-    
+
     if not updates:
         # No updates to make, just return the existing image
-        return get_image_by_id(db, image_id)
-    
+        return get_image_by_id(db, image_id, album_id)
+
     query = text(f"""
         UPDATE images
         SET {', '.join(updates)}
-        WHERE id = :image_id
-        RETURNING id, album_id, caption, image_url, latitude, longitude, date_added, user_id, created_at, updated_at
-    """)
-    
-    try:
-        result = db.execute(query, params)
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "album_id": row[1],
-                "caption": row[2],
-                "image_url": row[3],
-                "latitude": float(row[4]) if row[4] is not None else None,
-                "longitude": float(row[5]) if row[5] is not None else None,
-                "date_added": str(row[6]),
-                "user_id": row[7],
-                "created_at": str(row[8]),
-                "updated_at": str(row[9])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+        WHERE id = :image_id AND album_id = :album_id
+        RETURNING {IMAGE_COLUMNS}
+    """)
+
+    result = db.execute(query, params)
+    row = result.fetchone()
+
+    if row:
+        return _row_to_image(row)
+    return None
+
+
+def update_image_ingest(
+    db: Session,
+    image_id: int,
+    album_id: int,
+    source_url: str,
+    placeholder: str,
+    phash: int,
+    thumbnail_url: Optional[str] = None,
+    medium_url: Optional[str] = None
+) -> bool:
+    """
+    Store the ingest pipeline's results for an image.
+
+    The update only applies while the image still points at source_url, so a
+    slow ingest job can't overwrite results for a newer original.
+    """
+    query = text("""
+        UPDATE images
+        SET placeholder = :placeholder,
+            phash = :phash,
+            thumbnail_url = COALESCE(:thumbnail_url, thumbnail_url),
+            medium_url = COALESCE(:medium_url, medium_url)
+        WHERE id = :image_id AND album_id = :album_id AND image_url = :source_url
+    """)
+
+    result = db.execute(query, {
+        "image_id": image_id,
+        "album_id": album_id,
+        "source_url": source_url,
+        "placeholder": placeholder,
+        "phash": _to_db_hash(phash),
+        "thumbnail_url": thumbnail_url,
+        "medium_url": medium_url
+    })
+    return result.rowcount > 0
 
 
-def delete_image(db: Session, image_id: int) -> bool:
+def get_images_without_analysis(db: Session, after_id: int, limit: int) -> List[dict]:
+    """
+    Get a batch of images missing a placeholder or hash, ordered by ID (keyset pagination).
+
+    Reads every partition; the backfill job walks the whole table.
+    """
+    query = text("""
+        SELECT id, album_id, image_url
+        FROM images
+        WHERE (placeholder IS NULL OR phash IS NULL) AND id > :after_id
+        ORDER BY id
+        LIMIT :limit
+    """)
+
+    result = db.execute(query, {"after_id": after_id, "limit": limit})
+    return [{"id": row[0], "album_id": row[1], "image_url": row[2]} for row in result]
+
+
+def set_image_analysis(db: Session, results: List[dict]) -> int:
+    """
+    Store placeholders and hashes for many images in one round trip.
+
+    Each item needs id, album_id, image_url, placeholder and phash; rows whose
+    image_url changed since the batch was read are left for the ingest pipeline.
+    """
+    if not results:
+        return 0
+
+    query = text("""
+        UPDATE images
+        SET placeholder = :placeholder, phash = :phash
+        WHERE id = :id AND album_id = :album_id AND image_url = :image_url
+    """)
+
+    params = [{**item, "phash": _to_db_hash(item["phash"])} for item in results]
+    result = db.execute(query, params)
+    return result.rowcount
+
+
+def get_album_hashes(db: Session, album_id: int) -> List[tuple]:
+    """Get (image_id, phash) for every hashed image in an album."""
+    query = text("""
+        SELECT id, phash
+        FROM images
+        WHERE album_id = :album_id AND phash IS NOT NULL
+    """)
+
+    result = db.execute(query, {"album_id": album_id})
+    return [(row[0], _from_db_hash(row[1])) for row in result]
+
+
+def get_images_by_ids(db: Session, image_ids: List[int], album_ids: List[int]) -> List[dict]:
+    """
+    Get several images by ID in one query. Missing IDs, and images outside
+    album_ids, are skipped; album_ids limits the partitions that are read.
+    """
+    if not image_ids:
+        return []
+
+    query = text(f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images
+        WHERE id = ANY(:image_ids) AND album_id = ANY(:album_ids)
+    """)
+
+    result = db.execute(query, {"image_ids": list(image_ids), "album_ids": list(album_ids)})
+    return [_row_to_image(row) for row in result]
+
+
+def delete_image(db: Session, image_id: int, album_id: int) -> bool:
     """Delete an image."""
     query = text("""
         DELETE FROM images
-        WHERE id = :image_id
+        WHERE id = :image_id AND album_id = :album_id
     """)
-    
-    try:
-        result = db.execute(query, {"image_id": image_id})
-        db.commit()
-        return result.rowcount > 0
-    except Exception as e:
-        db.rollback()
-        raise e
+
+    result = db.execute(query, {"image_id": image_id, "album_id": album_id})
+    return result.rowcount > 0
 
 
 def get_album_images(db: Session, album_id: int) -> List[dict]:
     """Get all images in an album."""
-    query = text("""
-        SELECT id, album_id, caption, image_url, latitude, longitude, date_added, user_id, created_at, updated_at
+    query = text(f"""
+        SELECT {IMAGE_COLUMNS}
         FROM images
         WHERE album_id = :album_id
         ORDER BY date_added DESC
     """)
-    
+
     result = db.execute(query, {"album_id": album_id})
-    images = []
-    
-    for row in result:
-        images.append({
-            "id": row[0],
-            "album_id": row[1],
-            "caption": row[2],
-            "image_url": row[3],
-            "latitude": float(row[4]) if row[4] is not None else None,
-            "longitude": float(row[5]) if row[5] is not None else None,
-            "date_added": str(row[6]),
-            "user_id": row[7],
-            "created_at": str(row[8]),
-            "updated_at": str(row[9])
-        })
-    
-    return images
+    return [_row_to_image(row) for row in result]
+
+
+def get_recent_album_images(db: Session, album_id: int, limit: int) -> List[dict]:
+    """Get the most recently added images of an album."""
+    query = text(f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images
+        WHERE album_id = :album_id
+        ORDER BY date_added DESC, id DESC
+        LIMIT :limit
+    """)
+
+    result = db.execute(query, {"album_id": album_id, "limit": limit})
+    return [_row_to_image(row) for row in result]
+
+
+def get_timeline_images(
+    db: Session,
+    user_id: int,
+    before: Optional[Tuple[datetime, int]],
+    limit: int
+) -> List[dict]:
+    """
+    Get a page of images from every album the user belongs to, newest first.
+
+    Keyset-paginated on (date_added, id): pass the last row of the previous
+    page as before. Each album contributes at most limit keys, read
+    index-only from idx_images_album_date_added, so the sort only orders
+    albums x limit keys and full rows are fetched for the page alone.
+    """
+    keyset = "AND (date_added, id) < (:before_date, :before_id)" if before else ""
+    query = text(f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images
+        WHERE (id, album_id) IN (
+            SELECT recent.id, recent.album_id
+            FROM album_members am
+            JOIN albums a ON a.id = am.album_id AND a.deleted_at IS NULL
+            CROSS JOIN LATERAL (
+                SELECT id, album_id, date_added
+                FROM images
+                WHERE album_id = am.album_id {keyset}
+                ORDER BY date_added DESC, id DESC
+                LIMIT :limit
+            ) recent
+            WHERE am.user_id = :user_id
+            ORDER BY recent.date_added DESC, recent.id DESC
+            LIMIT :limit
+        )
+        ORDER BY date_added DESC, id DESC
+    """)
+
+    params = {"user_id": user_id, "limit": limit}
+    if before:
+        params["before_date"], params["before_id"] = before
+    result = db.execute(query, params)
+    return [_row_to_image(row) for row in result]
+
+
+def get_on_this_day_images(db: Session, user_id: int, month_day: int, before: datetime, limit: int) -> List[dict]:
+    """
+    Get images from the user's albums added on a month and day (MMDD, UTC)
+    of earlier years, newest first.
+
+    Filters with image_month_day() so idx_images_month_day is probed once
+    per album; before is the start of the day, which excludes this year.
+    """
+    query = text(f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images
+        WHERE image_month_day(date_added) = :month_day
+          AND date_added < :before
+          AND album_id IN (
+              SELECT am.album_id
+              FROM album_members am
+              JOIN albums a ON a.id = am.album_id AND a.deleted_at IS NULL
+              WHERE am.user_id = :user_id
+          )
+        ORDER BY date_added DESC, id DESC
+        LIMIT :limit
+    """)
+
+    result = db.execute(query, {"user_id": user_id, "month_day": month_day, "before": before, "limit": limit})
+    return [_row_to_image(row) for row in result]
+
+
+def get_on_this_day_images_by_album(db: Session, month_day: int, before: datetime, limit: int) -> List[dict]:
+    """
+    Get the newest images of every album added on a month and day (MMDD,
+    UTC) of earlier years, at most limit per album. Reads one day of
+    idx_images_month_day in every partition.
+    """
+    query = text(f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM (
+            SELECT images.*, row_number() OVER (PARTITION BY album_id ORDER BY date_added DESC, id DESC) AS rank
+            FROM images
+            WHERE image_month_day(date_added) = :month_day
+              AND date_added < :before
+              AND album_id IN (SELECT id FROM albums WHERE deleted_at IS NULL)
+        ) ranked
+        WHERE rank <= :limit
+        ORDER BY album_id, date_added DESC, id DESC
+    """)
+
+    result = db.execute(query, {"month_day": month_day, "before": before, "limit": limit})
+    return [_row_to_image(row) for row in result]
+
+
+def enable_day_rollups(db: Session, album_ids: List[int], min_images: int) -> int:
+    """
+    Turn on the per-day rollup (album_image_days) of those albums holding at
+    least min_images images that don't have it yet. Returns how many were
+    turned on.
+    """
+    query = text("""
+        SELECT COUNT(*) FILTER (WHERE enable_album_day_rollup(album_id))
+        FROM album_stats
+        WHERE album_id = ANY(:album_ids) AND NOT day_rollup AND image_count >= :min_images
+    """)
+
+    return db.execute(query, {"album_ids": list(album_ids), "min_images": min_images}).scalar()
+
+
+def get_image_histogram(db: Session, album_ids: List[int], bucket: str) -> List[dict]:
+    """
+    Count the albums' images per day, week or month (UTC), oldest first.
+
+    Albums with a rollup are summed from album_image_days, one row per day;
+    the rest are counted with an index-only scan of idx_images_album_date_added.
+    """
+    if not album_ids:
+        return []
+
+    flags = db.execute(
+        text("SELECT album_id, day_rollup FROM album_stats WHERE album_id = ANY(:album_ids)"),
+        {"album_ids": list(album_ids)}
+    )
+    rolled_up, counted = [], []
+    for album_id, day_rollup in flags:
+        (rolled_up if day_rollup else counted).append(album_id)
+
+    # Each counted album gets its own index-only scan, grouped per album
+    # before the merge, whatever share of the table the albums hold
+    query = text("""
+        SELECT bucket, SUM(image_count)
+        FROM (
+            SELECT date_trunc(:bucket, day::TIMESTAMP)::DATE AS bucket, image_count
+            FROM album_image_days
+            WHERE album_id = ANY(:rolled_up)
+            UNION ALL
+            SELECT per_album.bucket, per_album.image_count
+            FROM unnest(CAST(:counted AS INTEGER[])) AS counted(album_id)
+            CROSS JOIN LATERAL (
+                SELECT date_trunc(:bucket, date_added AT TIME ZONE 'UTC')::DATE AS bucket, COUNT(*) AS image_count
+                FROM images
+                WHERE album_id = counted.album_id AND date_added IS NOT NULL
+                GROUP BY 1
+            ) per_album
+        ) counts
+        GROUP BY bucket
+        HAVING SUM(image_count) > 0
+        ORDER BY bucket
+    """)
+
+    result = db.execute(query, {"bucket": bucket, "rolled_up": rolled_up, "counted": counted})
+    return [{"start": row[0].isoformat(), "count": int(row[1])} for row in result]
+
+
+def get_image_media_urls(db: Session, after_id: int, limit: int) -> List[dict]:
+    """Get a batch of image media URLs ordered by ID (keyset pagination). Reads every partition."""
+    query = text("""
+        SELECT id, image_url, thumbnail_url, medium_url
+        FROM images
+        WHERE id > :after_id
+        ORDER BY id
+        LIMIT :limit
+    """)
 
+    result = db.execute(query, {"after_id": after_id, "limit": limit})
+    return [
+        {"id": row[0], "urls": [url for url in row[1:] if url]}
+        for row in result
+    ]
@@ -0,0 +1,49 @@
+"""
+Index access paths the repositories depend on.
+
+Each entry names the leading columns a query filters (and then orders) on;
+expression columns are written the way pg_get_indexdef prints them.
+The index audit (python -m app.jobs.index_audit) reports entries that no
+index serves, and won't call an index redundant or unused while an entry
+needs it. Add an entry when a new query needs an index.
+"""
+from typing import NamedTuple, Tuple
+
+
+class AccessPath(NamedTuple):
+    table: str
+    columns: Tuple[str, ...]  # Leading index columns, in order
+    used_by: str
+
+
+QUERY_CATALOG = (
+    AccessPath("users", ("email",), "user_repository.get_user_by_email, create_user"),
+    AccessPath("albums", ("owner_id",), "album_repository.get_user_albums"),
+    AccessPath("albums", ("deleted_at",), "album_repository.get_albums_pending_purge"),
+    AccessPath("albums", ("change_xid",), "sync_repository.get_changes"),
+    AccessPath("album_members", ("album_id", "user_id"), "album_member_repository.is_album_member, remove_album_members"),
+    AccessPath(
+        "album_members", ("user_id",),
+        "album_repository.get_user_albums, album_member_repository.get_user_album_ids, sync_repository.get_user_sync_albums"
+    ),
+    AccessPath("album_members", ("album_id", "change_xid"), "sync_repository.get_changes"),
+    AccessPath("album_members", ("change_xid",), "sync_repository.get_changes"),
+    AccessPath(
+        "images", ("album_id", "date_added"),
+        "image_repository.get_album_images, get_recent_album_images, get_timeline_images, get_image_histogram"
+    ),
+    AccessPath(
+        "images", ("image_month_day(date_added)", "album_id"),
+        "image_repository.get_on_this_day_images, get_on_this_day_images_by_album"
+    ),
+    AccessPath("images", ("album_id", "change_xid"), "sync_repository.get_changes"),
+    AccessPath("images", ("change_xid",), "sync_repository.get_changes"),
+    AccessPath("images", ("album_id", "phash"), "image_repository.get_album_hashes"),
+    AccessPath("audio", ("image_id",), "audio_repository.get_audio_by_image_id, create_audio"),
+    AccessPath("audio", ("change_xid",), "sync_repository.get_changes"),
+    AccessPath("audio", ("album_id", "change_xid"), "sync_repository.get_changes"),
+    AccessPath("sync_tombstones", ("album_id", "change_xid"), "sync_repository.get_changes"),
+    AccessPath("sync_tombstones", ("change_xid",), "sync_repository.get_changes"),
+    AccessPath("sync_tombstones", ("user_id", "change_xid"), "sync_repository.get_changes"),
+    AccessPath("sync_tombstones", ("created_at",), "sync_repository.prune_tombstones"),
+)
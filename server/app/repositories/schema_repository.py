@@ -0,0 +1,120 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+
+
+def get_indexes(db: Session) -> List[dict]:
+    """
+    Get every index on the public schema's tables with its columns, kind and usage counters.
+
+    A partitioned table's index is reported once, with its partitions' scans
+    and sizes summed; the per-partition copies are left out.
+    """
+    query = text("""
+        SELECT
+            t.relname,
+            i.relname,
+            am.amname,
+            -- Plain columns by name, expression columns as their SQL text
+            ARRAY(
+                SELECT pg_get_indexdef(ix.indexrelid, k.position, true)
+                FROM generate_series(1, ix.indnatts) AS k(position)
+                ORDER BY k.position
+            ),
+            ix.indexprs IS NOT NULL,
+            ix.indpred IS NOT NULL,
+            ix.indisunique,
+            ix.indisprimary,
+            EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid),
+            COALESCE(
+                (
+                    SELECT SUM(ps.idx_scan)::bigint
+                    FROM pg_partition_tree(ix.indexrelid) pt
+                    JOIN pg_stat_user_indexes ps ON ps.indexrelid = pt.relid
+                ),
+                s.idx_scan,
+                0
+            ),
+            COALESCE(
+                (SELECT SUM(pg_relation_size(pt.relid))::bigint FROM pg_partition_tree(ix.indexrelid) pt),
+                pg_relation_size(ix.indexrelid)
+            )
+        FROM pg_index ix
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        JOIN pg_am am ON am.oid = i.relam
+        LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = ix.indexrelid
+        WHERE n.nspname = 'public' AND NOT t.relispartition
+        ORDER BY t.relname, i.relname
+    """)
+
+    result = db.execute(query)
+    return [
+        {
+            "table": row[0],
+            "name": row[1],
+            "method": row[2],
+            "columns": list(row[3]),
+            "has_expressions": row[4],
+            "partial": row[5],
+            "unique": row[6],
+            "primary": row[7],
+            "constraint": row[8],
+            "scans": row[9],
+            "size_bytes": row[10]
+        }
+        for row in result
+    ]
+
+
+def get_foreign_keys(db: Session) -> List[dict]:
+    """
+    Get every foreign key on the public schema's tables with its referencing columns.
+
+    Copies made for partitions (conparentid set) are left out.
+    """
+    query = text("""
+        SELECT
+            t.relname,
+            c.conname,
+            ARRAY(
+                SELECT a.attname
+                FROM unnest(c.conkey) WITH ORDINALITY AS k(attnum, position)
+                JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+                ORDER BY k.position
+            )
+        FROM pg_constraint c
+        JOIN pg_class t ON t.oid = c.conrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE c.contype = 'f' AND n.nspname = 'public' AND c.conparentid = 0
+        ORDER BY t.relname, c.conname
+    """)
+
+    result = db.execute(query)
+    return [{"table": row[0], "name": row[1], "columns": list(row[2])} for row in result]
+
+
+def get_stats_reset(db: Session) -> Optional[str]:
+    """When the current database's statistics (and so index scan counts) were last reset."""
+    query = text("""
+        SELECT stats_reset
+        FROM pg_stat_database
+        WHERE datname = current_database()
+    """)
+
+    value = db.execute(query).scalar()
+    return str(value) if value else None
+
+
+def get_id_sequence_positions(db: Session, tables: List[str]) -> Dict[str, Optional[int]]:
+    """The last ID each table's id sequence handed out, None if it hasn't handed out any."""
+    query = text("""
+        SELECT t.name, s.last_value
+        FROM unnest(CAST(:tables AS TEXT[])) AS t(name)
+        JOIN pg_sequences s
+            ON format('%I.%I', s.schemaname, s.sequencename)::regclass = pg_get_serial_sequence(t.name, 'id')::regclass
+    """)
+
+    result = db.execute(query, {"tables": list(tables)})
+    return {row[0]: row[1] for row in result}
@@ -0,0 +1,159 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Tuple
+
+# Order in which entities that share a change_xid are returned
+CHANGE_KINDS = ("album", "album_member", "image", "audio", "tombstone")
+
+
+def begin_snapshot(db: Session) -> int:
+    """
+    Start a repeatable-read transaction and return its snapshot's xmin.
+
+    Must be the first statement on the session. Every transaction with an ID
+    below the returned value had finished when the snapshot was taken.
+    """
+    db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    return int(db.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text")).scalar())
+
+
+def get_pruned_xid(db: Session) -> int:
+    """Highest change_xid of any tombstone pruned so far."""
+    result = db.execute(text("SELECT pruned_xid::text FROM sync_horizon"))
+    value = result.scalar()
+    return int(value) if value is not None else 0
+
+
+def get_user_sync_albums(db: Session, user_id: int, since: int) -> List[Tuple[int, bool]]:
+    """Get (album_id, joined_since) for every live album the user belongs to."""
+    query = text("""
+        SELECT am.album_id, am.change_xid >= CAST(:since AS xid8)
+        FROM album_members am
+        JOIN albums a ON a.id = am.album_id
+        WHERE am.user_id = :user_id AND a.deleted_at IS NULL
+    """)
+
+    result = db.execute(query, {"user_id": user_id, "since": str(since)})
+    return [(row[0], row[1]) for row in result]
+
+
+def get_changes(
+    db: Session,
+    user_id: int,
+    known_album_ids: List[int],
+    new_album_ids: List[int],
+    since: int,
+    after: Tuple[int, int, int],
+    limit: int
+) -> List[Tuple[int, int, int]]:
+    """
+    List (change_xid, kind, id) of rows changed since a snapshot, in keyset order.
+
+    Known albums only contribute rows written at or after since; newly joined
+    albums contribute everything. kind indexes CHANGE_KINDS. Rows strictly
+    after the (change_xid, kind, id) position are returned.
+    """
+    # One branch per condition rather than ORs, so each can use its
+    # (album_id, change_xid) or change_xid index; known and new are disjoint
+    query = text("""
+        SELECT change_xid::text, kind, id
+        FROM (
+            SELECT a.change_xid, 0 AS kind, a.id
+            FROM albums a
+            WHERE a.id = ANY(:known) AND a.change_xid >= CAST(:since AS xid8)
+            UNION ALL
+            SELECT a.change_xid, 0, a.id
+            FROM albums a
+            WHERE a.id = ANY(:new)
+            UNION ALL
+            SELECT m.change_xid, 1, m.id
+            FROM album_members m
+            WHERE m.album_id = ANY(:known) AND m.change_xid >= CAST(:since AS xid8)
+            UNION ALL
+            SELECT m.change_xid, 1, m.id
+            FROM album_members m
+            WHERE m.album_id = ANY(:new)
+            UNION ALL
+            SELECT i.change_xid, 2, i.id
+            FROM images i
+            WHERE i.album_id = ANY(:known) AND i.change_xid >= CAST(:since AS xid8)
+            UNION ALL
+            SELECT i.change_xid, 2, i.id
+            FROM images i
+            WHERE i.album_id = ANY(:new)
+            UNION ALL
+            SELECT au.change_xid, 3, au.id
+            FROM audio au
+            WHERE au.album_id = ANY(:known) AND au.change_xid >= CAST(:since AS xid8)
+            UNION ALL
+            SELECT au.change_xid, 3, au.id
+            FROM audio au
+            WHERE au.album_id = ANY(:new)
+            UNION ALL
+            SELECT t.change_xid, 4, t.id
+            FROM sync_tombstones t
+            WHERE t.album_id = ANY(:known) AND t.change_xid >= CAST(:since AS xid8)
+            UNION ALL
+            SELECT t.change_xid, 4, t.id
+            FROM sync_tombstones t
+            WHERE t.user_id = :user_id AND t.change_xid >= CAST(:since AS xid8)
+              AND NOT t.album_id = ANY(:known)
+        ) changes
+        WHERE (change_xid, kind, id) > (CAST(:after_xid AS xid8), :after_kind, :after_id)
+        ORDER BY change_xid, kind, id
+        LIMIT :limit
+    """)
+
+    result = db.execute(query, {
+        "user_id": user_id,
+        "known": list(known_album_ids),
+        "new": list(new_album_ids),
+        "since": str(since),
+        "after_xid": str(after[0]),
+        "after_kind": after[1],
+        "after_id": after[2],
+        "limit": limit
+    })
+    return [(int(row[0]), row[1], row[2]) for row in result]
+
+
+def get_tombstones_by_ids(db: Session, tombstone_ids: List[int]) -> List[dict]:
+    """Get several tombstones by ID in one query."""
+    if not tombstone_ids:
+        return []
+
+    query = text("""
+        SELECT entity, entity_id, album_id, user_id
+        FROM sync_tombstones
+        WHERE id = ANY(:tombstone_ids)
+    """)
+
+    result = db.execute(query, {"tombstone_ids": list(tombstone_ids)})
+    return [
+        {
+            "entity": row[0],
+            "id": row[1],
+            "album_id": row[2],
+            "user_id": row[3]
+        }
+        for row in result
+    ]
+
+
+def prune_tombstones(db: Session, retention_days: int) -> int:
+    """Delete tombstones older than retention_days and raise the sync horizon past them."""
+    query = text("""
+        WITH pruned AS (
+            DELETE FROM sync_tombstones
+            WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => :retention_days)
+            RETURNING change_xid
+        ), horizon AS (
+            UPDATE sync_horizon
+            SET pruned_xid = GREATEST(pruned_xid, (SELECT MAX(change_xid) FROM pruned))
+            WHERE EXISTS (SELECT 1 FROM pruned)
+        )
+        SELECT COUNT(*) FROM pruned
+    """)
+
+    result = db.execute(query, {"retention_days": retention_days})
+    return result.scalar()
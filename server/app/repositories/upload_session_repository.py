@@ -0,0 +1,148 @@
+import json
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+SESSION_COLUMNS = """
+    id, user_id, kind, album_id, image_id, upload_length, upload_offset,
+    sha256, metadata, url, record_id, expires_at, created_at
+"""
+
+
+def _row_to_session(row) -> dict:
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "kind": row[2],
+        "album_id": row[3],
+        "image_id": row[4],
+        "length": row[5],
+        "offset": row[6],
+        "sha256": row[7],
+        "metadata": row[8],
+        "url": row[9],
+        "record_id": row[10],
+        "expires_at": str(row[11]),
+        "created_at": str(row[12])
+    }
+
+
+def create_upload_session(
+    db: Session,
+    user_id: int,
+    kind: str,
+    album_id: int,
+    image_id: Optional[int],
+    length: int,
+    sha256: str,
+    metadata: dict,
+    ttl_hours: int
+) -> dict:
+    """Create an upload session that expires ttl_hours from now."""
+    query = text(f"""
+        INSERT INTO upload_sessions (user_id, kind, album_id, image_id, upload_length, sha256, metadata, expires_at)
+        VALUES (
+            :user_id, :kind, :album_id, :image_id, :length, :sha256, CAST(:metadata AS JSONB),
+            CURRENT_TIMESTAMP + make_interval(hours => :ttl_hours)
+        )
+        RETURNING {SESSION_COLUMNS}
+    """)
+
+    result = db.execute(query, {
+        "user_id": user_id,
+        "kind": kind,
+        "album_id": album_id,
+        "image_id": image_id,
+        "length": length,
+        "sha256": sha256,
+        "metadata": json.dumps(metadata),
+        "ttl_hours": ttl_hours
+    })
+    return _row_to_session(result.fetchone())
+
+
+def get_upload_session(db: Session, upload_id: int, for_update: bool = False) -> Optional[dict]:
+    """
+    Get an upload session that hasn't expired. With for_update, lock it until
+    the transaction ends.
+    """
+    query = text(f"""
+        SELECT {SESSION_COLUMNS}
+        FROM upload_sessions
+        WHERE id = :upload_id AND expires_at > CURRENT_TIMESTAMP
+        {"FOR UPDATE" if for_update else ""}
+    """)
+
+    result = db.execute(query, {"upload_id": upload_id})
+    row = result.fetchone()
+    return _row_to_session(row) if row else None
+
+
+def move_upload_offset(db: Session, upload_id: int, from_offset: int, to_offset: int) -> bool:
+    """Move the offset if it is still from_offset. False if another request moved it first."""
+    query = text("""
+        UPDATE upload_sessions
+        SET upload_offset = :to_offset
+        WHERE id = :upload_id AND upload_offset = :from_offset AND url IS NULL
+    """)
+
+    result = db.execute(query, {"upload_id": upload_id, "from_offset": from_offset, "to_offset": to_offset})
+    return result.rowcount > 0
+
+
+def set_upload_session_url(db: Session, upload_id: int, url: str) -> bool:
+    """Record where the finished file was stored. False if a URL was already recorded."""
+    query = text("UPDATE upload_sessions SET url = :url WHERE id = :upload_id AND url IS NULL")
+    result = db.execute(query, {"upload_id": upload_id, "url": url})
+    return result.rowcount > 0
+
+
+def complete_upload_session(db: Session, upload_id: int, record_id: int) -> None:
+    """Record the image or audio created from the upload."""
+    query = text("UPDATE upload_sessions SET record_id = :record_id WHERE id = :upload_id")
+    db.execute(query, {"upload_id": upload_id, "record_id": record_id})
+
+
+def delete_upload_session(db: Session, upload_id: int) -> bool:
+    """Delete an upload session. Returns True if it existed."""
+    query = text("DELETE FROM upload_sessions WHERE id = :upload_id")
+    result = db.execute(query, {"upload_id": upload_id})
+    return result.rowcount > 0
+
+
+def delete_expired_upload_sessions(db: Session, limit: int) -> List[int]:
+    """Delete up to limit expired upload sessions; returns their IDs."""
+    query = text("""
+        DELETE FROM upload_sessions
+        WHERE id IN (
+            SELECT id FROM upload_sessions
+            WHERE expires_at <= CURRENT_TIMESTAMP
+            ORDER BY expires_at
+            LIMIT :limit
+        )
+        RETURNING id
+    """)
+
+    result = db.execute(query, {"limit": limit})
+    return [row[0] for row in result]
+
+
+def get_existing_upload_session_ids(db: Session, upload_ids: List[int]) -> List[int]:
+    """The IDs among upload_ids that still have a session row, expired or not."""
+    query = text("SELECT id FROM upload_sessions WHERE id = ANY(:upload_ids)")
+    result = db.execute(query, {"upload_ids": upload_ids})
+    return [row[0] for row in result]
+
+
+def get_upload_session_urls(db: Session, after_id: int, limit: int) -> List[dict]:
+    """Get a batch of stored upload URLs not yet turned into records, ordered by ID (keyset pagination)."""
+    query = text("""
+        SELECT id, url
+        FROM upload_sessions
+        WHERE id > :after_id AND url IS NOT NULL AND record_id IS NULL
+        ORDER BY id
+        LIMIT :limit
+    """)
+
+    result = db.execute(query, {"after_id": after_id, "limit": limit})
+    return [{"id": row[0], "url": row[1]} for row in result]
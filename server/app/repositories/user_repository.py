@@ -1,39 +1,35 @@
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional
 from app.utils.auth import get_password_hash
 
 
 def create_user(db: Session, email: str, password: str, name: str) -> Optional[dict]:
-    """Create a new user in the database."""
+    """Create a new user in the database. Returns None if the email is already registered."""
     password_hash = get_password_hash(password)
     
     query = text("""
         INSERT INTO users (email, password_hash, name)
         VALUES (:email, :password_hash, :name)
+        ON CONFLICT (email) DO NOTHING
         RETURNING id, email, name, created_at
     """)
     
-    try:
-        result = db.execute(query, {
-            "email": email,
-            "password_hash": password_hash,
-            "name": name
-        })
-        db.commit()
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "email": row[1],
-                "name": row[2],
-                "created_at": str(row[3])
-            }
-        return None
-    except Exception as e:
-        db.rollback()
-        raise e
+    result = db.execute(query, {
+        "email": email,
+        "password_hash": password_hash,
+        "name": name
+    })
+    row = result.fetchone()
+    
+    if row:
+        return {
+            "id": row[0],
+            "email": row[1],
+            "name": row[2],
+            "created_at": str(row[3])
+        }
+    return None
 
 
 def get_user_by_email(db: Session, email: str) -> Optional[dict]:
@@ -77,3 +73,18 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[dict]:
             "created_at": str(row[3])
         }
     return None
+
+
+def get_user_names(db: Session, user_ids: List[int]) -> Dict[int, str]:
+    """Get {user ID: name} for several users in one query. Missing IDs are skipped."""
+    if not user_ids:
+        return {}
+    
+    query = text("""
+        SELECT id, name
+        FROM users
+        WHERE id = ANY(:user_ids)
+    """)
+    
+    result = db.execute(query, {"user_ids": list(user_ids)})
+    return {row[0]: row[1] for row in result}
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status, Security
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
 from app.config.db import get_db
 from app.dependencies.auth import get_current_user, security
-from app.schemas.album import AlbumCreate, AlbumUpdate, AlbumResponse, AlbumMemberAdd, AlbumMemberResponse
-from app.services import album_service
+from app.dependencies.client_hints import get_client_hints
+from app.dependencies.read_db import get_read_db, get_read_user
+from app.schemas.album import (
+    AlbumCreate, AlbumUpdate, AlbumResponse, AlbumMemberAdd, AlbumMemberResponse, AlbumMemberPage,
+    AlbumMembersUpdate, AlbumMembersUpdateResult
+)
+from app.schemas.timeline import ImageHistogram
+from app.services import album_cover_service, album_service, histogram_service
+from app.utils.responsive_images import ClientHints
 
 router = APIRouter(prefix="/albums", tags=["Albums"])
 
@@ -21,21 +29,60 @@ async def create_album(
 
 @router.get("", response_model=List[AlbumResponse], dependencies=[Security(security)])
 async def get_albums(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    hints: ClientHints = Depends(get_client_hints),
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
 ):
-    """Get all albums for the authenticated user (owned or member)."""
-    return album_service.get_user_albums(db, current_user["id"])
+    """
+    Get all albums for the authenticated user (owned or member).
+
+    Each album includes its image, audio and member counts and a cover preview
+    (the newest image), so clients can render the list without per-album requests.
+    """
+    return await run_in_threadpool(album_service.get_user_albums, db, current_user["id"], hints)
 
 
 @router.get("/{album_id}", response_model=AlbumResponse, dependencies=[Security(security)])
 async def get_album(
     album_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
 ):
     """Get an album by ID. User must be owner or member."""
-    return album_service.get_album(db, album_id, current_user["id"])
+    return await run_in_threadpool(album_service.get_album, db, album_id, current_user["id"])
+
+
+@router.get("/{album_id}/cover", dependencies=[Security(security)])
+async def get_album_cover(
+    album_id: int,
+    request: Request,
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Collage of the album's newest images as one small image, for the album list.
+
+    Supports If-None-Match; the ETag changes whenever the images shown change.
+    """
+    # Rendering downloads the tiles, so keep it off the event loop
+    cover = await run_in_threadpool(album_cover_service.get_album_cover, db, album_id, current_user["id"])
+    # A placeholder stands in for a cover that failed to render; have clients ask again
+    cache_control = "private, no-cache" if cover["placeholder"] else "private, max-age=60"
+    headers = {"ETag": f'"{cover["etag"]}"', "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cover["data"], media_type=cover["media_type"], headers=headers)
+
+
+@router.get("/{album_id}/histogram", response_model=ImageHistogram, dependencies=[Security(security)])
+async def get_album_histogram(
+    album_id: int,
+    bucket: Literal["day", "week", "month"] = Query(default="month"),
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
+):
+    """Count the album's images per day, week or month (UTC), for the timeline scrubber."""
+    return await run_in_threadpool(histogram_service.get_album_histogram, db, album_id, current_user["id"], bucket)
 
 
 @router.put("/{album_id}", response_model=AlbumResponse, dependencies=[Security(security)])
@@ -52,14 +99,43 @@ async def update_album(
 @router.delete("/{album_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Security(security)])
 async def delete_album(
     album_id: int,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete an album. Only the owner can delete."""
-    album_service.delete_album(db, album_id, current_user["id"])
+    """Delete an album. Only the owner can delete. Contents are purged in the background."""
+    album_service.delete_album(db, album_id, current_user["id"], background_tasks)
     return None
 
 
+@router.get("/{album_id}/members", response_model=AlbumMemberPage, dependencies=[Security(security)])
+async def get_album_members(
+    album_id: int,
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    limit: int = Query(default=album_service.MEMBERS_PAGE_DEFAULT_LIMIT, ge=1, le=album_service.MEMBERS_PAGE_MAX_LIMIT),
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
+):
+    """List an album's members (including the owner) with their names, oldest membership first."""
+    return await run_in_threadpool(album_service.get_album_members, db, album_id, current_user["id"], cursor, limit)
+
+
+@router.post("/{album_id}/members/bulk", response_model=AlbumMembersUpdateResult, dependencies=[Security(security)])
+async def update_album_members(
+    album_id: int,
+    update: AlbumMembersUpdate,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Add and remove several members at once. Only the owner can change members.
+
+    Users who are already members, or don't exist, are skipped rather than failing
+    the request; the response lists who was actually added and removed.
+    """
+    return album_service.update_album_members(db, album_id, update, current_user["id"])
+
+
 @router.post("/{album_id}/members", response_model=dict, status_code=status.HTTP_201_CREATED, dependencies=[Security(security)])
 async def add_album_member(
     album_id: int,
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Security
 from sqlalchemy.orm import Session
 from app.config.db import get_db
 from app.dependencies.auth import get_current_user, security
+from app.dependencies.read_db import get_read_db, get_read_user
 from app.schemas.audio import AudioCreate, AudioUpdate, AudioResponse
 from app.services import audio_service
 
@@ -21,8 +22,8 @@ async def create_audio(
 @router.get("/{audio_id}", response_model=AudioResponse, dependencies=[Security(security)])
 async def get_audio(
     audio_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
 ):
     """Get audio by ID. User must have access to the associated image's album."""
     return audio_service.get_audio(db, audio_id, current_user["id"])
@@ -31,8 +32,8 @@ async def get_audio(
 @router.get("/image/{image_id}", response_model=AudioResponse, dependencies=[Security(security)])
 async def get_audio_by_image(
     image_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
 ):
     """Get audio for a specific image. User must have access to the image's album."""
     return audio_service.get_audio_by_image(db, image_id, current_user["id"])
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Security
 from sqlalchemy.orm import Session
-from app.config.db import get_db
+from app.config.db import get_db, unit_of_work
 from app.schemas.auth import UserRegister, UserLogin, Token, UserResponse
 from app.repositories.user_repository import create_user, get_user_by_email
 from app.utils.auth import verify_password, create_access_token
@@ -12,28 +12,22 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """Register a new user."""
-    # Check if user already exists
-    existing_user = get_user_by_email(db, user_data.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Create new user
+    # Create new user; the unique email constraint rejects existing accounts
     try:
-        new_user = create_user(db, user_data.email, user_data.password, user_data.name)
-        if new_user is None:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create user"
-            )
-        return new_user
+        with unit_of_work(db):
+            new_user = create_user(db, user_data.email, user_data.password, user_data.name)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
         )
+    
+    if new_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    return new_user
 
 
 @router.post("/login", response_model=Token)
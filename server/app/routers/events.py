@@ -0,0 +1,66 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, Request, Security
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.config.db import close_shard_sessions, get_db
+from app.dependencies.auth import get_current_user, security
+from app.services import album_service
+from app.services.change_feed_service import feed
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+HEARTBEAT_SECONDS = 20  # Keeps proxies from closing idle streams
+
+
+def _format_event(event: dict) -> str:
+    return f"event: {event['entity']}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.get("", dependencies=[Security(security)])
+async def stream_events(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-Sent Events stream of changes to the albums the user can see.
+
+    Event types are album, image, audio and album_member, each with op
+    (INSERT, UPDATE or DELETE), id, album_id and user_id. A resync event
+    means changes may have been missed and listings should be refetched.
+    """
+    # Subscribe first, so membership changes committed while the albums load still apply
+    subscriber = feed.subscribe(current_user["id"])
+    try:
+        album_ids = await run_in_threadpool(album_service.get_user_album_ids, db, current_user["id"])
+    except BaseException:
+        feed.unsubscribe(subscriber)
+        raise
+    finally:
+        # Release the pooled connections now; the stream can stay open for hours
+        close_shard_sessions(db)
+        db.close()
+    feed.add_albums(subscriber, album_ids)
+
+    async def stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+                yield _format_event(event)
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
+from app.config.admission import admission_controller
+from app.config.db import replica_router
 from app.repositories.health_repository import HealthRepository
+from app.services import album_cache_service, shard_service
 
 router = APIRouter(prefix="/health", tags=["health"])
 repository = HealthRepository()
@@ -8,3 +11,24 @@ repository = HealthRepository()
 @router.get("")
 async def health_check():
     return repository.ping_database()
+
+
+@router.get("/cache")
+async def cache_stats():
+    return album_cache_service.stats()
+
+
+@router.get("/replicas")
+async def replica_status():
+    return replica_router.status()
+
+
+@router.get("/shards")
+def shard_id_usage():
+    """How much of each shard's ID range every album-scoped table has used."""
+    return shard_service.id_usage()
+
+
+@router.get("/admission")
+async def admission_status():
+    return admission_controller.snapshot()
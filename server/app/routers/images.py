@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, Security
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from datetime import date
+from typing import List, Optional
 from app.config.db import get_db
 from app.dependencies.auth import get_current_user, security
-from app.schemas.image import ImageCreate, ImageUpdate, ImageResponse
-from app.services import image_service
+from app.dependencies.read_db import get_read_db, get_read_user
+from app.dependencies.client_hints import get_client_hints
+from app.utils.responsive_images import ClientHints
+from app.schemas.image import ImageCreate, ImageUpdate, ImageResponse, DuplicateCheck, DuplicateMatch
+from app.services import image_service, on_this_day_service
 
 router = APIRouter(prefix="/images", tags=["Images"])
 
@@ -12,32 +17,63 @@ router = APIRouter(prefix="/images", tags=["Images"])
 @router.post("", response_model=ImageResponse, status_code=status.HTTP_201_CREATED, dependencies=[Security(security)])
 async def create_image(
     image_data: ImageCreate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
+    hints: ClientHints = Depends(get_client_hints),
     db: Session = Depends(get_db)
 ):
-    """Create a new image. User must be owner or member of the album."""
-    return image_service.create_image(db, image_data, current_user["id"])
+    """Create a new image. User must be owner or member of the album. Variants are generated in the background."""
+    return image_service.create_image(db, image_data, current_user["id"], background_tasks, hints)
+
+
+@router.post("/duplicates", response_model=List[DuplicateMatch], dependencies=[Security(security)])
+async def check_duplicates(
+    check: DuplicateCheck,
+    current_user: dict = Depends(get_current_user),
+    hints: ClientHints = Depends(get_client_hints),
+    db: Session = Depends(get_db)
+):
+    """
+    Check whether an album already has a near-duplicate of a photo before uploading it.
+
+    The client sends the photo's 64-bit dHash as 16 hex characters.
+    """
+    return image_service.check_duplicates(db, check, current_user["id"], hints)
+
+
+@router.get("/on-this-day", response_model=List[ImageResponse], dependencies=[Security(security)])
+async def get_on_this_day(
+    day: Optional[date] = Query(default=None, description="The user's local date; defaults to today in UTC"),
+    current_user: dict = Depends(get_read_user),
+    hints: ClientHints = Depends(get_client_hints),
+    db: Session = Depends(get_read_db)
+):
+    """Get images from the user's albums added on this month and day in earlier years, newest first."""
+    return await run_in_threadpool(on_this_day_service.get_on_this_day, db, current_user["id"], day, hints)
 
 
 @router.get("/{image_id}", response_model=ImageResponse, dependencies=[Security(security)])
 async def get_image(
     image_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_read_user),
+    hints: ClientHints = Depends(get_client_hints),
+    db: Session = Depends(get_read_db)
 ):
     """Get an image by ID. User must have access to the album."""
-    return image_service.get_image(db, image_id, current_user["id"])
+    return image_service.get_image(db, image_id, current_user["id"], hints)
 
 
 @router.put("/{image_id}", response_model=ImageResponse, dependencies=[Security(security)])
 async def update_image(
     image_id: int,
     image_data: ImageUpdate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
+    hints: ClientHints = Depends(get_client_hints),
     db: Session = Depends(get_db)
 ):
     """Update an image. Only the creator can update."""
-    return image_service.update_image(db, image_id, image_data, current_user["id"])
+    return image_service.update_image(db, image_id, image_data, current_user["id"], background_tasks, hints)
 
 
 @router.delete("/{image_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Security(security)])
@@ -54,9 +90,16 @@ async def delete_image(
 @router.get("/album/{album_id}", response_model=List[ImageResponse], dependencies=[Security(security)])
 async def get_album_images(
     album_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_read_user),
+    hints: ClientHints = Depends(get_client_hints),
+    db: Session = Depends(get_read_db)
 ):
-    """Get all images in an album. User must have access to the album."""
-    return image_service.get_album_images(db, album_id, current_user["id"])
+    """
+    Get all images in an album. User must have access to the album.
+
+    Thumbnail and display URLs are sized from the Save-Data, Viewport-Width and DPR client hints.
+    """
+    # Off the event loop so members refetching the same album at once overlap
+    # and share one listing query (see VersionedCache)
+    return await run_in_threadpool(image_service.get_album_images, db, album_id, current_user["id"], hints)
 
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from app.config.settings import get_settings
+from app.storage import LocalStorage, get_storage
+from app.storage.local import MEDIA_TYPES
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+# A name is the hash of the file's contents, so a response never changes
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@router.api_route("/{name}", methods=["GET", "HEAD"])
+async def get_media(name: str, request: Request):
+    """
+    Serve a file stored by the local storage backend. Public like Cloudinary
+    delivery URLs: names are unguessable content hashes.
+
+    Supports Range requests (audio scrubbing, resumed downloads), If-Range
+    and If-None-Match; the ETag is the file's SHA-256. With
+    LOCAL_STORAGE_ACCEL_REDIRECT set, nginx sends the body (sendfile) and
+    answers Range requests itself.
+    """
+    storage = get_storage()
+    path = storage.path_for(name) if isinstance(storage, LocalStorage) else None
+    if path is None or not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+
+    stem, _, extension = name.partition(".")
+    headers = {"ETag": f'"{stem}"', "Cache-Control": IMMUTABLE}
+    media_type = MEDIA_TYPES.get(f".{extension}", "application/octet-stream")
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    accel_prefix = get_settings().local_storage_accel_redirect
+    if accel_prefix:
+        relative = path.relative_to(storage.root).as_posix()
+        return Response(
+            media_type=media_type,
+            headers={**headers, "X-Accel-Redirect": f"{accel_prefix.rstrip('/')}/{relative}"}
+        )
+    return FileResponse(path, media_type=media_type, headers=headers)
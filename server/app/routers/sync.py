@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query, Security
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.dependencies.auth import security
+from app.dependencies.client_hints import get_client_hints
+from app.dependencies.read_db import get_read_db, get_read_user
+from app.schemas.sync import SyncResponse
+from app.services import sync_service
+from app.utils.responsive_images import ClientHints
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+
+@router.get("", response_model=SyncResponse, response_model_exclude_defaults=True, dependencies=[Security(security)])
+async def sync(
+    since: Optional[str] = Query(default=None, description="Cursor returned by the previous sync; omit for a full sync"),
+    limit: int = Query(default=sync_service.DEFAULT_LIMIT, ge=1, le=sync_service.MAX_LIMIT),
+    current_user: dict = Depends(get_read_user),
+    hints: ClientHints = Depends(get_client_hints),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get everything that changed in the user's albums since the cursor, including deletions.
+
+    Store the returned cursor and send it as since next time. Empty lists,
+    false flags and null fields are left out of the response.
+    """
+    return sync_service.sync(db, current_user["id"], since, limit, hints)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Query, Security
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Literal, Optional
+from app.dependencies.auth import security
+from app.dependencies.client_hints import get_client_hints
+from app.dependencies.read_db import get_read_db, get_read_user
+from app.schemas.timeline import ImageHistogram, TimelinePage
+from app.services import histogram_service, timeline_service
+from app.utils.responsive_images import ClientHints
+
+router = APIRouter(prefix="/timeline", tags=["Timeline"])
+
+
+@router.get("", response_model=TimelinePage, dependencies=[Security(security)])
+async def get_timeline(
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    limit: int = Query(default=timeline_service.DEFAULT_LIMIT, ge=1, le=timeline_service.MAX_LIMIT),
+    include_audio: bool = Query(default=False, description="Attach each image's audio clip"),
+    current_user: dict = Depends(get_read_user),
+    hints: ClientHints = Depends(get_client_hints),
+    db: Session = Depends(get_read_db)
+):
+    """Get images from every album the user belongs to, newest first."""
+    return timeline_service.get_timeline(db, current_user["id"], cursor, limit, include_audio, hints)
+
+
+@router.get("/histogram", response_model=ImageHistogram, dependencies=[Security(security)])
+async def get_timeline_histogram(
+    bucket: Literal["day", "week", "month"] = Query(default="month"),
+    current_user: dict = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
+):
+    """Count the images of all the user's albums per day, week or month (UTC), for the timeline scrubber."""
+    return await run_in_threadpool(histogram_service.get_timeline_histogram, db, current_user["id"], bucket)
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, Security
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, Request, Response, UploadFile, status, Security
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 from app.config.db import get_db
 from app.dependencies.auth import get_current_user, security
-from app.schemas.upload import UploadSignatureResponse
-from app.utils.cloudinary_utils import generate_upload_signature
+from app.dependencies.client_hints import get_client_hints
+from app.utils.responsive_images import ClientHints
+from app.schemas.upload import (
+    UploadResponse, UploadSessionCreate, UploadSessionResponse, UploadSessionResult, UploadSignatureResponse
+)
+from app.services import upload_service, upload_session_service
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
@@ -18,10 +25,10 @@ async def get_image_upload_signature(
     
     The client can use this signature to upload directly to Cloudinary,
     then send the resulting URL to the backend when creating an image record.
+    With local storage (provider "local") the client POSTs the file to
+    upload_url instead.
     """
-    folder = f"memento/user_{current_user['id']}/images"
-    signature_data = generate_upload_signature(folder=folder, resource_type="image")
-    return UploadSignatureResponse(**signature_data)
+    return upload_service.get_upload_target(current_user["id"], "image")
 
 
 @router.get("/signature/audio", response_model=UploadSignatureResponse, dependencies=[Security(security)])
@@ -35,8 +42,110 @@ async def get_audio_upload_signature(
     Cloudinary supports audio files (MP3, WAV, FLAC, OGG, etc.).
     The client can use this signature to upload directly to Cloudinary,
     then send the resulting URL to the backend when creating an audio record.
+    With local storage (provider "local") the client POSTs the file to
+    upload_url instead.
     """
-    folder = f"memento/user_{current_user['id']}/audio"
-    signature_data = generate_upload_signature(folder=folder, resource_type="raw")
-    return UploadSignatureResponse(**signature_data)
+    return upload_service.get_upload_target(current_user["id"], "audio")
 
+
+@router.post("/image", response_model=UploadResponse, status_code=status.HTTP_201_CREATED, dependencies=[Security(security)])
+async def upload_image(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Upload an image file through the API; create the image record with the returned URL."""
+    return await run_in_threadpool(upload_service.upload, file.file, file.size, current_user["id"], "image")
+
+
+@router.post("/audio", response_model=UploadResponse, status_code=status.HTTP_201_CREATED, dependencies=[Security(security)])
+async def upload_audio(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Upload an audio file through the API; create the audio record with the returned URL."""
+    return await run_in_threadpool(upload_service.upload, file.file, file.size, current_user["id"], "audio")
+
+
+@router.post("/sessions", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED, dependencies=[Security(security)])
+async def create_upload_session(
+    data: UploadSessionCreate,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Start a resumable upload of an image or audio file.
+
+    Send the bytes with PATCH /upload/sessions/{id}, then create the record
+    with POST /upload/sessions/{id}/complete.
+    """
+    session = await run_in_threadpool(upload_session_service.create_session, db, data, current_user["id"])
+    response.headers["Location"] = f"/upload/sessions/{session.id}"
+    return session
+
+
+@router.api_route("/sessions/{upload_id}", methods=["GET", "HEAD"], response_model=UploadSessionResponse, dependencies=[Security(security)])
+async def get_upload_session(
+    upload_id: int,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get how much of an upload has arrived (also in the Upload-Offset header), e.g. after a dropped connection."""
+    session = await run_in_threadpool(upload_session_service.get_session, db, upload_id, current_user["id"])
+    response.headers["Upload-Offset"] = str(session.offset)
+    response.headers["Upload-Length"] = str(session.length)
+    response.headers["Cache-Control"] = "no-store"
+    return session
+
+
+@router.patch("/sessions/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Security(security)])
+async def append_upload_chunk(
+    upload_id: int,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Send the raw bytes of an upload starting at Upload-Offset, which must be
+    the upload's current offset (409 with the right one otherwise). Bytes
+    received before a dropped connection are kept. An optional
+    Upload-Checksum ("sha256 <base64 digest>") must match the body (460 if not).
+    """
+    try:
+        offset = await upload_session_service.append(
+            db, upload_id, current_user["id"], upload_offset, request.stream(), upload_checksum
+        )
+    except ClientDisconnect:
+        # What arrived is kept; there is no client left to answer
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)})
+
+
+@router.post("/sessions/{upload_id}/complete", response_model=UploadSessionResult, dependencies=[Security(security)])
+async def complete_upload_session(
+    upload_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user),
+    hints: ClientHints = Depends(get_client_hints),
+    db: Session = Depends(get_db)
+):
+    """
+    Check a finished upload against its SHA-256 and create its image or audio
+    record. Safe to retry: completing an upload again returns the same record.
+    """
+    return await run_in_threadpool(
+        upload_session_service.complete, db, upload_id, current_user["id"], background_tasks, hints
+    )
+
+
+@router.delete("/sessions/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Security(security)])
+async def cancel_upload_session(
+    upload_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Abandon an upload and discard the bytes sent so far."""
+    await run_in_threadpool(upload_session_service.cancel, db, upload_id, current_user["id"])
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -17,6 +17,15 @@ class AlbumResponse(BaseModel):
     owner_id: int
     created_at: str
     updated_at: str
+    # Aggregates, filled in by the album list (GET /albums)
+    image_count: Optional[int] = None
+    audio_count: Optional[int] = None
+    member_count: Optional[int] = None
+    cover_image_id: Optional[int] = None  # Most recently added image
+    cover_image_url: Optional[str] = None
+    cover_thumbnail_url: Optional[str] = None  # Sized for the client like image thumbnails
+    cover_placeholder: Optional[str] = None  # BlurHash of the cover
+    last_activity_at: Optional[str] = None  # Last image, audio or membership change
 
     class Config:
         from_attributes = True
@@ -36,6 +45,25 @@ class AlbumMemberResponse(BaseModel):
         from_attributes = True
 
 
+class AlbumMembersUpdate(BaseModel):
+    add: List[int] = Field(default_factory=list, max_length=1000)  # User IDs to add
+    remove: List[int] = Field(default_factory=list, max_length=1000)  # User IDs to remove
+
+
+class AlbumMembersUpdateResult(BaseModel):
+    added: List[int]  # Users that weren't members before; existing members and unknown users are skipped
+    removed: List[int]
+
+
+class AlbumMemberInfo(AlbumMemberResponse):
+    name: str
+
+
+class AlbumMemberPage(BaseModel):
+    members: List[AlbumMemberInfo]
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page; None on the last page
+
+
 class AlbumWithMembers(AlbumResponse):
     members: List[AlbumMemberResponse] = []
 
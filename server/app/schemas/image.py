@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from decimal import Decimal
 
+# 64-bit dHash as 16 hex characters (see app.utils.image_processing.compute_dhash)
+PHASH_PATTERN = r"^[0-9a-fA-F]{16}$"
+
 
 class ImageCreate(BaseModel):
     album_id: int
@@ -9,6 +12,8 @@ class ImageCreate(BaseModel):
     image_url: str
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    phash: Optional[str] = Field(default=None, pattern=PHASH_PATTERN)  # Client-computed dHash, enables duplicate checks before ingest
+    allow_duplicate: bool = False  # Create the image even if a near-duplicate is already in the album
 
 
 class ImageUpdate(BaseModel):
@@ -29,7 +34,21 @@ class ImageResponse(BaseModel):
     user_id: int
     created_at: str
     updated_at: str
+    thumbnail_url: Optional[str] = None  # Square grid thumbnail sized for the client
+    medium_url: Optional[str] = None  # Screen-sized variant sized for the client
+    full_url: Optional[str] = None  # Full resolution with automatic format and quality
+    placeholder: Optional[str] = None  # BlurHash to render while the image loads, None until ingest finishes
 
     class Config:
         from_attributes = True
 
+
+class DuplicateCheck(BaseModel):
+    album_id: int
+    phash: str = Field(pattern=PHASH_PATTERN)
+    max_distance: int = Field(default=6, ge=0, le=16)
+
+
+class DuplicateMatch(BaseModel):
+    image: ImageResponse
+    distance: int  # Differing bits between the hashes; 0 means identical
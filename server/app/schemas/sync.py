@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from app.schemas.album import AlbumResponse, AlbumMemberResponse
+from app.schemas.audio import AudioResponse
+from app.schemas.image import ImageResponse
+
+
+class SyncTombstone(BaseModel):
+    entity: str  # album, image, audio or album_member
+    id: int
+    album_id: int
+    user_id: Optional[int] = None  # For album_member: the user who left; for album: the recipient
+
+
+class SyncResponse(BaseModel):
+    """
+    Changes since the client's cursor.
+
+    Clients apply deleted first, then upsert the rest, then store cursor. When
+    reset is true the client must drop its local copy first, because the
+    cursor was too old (or absent) and this is a full snapshot. While has_more
+    is true, call again with the new cursor straight away.
+    """
+    cursor: str
+    has_more: bool = False
+    reset: bool = False
+    albums: List[AlbumResponse] = []
+    members: List[AlbumMemberResponse] = []
+    images: List[ImageResponse] = []
+    audio: List[AudioResponse] = []
+    deleted: List[SyncTombstone] = []
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from app.schemas.audio import AudioResponse
+from app.schemas.image import ImageResponse
+
+
+class TimelineImage(ImageResponse):
+    audio: Optional[AudioResponse] = None  # Only filled in with include_audio
+
+
+class TimelinePage(BaseModel):
+    images: List[TimelineImage]
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page; None on the last page
+
+
+class HistogramBucket(BaseModel):
+    start: str  # First day of the bucket (UTC), YYYY-MM-DD
+    count: int
+
+
+class ImageHistogram(BaseModel):
+    bucket: str  # "day", "week" or "month"
+    buckets: List[HistogramBucket]  # Oldest first; buckets without images are left out
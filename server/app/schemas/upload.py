@@ -1,11 +1,55 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from app.schemas.audio import AudioResponse
+from app.schemas.image import PHASH_PATTERN, ImageResponse
+
+SHA256_PATTERN = r"^[0-9a-f]{64}$"
 
 
 class UploadSignatureResponse(BaseModel):
-    """Response for generating upload signature for direct client uploads"""
+    """Where and how a client uploads a file before creating its image or audio record"""
+    provider: str = "cloudinary"  # "cloudinary", or "local": POST the file as multipart "file" to upload_url
     upload_url: str
-    cloud_name: str
-    api_key: str
-    timestamp: int
-    signature: str
     folder: str
+    # Cloudinary signed-upload parameters
+    cloud_name: Optional[str] = None
+    api_key: Optional[str] = None
+    timestamp: Optional[int] = None
+    signature: Optional[str] = None
+
+
+class UploadResponse(BaseModel):
+    """A file uploaded through the API; pass url as image_url or url when creating the record"""
+    url: str
+    size: int
+    sha256: Optional[str] = None
+
+
+class UploadSessionCreate(BaseModel):
+    """Start a resumable upload; the image or audio record is created when it completes"""
+    kind: Literal["image", "audio"]
+    length: int = Field(gt=0)  # Size of the whole file in bytes
+    sha256: str = Field(pattern=SHA256_PATTERN)  # Hex SHA-256 of the whole file, checked before the record is created
+    album_id: Optional[int] = None  # Image uploads: the album to add the image to
+    image_id: Optional[int] = None  # Audio uploads: the image the clip is for
+    # Image uploads: the other ImageCreate fields
+    caption: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    phash: Optional[str] = Field(default=None, pattern=PHASH_PATTERN)
+    allow_duplicate: bool = False
+
+
+class UploadSessionResponse(BaseModel):
+    """Progress of a resumable upload; PATCH the bytes from offset onwards"""
+    id: int
+    kind: str
+    length: int
+    offset: int  # Bytes received and stored so far
+    expires_at: str
+
+
+class UploadSessionResult(BaseModel):
+    """The record created from a completed upload"""
+    image: Optional[ImageResponse] = None
+    audio: Optional[AudioResponse] = None
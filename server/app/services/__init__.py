@@ -1,10 +1,34 @@
+from . import album_cache_service
 from . import album_service
+from . import album_cover_service
 from . import image_service
 from . import audio_service
+from . import image_ingest_service
+from . import duplicate_service
+from . import album_purge_service
+from . import sync_service
+from . import timeline_service
+from . import on_this_day_service
+from . import histogram_service
+from . import upload_service
+from . import upload_session_service
+from . import shard_service
 
 __all__ = [
+    "album_cache_service",
     "album_service",
+    "album_cover_service",
     "image_service",
     "audio_service",
+    "image_ingest_service",
+    "duplicate_service",
+    "album_purge_service",
+    "sync_service",
+    "timeline_service",
+    "on_this_day_service",
+    "histogram_service",
+    "upload_service",
+    "upload_session_service",
+    "shard_service",
 ]
 
@@ -0,0 +1,174 @@
+"""
+Read-through cache for album listings and album access checks. Access
+checks are only cached when the backend is shared between workers (see
+get_album_access).
+
+Entries are keyed by version counters:
+- album:{id} covers the album row, its member set and its image listing
+- user:{id} covers the list of albums a user can see
+
+Write paths call the invalidate_* helpers after their change is committed,
+which bumps the matching versions so the next read reloads from the database.
+Loads always read the primary (see primary_session), so callers may pass a
+replica session: filling the cache from a lagging replica would store stale
+data under a fresh version.
+Album entries are loaded from the album's shard; a user's album list merges
+the lists from every shard.
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.db import (
+    album_session, all_shard_sessions, close_shard_sessions, open_shard_session, primary_session, shard_router
+)
+from app.config.settings import get_settings
+from app.repositories import album_repository, album_member_repository, image_repository
+from app.utils.cache import MemoryCacheBackend, RedisCacheBackend, VersionedCache
+
+logger = logging.getLogger(__name__)
+
+_cache: Optional[VersionedCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> VersionedCache:
+    """Create the cache from settings on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            settings = get_settings()
+            if settings.cache_backend == "redis":
+                backend = RedisCacheBackend(settings.redis_url)
+            elif settings.cache_backend == "none":
+                backend = None
+            else:
+                backend = MemoryCacheBackend(settings.cache_max_entries)
+            _cache = VersionedCache(backend, ttl=settings.cache_ttl_seconds)
+        return _cache
+
+
+def _load_album_access(album_db: Session, album_id: int) -> Optional[dict]:
+    album = album_repository.get_album_by_id(album_db, album_id)
+    if not album:
+        return None
+    return {"album": album, "member_ids": album_member_repository.get_album_member_ids(album_db, album_id)}
+
+
+def get_album_access(db: Session, album_id: int) -> Optional[dict]:
+    """
+    Return {"album": ..., "member_ids": [...]} for an album, or None if it doesn't exist.
+
+    Only cached in a shared backend: with a per-process one, a removed member
+    would keep access through other workers until their entries expired.
+    Uncached, it is read through db, so a replica session can answer it.
+    """
+    cache = get_cache()
+    if not cache.shared:
+        return _load_album_access(album_session(db, album_id), album_id)
+    return cache.get_or_load(
+        "album_access", str(album_id), [f"album:{album_id}"],
+        lambda: _load_album_access(album_session(primary_session(db), album_id), album_id)
+    )
+
+
+def has_access(access: dict, user_id: int) -> bool:
+    """Check whether a user is the owner or a member of a cached album."""
+    return access["album"]["owner_id"] == user_id or user_id in access["member_ids"]
+
+
+def get_album_images(db: Session, album_id: int) -> List[dict]:
+    return get_cache().get_or_load(
+        "album_images", str(album_id), [f"album:{album_id}"],
+        lambda: image_repository.get_album_images(album_session(primary_session(db), album_id), album_id)
+    )
+
+
+def _load_user_albums(db: Session, user_id: int) -> List[dict]:
+    """Query every shard concurrently and merge in get_user_albums order (newest first)."""
+    per_shard = shard_router.fan_out(
+        all_shard_sessions(db), lambda session: album_repository.get_user_albums(session, user_id)
+    )
+    if len(per_shard) == 1:
+        return per_shard[0]
+    return list(heapq.merge(
+        *per_shard, key=lambda album: datetime.fromisoformat(album["created_at"]), reverse=True
+    ))
+
+
+def get_user_albums(db: Session, user_id: int) -> List[dict]:
+    return get_cache().get_or_load(
+        "user_albums", str(user_id), [f"user:{user_id}"],
+        lambda: _load_user_albums(primary_session(db), user_id)
+    )
+
+
+def invalidate_album(album_id: int, user_ids: Iterable[int] = ()) -> None:
+    """Invalidate an album's entries, plus the album lists of the given users."""
+    get_cache().bump(f"album:{album_id}", *(f"user:{user_id}" for user_id in user_ids))
+
+
+def invalidate_users(user_ids: Iterable[int]) -> None:
+    """Invalidate the album lists of the given users."""
+    get_cache().bump(*(f"user:{user_id}" for user_id in user_ids))
+
+
+def album_contents_changed(db: Session, album_id: int, user_ids: Iterable[int] = ()) -> None:
+    """
+    Invalidate an album after its images, audio or members changed.
+
+    The album lists of its audience are invalidated too, since they show the
+    album's counters and cover; pass users who joined or left in user_ids.
+    """
+    access = get_album_access(db, album_id)
+    audience = [access["album"]["owner_id"], *access["member_ids"]] if access else []
+    invalidate_album(album_id, [*audience, *user_ids])
+
+
+def album_audience(db: Session, album: dict) -> List[int]:
+    """Owner and members of an album, i.e. every user whose album list shows it."""
+    return [album["owner_id"], *album_member_repository.get_album_member_ids(db, album["id"])]
+
+
+def stats() -> dict:
+    cache = get_cache()
+    return {
+        "backend": type(cache.backend).__name__ if cache.backend else None,
+        "namespaces": cache.stats.snapshot()
+    }
+
+
+def warm(limit: int) -> int:
+    """
+    Load the access entries and image listings of the busiest albums on each
+    shard. Returns how many were warmed.
+    """
+    db = open_shard_session(0)
+    try:
+        album_ids = [
+            album_id
+            for shard_album_ids in shard_router.fan_out(
+                all_shard_sessions(db), lambda session: album_repository.get_hottest_album_ids(session, limit)
+            )
+            for album_id in shard_album_ids
+        ]
+        for album_id in album_ids:
+            if get_album_access(db, album_id) is not None:
+                get_album_images(db, album_id)
+        logger.info("Warmed the album cache with %d albums", len(album_ids))
+        return len(album_ids)
+    except Exception:
+        logger.exception("Album cache warming failed")
+        return 0
+    finally:
+        close_shard_sessions(db)
+        db.close()
+
+
+def warm_in_background(limit: int) -> None:
+    """Warm the cache without delaying startup."""
+    threading.Thread(target=warm, args=(limit,), name="album-cache-warm", daemon=True).start()
@@ -0,0 +1,154 @@
+"""
+Collage covers for the album list.
+
+Instead of downloading four full images per album to draw a cover, clients
+fetch one small WebP rendered from the album's newest images. Tiles are
+fetched as small renditions (read from disk with local storage) and
+composed in the image ingest process pool; the result is cached under a fingerprint of the tile images, so adding
+or removing one of them renders a new cover on the next request while an
+unchanged album keeps serving the cached one.
+
+Tiles that can't be downloaded or decoded are left out of the collage, and
+an album whose collage can't be rendered at all gets a plain placeholder;
+neither is cached, so the next request tries again.
+"""
+import base64
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config.db import album_session, primary_session
+from app.repositories import image_repository
+from app.services import album_cache_service, image_ingest_service
+from app.storage import get_storage
+from app.utils.image_processing import MOSAIC_SIZE, render_cover_placeholder, render_mosaic
+from app.utils.responsive_images import build_transformation_url, parse_cloudinary_url
+
+logger = logging.getLogger(__name__)
+
+MOSAIC_TILES = 4
+RENDER_TIMEOUT_SECONDS = 30
+
+# A half-cover tile is at most MOSAIC_SIZE on its long side
+TILE_TRANSFORMATION = f"c_limit,w_{MOSAIC_SIZE},h_{MOSAIC_SIZE},f_jpg,q_80"
+
+
+def _tile_url(image: dict) -> str:
+    """Smallest rendition of an image that still fills a tile."""
+    asset = parse_cloudinary_url(image["image_url"])
+    if asset is not None:
+        return build_transformation_url(asset, TILE_TRANSFORMATION)
+    return image["thumbnail_url"] or image["image_url"]
+
+
+def _get_tiles(db: Session, album_id: int) -> List[dict]:
+    return album_cache_service.get_cache().get_or_load(
+        "album_cover_tiles", str(album_id), [f"album:{album_id}"],
+        lambda: [
+            {"id": image["id"], "url": _tile_url(image)}
+            for image in image_repository.get_recent_album_images(
+                album_session(primary_session(db), album_id), album_id, MOSAIC_TILES
+            )
+        ]
+    )
+
+
+def _fingerprint(tiles: List[dict]) -> str:
+    content = "|".join(f"{tile['id']}:{tile['url']}" for tile in tiles)
+    return hashlib.sha256(f"{MOSAIC_SIZE}|{content}".encode()).hexdigest()[:32]
+
+
+def _render(tiles: List[dict]) -> Optional[dict]:
+    """
+    Fetch the tiles in parallel and compose them in the process pool.
+
+    None if nothing could be rendered; "complete" is False when some tiles
+    were left out.
+    """
+    def download(tile):
+        try:
+            # Files kept by local storage are read from disk rather than over HTTP
+            data = get_storage().read(tile["url"])
+            return data if data is not None else image_ingest_service.download_image(tile["url"])
+        except Exception:
+            logger.warning("Failed to download cover tile for image %s", tile["id"], exc_info=True)
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(tiles)) as executor:
+        data = [tile for tile in executor.map(download, tiles) if tile is not None]
+    if not data:
+        return None
+
+    future = image_ingest_service.get_pool().submit(render_mosaic, data)
+    try:
+        mosaic = future.result(timeout=RENDER_TIMEOUT_SECONDS)
+    except Exception:
+        future.cancel()
+        logger.exception("Failed to render the cover from images %s", [tile["id"] for tile in tiles])
+        return None
+    if mosaic is None:
+        logger.warning("None of the cover tiles of images %s could be decoded", [tile["id"] for tile in tiles])
+        return None
+
+    # Cache backends store JSON, so the bytes travel base64-encoded
+    return {
+        "format": mosaic["format"],
+        "data": base64.b64encode(mosaic["data"]).decode("ascii"),
+        "complete": mosaic["tiles"] == len(tiles)
+    }
+
+
+@lru_cache(maxsize=1)
+def _placeholder() -> dict:
+    placeholder = render_cover_placeholder()
+    return {"format": placeholder["format"], "data": base64.b64encode(placeholder["data"]).decode("ascii")}
+
+
+def get_album_cover(db: Session, album_id: int, user_id: int) -> dict:
+    """
+    Return {"etag", "media_type", "data", "placeholder"} for an album's collage cover.
+
+    User must have access to the album. Raises 404 when the album has no
+    images; when none of them could be fetched or rendered, returns a plain
+    placeholder with its own ETag.
+    """
+    access = album_cache_service.get_album_access(db, album_id)
+    if not access:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Album not found"
+        )
+
+    if not album_cache_service.has_access(access, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this album"
+        )
+
+    tiles = _get_tiles(db, album_id)
+    if not tiles:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Album has no cover"
+        )
+
+    etag = _fingerprint(tiles)
+    mosaic = album_cache_service.get_cache().get_or_load(
+        "album_cover", etag, [], lambda: _render(tiles), should_cache=lambda mosaic: mosaic["complete"]
+    )
+    placeholder = mosaic is None
+    if placeholder:
+        mosaic = _placeholder()
+        etag = f"{etag}-placeholder"
+
+    return {
+        "etag": etag,
+        "media_type": "image/webp" if mosaic["format"] == "webp" else "image/jpeg",
+        "data": base64.b64decode(mosaic["data"]),
+        "placeholder": placeholder
+    }
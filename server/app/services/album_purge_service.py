@@ -0,0 +1,78 @@
+"""
+Background purge of soft-deleted albums.
+
+Deleting an album only sets albums.deleted_at. The rows underneath it are
+removed here in bounded chunks, each in its own short transaction, so a
+50k-image album never holds locks across one giant cascading DELETE.
+Each album is purged on its own shard.
+"""
+import logging
+import time
+
+from app.config.db import SessionLocal, album_session, all_shard_sessions, close_shard_sessions, shard_router, unit_of_work
+from app.repositories import album_repository
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+PAUSE_SECONDS = 0.05  # Breathing room between chunks for concurrent traffic
+
+
+def _purge_chunk(db, purge, album_id: int, chunk_size: int) -> int:
+    """Run one chunk in its own transaction so locks are released between chunks."""
+    with unit_of_work(db):
+        return purge(db, album_id, chunk_size)
+
+
+def purge_album(album_id: int, chunk_size: int = CHUNK_SIZE, pause: float = PAUSE_SECONDS) -> bool:
+    """
+    Remove a soft-deleted album's images, audio and memberships, then the album itself.
+
+    Safe to run concurrently with another purge of the same album or to
+    resume after a crash. Returns True if the album row was removed.
+    """
+    db = SessionLocal()
+    album_db = album_session(db, album_id)
+    try:
+        # Audio rows go with their images via ON DELETE CASCADE, bounded by the chunk
+        while _purge_chunk(album_db, album_repository.purge_album_images_chunk, album_id, chunk_size):
+            time.sleep(pause)
+        while _purge_chunk(album_db, album_repository.purge_album_members_chunk, album_id, chunk_size):
+            time.sleep(pause)
+        with unit_of_work(album_db):
+            return album_repository.purge_album(album_db, album_id)
+    except Exception:
+        logger.exception("Failed to purge album %s; it will be retried by the purge job", album_id)
+        return False
+    finally:
+        close_shard_sessions(db)
+        db.close()
+
+
+def purge_pending_albums(batch_size: int = 100, chunk_size: int = CHUNK_SIZE) -> int:
+    """Purge every soft-deleted album. Returns the number of albums removed."""
+    purged = 0
+    failed = set()
+    while True:
+        db = SessionLocal()
+        try:
+            pending = [
+                album_id
+                for shard_pending in shard_router.fan_out(
+                    all_shard_sessions(db),
+                    lambda session: album_repository.get_albums_pending_purge(session, batch_size + len(failed))
+                )
+                for album_id in shard_pending
+                if album_id not in failed
+            ]
+        finally:
+            close_shard_sessions(db)
+            db.close()
+        if not pending:
+            return purged
+
+        for album_id in pending:
+            if purge_album(album_id, chunk_size):
+                purged += 1
+            else:
+                failed.add(album_id)
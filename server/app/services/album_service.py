@@ -1,51 +1,60 @@
-from fastapi import HTTPException, status
+from fastapi import BackgroundTasks, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
-from app.repositories import album_repository, album_member_repository
-from app.schemas.album import AlbumCreate, AlbumUpdate, AlbumResponse, AlbumMemberAdd
+from typing import List, Optional
+from app.config.db import album_session, all_shard_sessions, shard_router, shard_session, unit_of_work
+from app.repositories import album_repository, album_member_repository, user_repository
+from app.schemas.album import (
+    AlbumCreate, AlbumUpdate, AlbumResponse, AlbumMemberAdd, AlbumMemberPage, AlbumMembersUpdate,
+    AlbumMembersUpdateResult
+)
+from app.services import album_cache_service, album_purge_service
+from app.utils.responsive_images import ClientHints, responsive_urls
+
+MEMBERS_PAGE_DEFAULT_LIMIT = 50
+MEMBERS_PAGE_MAX_LIMIT = 200
 
 
 def create_album(db: Session, album_data: AlbumCreate, owner_id: int) -> AlbumResponse:
     """Create a new album and add owner as a member."""
-    # Create the album
-    album = album_repository.create_album(db, album_data.name, owner_id)
-    if not album:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create album"
-        )
+    album_db = shard_session(db, shard_router.shard_for_new_album())
+    
+    # Create the album and the owner's membership together
+    with unit_of_work(album_db):
+        album = album_repository.create_album(album_db, album_data.name, owner_id)
+        if not album:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create album"
+            )
     
-    # Add owner as a member
-    album_member_repository.add_album_member(db, album["id"], owner_id)
+    album_cache_service.invalidate_users([owner_id])
     
     return AlbumResponse(**album)
 
 
 def get_album(db: Session, album_id: int, user_id: int) -> AlbumResponse:
     """Get an album by ID. User must be owner or member."""
-    album = album_repository.get_album_by_id(db, album_id)
-    if not album:
+    access = album_cache_service.get_album_access(db, album_id)
+    if not access:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Album not found"
         )
     
     # Check if user is owner or member
-    is_owner = album["owner_id"] == user_id
-    is_member = album_member_repository.is_album_member(db, album_id, user_id)
-    
-    if not (is_owner or is_member):
+    if not album_cache_service.has_access(access, user_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have access to this album"
         )
     
-    return AlbumResponse(**album)
+    return AlbumResponse(**access["album"])
 
 
 def update_album(db: Session, album_id: int, album_data: AlbumUpdate, user_id: int) -> AlbumResponse:
     """Update an album. Only owner can update."""
-    album = album_repository.get_album_by_id(db, album_id)
+    album_db = album_session(db, album_id)
+    album = album_repository.get_album_by_id(album_db, album_id)
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -63,19 +72,34 @@ def update_album(db: Session, album_id: int, album_data: AlbumUpdate, user_id: i
     if album_data.name is None:
         return AlbumResponse(**album)
     
-    updated_album = album_repository.update_album(db, album_id, album_data.name)
-    if not updated_album:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update album"
-        )
+    with unit_of_work(album_db):
+        updated_album = album_repository.update_album(album_db, album_id, album_data.name)
+        if not updated_album:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to update album"
+            )
+    
+    # The new name shows up in every member's album list
+    album_cache_service.invalidate_album(album_id, album_cache_service.album_audience(album_db, album))
     
     return AlbumResponse(**updated_album)
 
 
-def delete_album(db: Session, album_id: int, user_id: int) -> None:
-    """Delete an album. Only owner can delete."""
-    album = album_repository.get_album_by_id(db, album_id)
+def delete_album(
+    db: Session,
+    album_id: int,
+    user_id: int,
+    background_tasks: Optional[BackgroundTasks] = None
+) -> None:
+    """
+    Delete an album. Only owner can delete.
+
+    The album is soft-deleted so the request returns immediately; its images,
+    audio and memberships are purged in chunks afterwards.
+    """
+    album_db = album_session(db, album_id)
+    album = album_repository.get_album_by_id(album_db, album_id)
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -89,23 +113,55 @@ def delete_album(db: Session, album_id: int, user_id: int) -> None:
             detail="Only the album owner can delete the album"
         )
     
-    success = album_repository.delete_album(db, album_id)
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to delete album"
-        )
+    with unit_of_work(album_db):
+        success = album_repository.delete_album(album_db, album_id)
+        if not success:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to delete album"
+            )
+    
+    album_cache_service.invalidate_album(album_id, album_cache_service.album_audience(album_db, album))
+    
+    if background_tasks is not None:
+        background_tasks.add_task(album_purge_service.purge_album, album_id)
 
 
-def get_user_albums(db: Session, user_id: int) -> List[AlbumResponse]:
-    """Get all albums for a user (owned or member)."""
-    albums = album_repository.get_user_albums(db, user_id)
-    return [AlbumResponse(**album) for album in albums]
+def _album_response(album: dict, hints: Optional[ClientHints] = None) -> AlbumResponse:
+    """Build an AlbumResponse, sizing a Cloudinary cover's thumbnail for the client."""
+    if album.get("cover_image_url"):
+        derived = responsive_urls(album["cover_image_url"], hints or ClientHints())
+        if derived:
+            return AlbumResponse(**{**album, "cover_thumbnail_url": derived["thumbnail_url"]})
+        if not album.get("cover_thumbnail_url"):
+            return AlbumResponse(**{**album, "cover_thumbnail_url": album["cover_image_url"]})
+    return AlbumResponse(**album)
+
+
+def get_user_albums(db: Session, user_id: int, hints: Optional[ClientHints] = None) -> List[AlbumResponse]:
+    """Get all albums for a user (owned or member), with counters and cover previews."""
+    albums = album_cache_service.get_user_albums(db, user_id)
+    return [_album_response(album, hints) for album in albums]
+
+
+def get_user_album_ids(db: Session, user_id: int) -> List[int]:
+    """
+    IDs of every album the user can see, read from every shard.
+
+    Uncached, unlike the album list: callers use it to decide what the user
+    may receive, and a per-process cache could still list an album the user
+    was removed from on another worker.
+    """
+    per_shard = shard_router.fan_out(
+        all_shard_sessions(db), lambda session: album_member_repository.get_user_album_ids(session, user_id)
+    )
+    return [album_id for album_ids in per_shard for album_id in album_ids]
 
 
 def add_album_member(db: Session, album_id: int, member_data: AlbumMemberAdd, user_id: int) -> dict:
     """Add a member to an album. Only owner can add members."""
-    album = album_repository.get_album_by_id(db, album_id)
+    album_db = album_session(db, album_id)
+    album = album_repository.get_album_by_id(album_db, album_id)
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -126,19 +182,29 @@ def add_album_member(db: Session, album_id: int, member_data: AlbumMemberAdd, us
             detail="Album owner is already a member"
         )
     
-    member = album_member_repository.add_album_member(db, album_id, member_data.user_id)
-    if not member:
+    if not user_repository.get_user_by_id(db, member_data.user_id):
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User is already a member of this album"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
     
+    with unit_of_work(album_db):
+        member = album_member_repository.add_album_member(album_db, album_id, member_data.user_id)
+        if not member:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User is already a member of this album"
+            )
+    
+    album_cache_service.album_contents_changed(db, album_id, [member_data.user_id])
+    
     return member
 
 
 def remove_album_member(db: Session, album_id: int, member_user_id: int, user_id: int) -> None:
     """Remove a member from an album. Only owner can remove members."""
-    album = album_repository.get_album_by_id(db, album_id)
+    album_db = album_session(db, album_id)
+    album = album_repository.get_album_by_id(album_db, album_id)
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -159,10 +225,103 @@ def remove_album_member(db: Session, album_id: int, member_user_id: int, user_id
             detail="Cannot remove the album owner"
         )
     
-    success = album_member_repository.remove_album_member(db, album_id, member_user_id)
-    if not success:
+    with unit_of_work(album_db):
+        success = album_member_repository.remove_album_member(album_db, album_id, member_user_id)
+        if not success:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Member not found in album"
+            )
+    
+    album_cache_service.album_contents_changed(db, album_id, [member_user_id])
+
+
+def update_album_members(
+    db: Session,
+    album_id: int,
+    update: AlbumMembersUpdate,
+    user_id: int
+) -> AlbumMembersUpdateResult:
+    """Add and remove several members in one transaction. Only owner can change members."""
+    album_db = album_session(db, album_id)
+    album = album_repository.get_album_by_id(album_db, album_id)
+    if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Member not found in album"
+            detail="Album not found"
         )
+    
+    # Check if user is owner
+    if album["owner_id"] != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the album owner can change members"
+        )
+    
+    # Don't allow removing the owner
+    if album["owner_id"] in update.remove:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot remove the album owner"
+        )
+    
+    if set(update.add) & set(update.remove):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A user cannot be both added and removed"
+        )
+    
+    # Users are global; unknown IDs are skipped like existing members
+    known_user_ids = sorted(user_repository.get_user_names(db, update.add))
+    
+    with unit_of_work(album_db):
+        removed = album_member_repository.remove_album_members(album_db, album_id, update.remove)
+        added = album_member_repository.add_album_members(album_db, album_id, known_user_ids)
+    
+    if added or removed:
+        album_cache_service.album_contents_changed(db, album_id, [*added, *removed])
+    
+    return AlbumMembersUpdateResult(added=added, removed=removed)
 
+
+def get_album_members(
+    db: Session,
+    album_id: int,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = MEMBERS_PAGE_DEFAULT_LIMIT
+) -> AlbumMemberPage:
+    """Get a page of an album's members with their names. User must have access to the album."""
+    access = album_cache_service.get_album_access(db, album_id)
+    if not access:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Album not found"
+        )
+    
+    # Check if user is owner or member
+    if not album_cache_service.has_access(access, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this album"
+        )
+    
+    # The cursor is the membership ID of the last member on the previous page
+    after_id = 0
+    if cursor:
+        if not cursor.isdigit():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        after_id = int(cursor)
+    
+    members = album_member_repository.get_album_members_page(album_session(db, album_id), album_id, after_id, limit + 1)
+    next_cursor = str(members[limit - 1]["id"]) if len(members) > limit else None
+    members = members[:limit]
+    
+    names = user_repository.get_user_names(db, [member["user_id"] for member in members])
+    return AlbumMemberPage(
+        members=[{**member, "name": names.get(member["user_id"], "")} for member in members],
+        next_cursor=next_cursor
+    )
@@ -1,13 +1,17 @@
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
+from app.config.db import album_session, unit_of_work
 from app.repositories import audio_repository, image_repository, album_repository, album_member_repository
 from app.schemas.audio import AudioCreate, AudioUpdate, AudioResponse
+from app.services import album_cache_service
 
 
 def create_audio(db: Session, audio_data: AudioCreate, user_id: int) -> AudioResponse:
     """Create audio for an image. Only the image creator can add audio."""
+    album_db = album_session(db, audio_data.image_id)
+    
     # Verify image exists and user is the creator
-    image = image_repository.get_image_by_id(db, audio_data.image_id)
+    image = image_repository.get_image_by_id(album_db, audio_data.image_id)
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -21,33 +25,30 @@ def create_audio(db: Session, audio_data: AudioCreate, user_id: int) -> AudioRes
             detail="Only the image creator can add audio"
         )
     
-    # Check if audio already exists for this image
-    existing_audio = audio_repository.get_audio_by_image_id(db, audio_data.image_id)
-    if existing_audio:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Audio already exists for this image. Use update endpoint to modify it."
+    # Create the audio record; the unique image_id rejects a second clip
+    with unit_of_work(album_db):
+        audio = audio_repository.create_audio(
+            db=album_db,
+            image_id=audio_data.image_id,
+            album_id=image["album_id"],
+            url=audio_data.url
         )
+        
+        if not audio:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Audio already exists for this image. Use update endpoint to modify it."
+            )
     
-    # Create the audio record
-    audio = audio_repository.create_audio(
-        db=db,
-        image_id=audio_data.image_id,
-        url=audio_data.url
-    )
-    
-    if not audio:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create audio"
-        )
+    album_cache_service.album_contents_changed(db, image["album_id"])
     
     return AudioResponse(**audio)
 
 
 def get_audio(db: Session, audio_id: int, user_id: int) -> AudioResponse:
     """Get audio by ID. User must have access to the associated image's album."""
-    audio = audio_repository.get_audio_by_id(db, audio_id)
+    album_db = album_session(db, audio_id)
+    audio = audio_repository.get_audio_by_id(album_db, audio_id)
     if not audio:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -55,14 +56,14 @@ def get_audio(db: Session, audio_id: int, user_id: int) -> AudioResponse:
         )
     
     # Verify user has access to the image's album
-    image = image_repository.get_image_by_id(db, audio["image_id"])
+    image = image_repository.get_image_by_id(album_db, audio["image_id"], audio["album_id"])
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Associated image not found"
         )
     
-    album = album_repository.get_album_by_id(db, image["album_id"])
+    album = album_repository.get_album_by_id(album_db, image["album_id"])
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -71,7 +72,7 @@ def get_audio(db: Session, audio_id: int, user_id: int) -> AudioResponse:
     
     # Check if user is owner or member
     is_owner = album["owner_id"] == user_id
-    is_member = album_member_repository.is_album_member(db, image["album_id"], user_id)
+    is_member = album_member_repository.is_album_member(album_db, image["album_id"], user_id)
     
     if not (is_owner or is_member):
         raise HTTPException(
@@ -84,15 +85,17 @@ def get_audio(db: Session, audio_id: int, user_id: int) -> AudioResponse:
 
 def get_audio_by_image(db: Session, image_id: int, user_id: int) -> AudioResponse:
     """Get audio for a specific image. User must have access to the image's album."""
+    album_db = album_session(db, image_id)
+    
     # Verify image exists and user has access
-    image = image_repository.get_image_by_id(db, image_id)
+    image = image_repository.get_image_by_id(album_db, image_id)
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Image not found"
         )
     
-    album = album_repository.get_album_by_id(db, image["album_id"])
+    album = album_repository.get_album_by_id(album_db, image["album_id"])
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -101,7 +104,7 @@ def get_audio_by_image(db: Session, image_id: int, user_id: int) -> AudioRespons
     
     # Check if user is owner or member
     is_owner = album["owner_id"] == user_id
-    is_member = album_member_repository.is_album_member(db, image["album_id"], user_id)
+    is_member = album_member_repository.is_album_member(album_db, image["album_id"], user_id)
     
     if not (is_owner or is_member):
         raise HTTPException(
@@ -109,7 +112,7 @@ def get_audio_by_image(db: Session, image_id: int, user_id: int) -> AudioRespons
             detail="You don't have access to this image"
         )
     
-    audio = audio_repository.get_audio_by_image_id(db, image_id)
+    audio = audio_repository.get_audio_by_image_id(album_db, image_id)
     if not audio:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -121,7 +124,8 @@ def get_audio_by_image(db: Session, image_id: int, user_id: int) -> AudioRespons
 
 def update_audio(db: Session, audio_id: int, audio_data: AudioUpdate, user_id: int) -> AudioResponse:
     """Update audio. Only the image creator can update."""
-    audio = audio_repository.get_audio_by_id(db, audio_id)
+    album_db = album_session(db, audio_id)
+    audio = audio_repository.get_audio_by_id(album_db, audio_id)
     if not audio:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -129,7 +133,7 @@ def update_audio(db: Session, audio_id: int, audio_data: AudioUpdate, user_id: i
         )
     
     # Verify user is the image creator
-    image = image_repository.get_image_by_id(db, audio["image_id"])
+    image = image_repository.get_image_by_id(album_db, audio["image_id"], audio["album_id"])
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -143,24 +147,28 @@ def update_audio(db: Session, audio_id: int, audio_data: AudioUpdate, user_id: i
         )
     
     # Update the audio
-    updated_audio = audio_repository.update_audio(
-        db=db,
-        audio_id=audio_id,
-        url=audio_data.url
-    )
-    
-    if not updated_audio:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update audio"
+    with unit_of_work(album_db):
+        updated_audio = audio_repository.update_audio(
+            db=album_db,
+            audio_id=audio_id,
+            url=audio_data.url
         )
+        
+        if not updated_audio:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to update audio"
+            )
+    
+    album_cache_service.album_contents_changed(db, image["album_id"])
     
     return AudioResponse(**updated_audio)
 
 
 def delete_audio(db: Session, audio_id: int, user_id: int) -> None:
     """Delete audio. Only the image creator can delete."""
-    audio = audio_repository.get_audio_by_id(db, audio_id)
+    album_db = album_session(db, audio_id)
+    audio = audio_repository.get_audio_by_id(album_db, audio_id)
     if not audio:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -168,7 +176,7 @@ def delete_audio(db: Session, audio_id: int, user_id: int) -> None:
         )
     
     # Verify user is the image creator
-    image = image_repository.get_image_by_id(db, audio["image_id"])
+    image = image_repository.get_image_by_id(album_db, audio["image_id"], audio["album_id"])
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -181,10 +189,13 @@ def delete_audio(db: Session, audio_id: int, user_id: int) -> None:
             detail="Only the image creator can delete the audio"
         )
     
-    success = audio_repository.delete_audio(db, audio_id)
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to delete audio"
-        )
+    with unit_of_work(album_db):
+        success = audio_repository.delete_audio(album_db, audio_id)
+        if not success:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to delete audio"
+            )
+    
+    album_cache_service.album_contents_changed(db, image["album_id"])
 
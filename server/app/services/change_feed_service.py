@@ -0,0 +1,237 @@
+"""
+Push album, image, audio and membership changes to connected clients.
+
+Database triggers (schema 011) NOTIFY every committed change on the
+memento_changes channel. Each worker holds one LISTEN connection, watched by
+the event loop with add_reader, so no thread or pool connection is tied up
+per client. Notifications are fanned out to per-connection queues.
+
+Membership is tracked in memory: when a client connects, the albums it can
+see are loaded once, uncached, and album_member events keep the album ->
+subscribers map up to date afterwards, so routing an event never needs a
+query. A client is subscribed before its albums are loaded, so a membership
+change committed during the load is applied rather than lost.
+
+If the LISTEN connection drops, every client receives a "resync" event, since
+changes committed while reconnecting were missed.
+
+With album shards, each shard's changes are announced on that shard, so the
+worker listens on every shard, one connection each.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.config.db import shard_engines
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "memento_changes"
+QUEUE_SIZE = 256  # Events buffered per connection before it is told to resync
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+
+
+class Subscriber:
+    """One connected client. A user may have several (phone, tablet, ...)."""
+
+    __slots__ = ("user_id", "album_ids", "queue", "left")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.album_ids: Set[int] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        # Albums left while the initial album list was loading; None once it is loaded
+        self.left: Optional[Set[int]] = set()
+
+    def push(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client is not keeping up; drop its backlog and have it refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"entity": "resync"})
+
+
+class ChangeFeed:
+    """One LISTEN connection per shard and worker, fanned out to subscribers by album."""
+
+    def __init__(self, engines):
+        self._by_album: Dict[int, Set[Subscriber]] = defaultdict(set)
+        self._by_user: Dict[int, Set[Subscriber]] = defaultdict(set)
+        self._engines = engines
+        self._conns: Dict[int, object] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._disconnected: Dict[int, asyncio.Event] = {}
+
+    # Subscriptions. Everything below runs on the event loop thread, so no locks are needed.
+
+    def subscribe(self, user_id: int) -> Subscriber:
+        """Register a client before loading its albums; pass them to add_albums once loaded."""
+        subscriber = Subscriber(user_id)
+        self._by_user[user_id].add(subscriber)
+        return subscriber
+
+    def add_albums(self, subscriber: Subscriber, album_ids: Iterable[int]) -> None:
+        """Follow the albums loaded for a subscriber, except those it left while they loaded."""
+        for album_id in album_ids:
+            if album_id not in subscriber.left:
+                self._follow(subscriber, album_id)
+        subscriber.left = None
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        for album_id in list(subscriber.album_ids):
+            self._unfollow(subscriber, album_id)
+        subscribers = self._by_user.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._by_user[subscriber.user_id]
+
+    def _follow(self, subscriber: Subscriber, album_id: int) -> None:
+        subscriber.album_ids.add(album_id)
+        self._by_album[album_id].add(subscriber)
+
+    def _unfollow(self, subscriber: Subscriber, album_id: int) -> None:
+        subscriber.album_ids.discard(album_id)
+        if subscriber.left is not None:
+            subscriber.left.add(album_id)
+        subscribers = self._by_album.get(album_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._by_album[album_id]
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._by_user.values())
+
+    # Routing
+
+    def _send_to_album(self, album_id: int, event: dict) -> None:
+        for subscriber in list(self._by_album.get(album_id, ())):
+            subscriber.push(event)
+
+    def dispatch(self, event: dict) -> None:
+        entity, op = event.get("entity"), event.get("op")
+        album_id, user_id = event.get("album_id"), event.get("user_id")
+        user_subscribers = list(self._by_user.get(user_id, ())) if user_id is not None else []
+
+        if entity == "album" and op == "INSERT":
+            # The owner's membership row follows in the same transaction; following here keeps order
+            for subscriber in user_subscribers:
+                self._follow(subscriber, album_id)
+            self._send_to_album(album_id, event)
+        elif entity == "album" and op == "DELETE":
+            self._send_to_album(album_id, event)
+            for subscriber in list(self._by_album.get(album_id, ())):
+                self._unfollow(subscriber, album_id)
+        elif entity == "album_member" and op == "INSERT":
+            for subscriber in user_subscribers:
+                self._follow(subscriber, album_id)
+            self._send_to_album(album_id, event)
+        elif entity == "album_member" and op == "DELETE":
+            # The removed user hears about it, then stops receiving the album's events
+            self._send_to_album(album_id, event)
+            for subscriber in user_subscribers:
+                self._unfollow(subscriber, album_id)
+        elif album_id is not None:
+            self._send_to_album(album_id, event)
+
+    def _broadcast_resync(self) -> None:
+        for subscribers in list(self._by_user.values()):
+            for subscriber in list(subscribers):
+                subscriber.push({"entity": "resync"})
+
+    # LISTEN connections
+
+    def _connect(self, shard: int):
+        # A dedicated DBAPI connection outside the pool, with TCP keepalives so
+        # a silently dropped connection is noticed
+        engine = self._engines[shard]
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        cparams.setdefault("keepalives", 1)
+        cparams.setdefault("keepalives_idle", 30)
+        cparams.setdefault("keepalives_interval", 10)
+        cparams.setdefault("keepalives_count", 3)
+        conn = engine.dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _on_readable(self, shard: int) -> None:
+        conn = self._conns[shard]
+        try:
+            conn.poll()
+        except Exception:
+            logger.warning("Change feed connection to shard %d lost", shard)
+            self._disconnected[shard].set()
+            return
+
+        while conn.notifies:
+            notification = conn.notifies.pop(0)
+            try:
+                event = json.loads(notification.payload)
+            except ValueError:
+                logger.warning("Ignoring malformed change notification: %r", notification.payload)
+                continue
+            self.dispatch(event)
+
+    def _close_connection(self, shard: int) -> None:
+        conn = self._conns.pop(shard, None)
+        if conn is None:
+            return
+        try:
+            self._loop.remove_reader(conn.fileno())
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    async def _run(self, shard: int) -> None:
+        attempt = 0
+        while True:
+            try:
+                self._conns[shard] = await self._loop.run_in_executor(None, self._connect, shard)
+            except Exception:
+                delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+                logger.exception("Could not open change feed connection to shard %d, retrying in %ds", shard, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            if attempt:
+                self._broadcast_resync()
+            attempt = 0
+            self._disconnected[shard] = asyncio.Event()
+            self._loop.add_reader(self._conns[shard].fileno(), self._on_readable, shard)
+            try:
+                await self._disconnected[shard].wait()
+            finally:
+                self._close_connection(shard)
+            attempt = 1
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._loop = asyncio.get_running_loop()
+            self._tasks = [asyncio.create_task(self._run(shard)) for shard in range(len(self._engines))]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        for shard in list(self._conns):
+            self._close_connection(shard)
+
+
+feed = ChangeFeed(shard_engines)
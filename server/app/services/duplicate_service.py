@@ -0,0 +1,94 @@
+"""
+Near-duplicate image detection within an album.
+
+Each album's perceptual hashes are loaded into a BK-tree the first time the
+album is checked and kept in memory, so later checks cost a tree search
+instead of comparing against every image. Trees are refreshed after a TTL to
+pick up images ingested by other workers, and updated in place for images
+ingested by this one.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.repositories import image_repository
+from app.utils.bktree import BKTree
+
+DEFAULT_MAX_DISTANCE = 6  # Bits out of 64; catches re-encodes, resizes and light edits
+INDEX_TTL_SECONDS = 300
+MAX_CACHED_ALBUMS = 512
+
+_indexes: "OrderedDict[int, Tuple[float, BKTree]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _get_index(db: Session, album_id: int) -> BKTree:
+    now = time.monotonic()
+    with _lock:
+        entry = _indexes.get(album_id)
+        if entry is not None and now - entry[0] < INDEX_TTL_SECONDS:
+            _indexes.move_to_end(album_id)
+            return entry[1]
+
+    tree = BKTree()
+    for image_id, phash in image_repository.get_album_hashes(db, album_id):
+        tree.add(phash, image_id)
+
+    with _lock:
+        _indexes[album_id] = (now, tree)
+        _indexes.move_to_end(album_id)
+        while len(_indexes) > MAX_CACHED_ALBUMS:
+            _indexes.popitem(last=False)
+    return tree
+
+
+def record_hash(album_id: int, image_id: int, phash: int) -> None:
+    """Add a newly stored hash to the album's index if it is loaded."""
+    with _lock:
+        entry = _indexes.get(album_id)
+        if entry is not None:
+            entry[1].add(phash, image_id)
+
+
+def invalidate(album_id: int) -> None:
+    """Drop an album's index, e.g. after an image is replaced."""
+    with _lock:
+        _indexes.pop(album_id, None)
+
+
+def parse_hash(value: str) -> int:
+    """Parse a 16 character hex dHash into an unsigned integer."""
+    return int(value, 16)
+
+
+def find_duplicates(
+    db: Session,
+    album_id: int,
+    phash: int,
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    exclude_image_id: Optional[int] = None
+) -> List[Tuple[dict, int]]:
+    """
+    Find images in an album whose hash is within max_distance bits of phash.
+
+    Returns (image, distance) pairs, closest first. Candidates are re-read from
+    the database so deleted images are never reported.
+    """
+    tree = _get_index(db, album_id)
+    with _lock:
+        matches = tree.search(phash, max_distance)
+
+    distances = {}
+    for image_id, distance in matches:
+        if image_id != exclude_image_id and image_id not in distances:
+            distances[image_id] = distance
+    if not distances:
+        return []
+
+    images = image_repository.get_images_by_ids(db, list(distances), [album_id])
+    duplicates = [(image, distances[image["id"]]) for image in images]
+    duplicates.sort(key=lambda pair: pair[1])
+    return duplicates
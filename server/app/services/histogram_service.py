@@ -0,0 +1,75 @@
+"""
+Image counts over time for the timeline scrubber, per album or across all of
+a user's albums, bucketed by UTC day, week (starting Monday) or month.
+
+Albums with at least ROLLUP_MIN_IMAGES images get a trigger-maintained
+per-day rollup, turned on by the upload that takes them over the threshold
+(enable_rollup_if_large), so their cost is one row per day with photos
+rather than one per image; smaller albums are counted from the
+(album_id, date_added) index. Reading a histogram never writes.
+"""
+from typing import Dict, List
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config.db import shard_router, shard_session
+from app.repositories import image_repository
+from app.schemas.timeline import HistogramBucket, ImageHistogram
+from app.services import album_cache_service
+
+BUCKETS = ("day", "week", "month")
+ROLLUP_MIN_IMAGES = 2000
+
+
+def enable_rollup_if_large(album_db: Session, album_id: int) -> None:
+    """
+    Turn on an album's day rollup once it holds ROLLUP_MIN_IMAGES images.
+
+    Call it in the transaction that added an image: the insert already holds
+    the album's album_stats lock, and the one-time backfill reads about
+    ROLLUP_MIN_IMAGES rows. Later calls only read the album's stats row.
+    """
+    image_repository.enable_day_rollups(album_db, [album_id], ROLLUP_MIN_IMAGES)
+
+
+def _histogram(db: Session, album_ids: List[int], bucket: str) -> ImageHistogram:
+    by_session: Dict[Session, List[int]] = {}
+    for album_id in album_ids:
+        by_session.setdefault(shard_session(db, shard_router.shard_for_id(album_id)), []).append(album_id)
+
+    def load_shard(session: Session) -> List[dict]:
+        return image_repository.get_image_histogram(session, by_session[session], bucket)
+
+    counts: Dict[str, int] = {}
+    for rows in shard_router.fan_out(list(by_session), load_shard):
+        for row in rows:
+            counts[row["start"]] = counts.get(row["start"], 0) + row["count"]
+    return ImageHistogram(
+        bucket=bucket,
+        buckets=[HistogramBucket(start=start, count=count) for start, count in sorted(counts.items())]
+    )
+
+
+def get_album_histogram(db: Session, album_id: int, user_id: int, bucket: str) -> ImageHistogram:
+    """Count an album's images per bucket. User must have access to the album."""
+    access = album_cache_service.get_album_access(db, album_id)
+    if not access:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Album not found"
+        )
+
+    if not album_cache_service.has_access(access, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this album"
+        )
+
+    return _histogram(db, [album_id], bucket)
+
+
+def get_timeline_histogram(db: Session, user_id: int, bucket: str) -> ImageHistogram:
+    """Count the images of every album the user can see per bucket."""
+    albums = album_cache_service.get_user_albums(db, user_id)
+    return _histogram(db, [album["id"] for album in albums], bucket)
@@ -0,0 +1,146 @@
+"""
+Background ingest pipeline for uploaded images.
+
+After an image record is created, the image is fetched and decoded in a
+process pool to compute a BlurHash placeholder, a perceptual hash for
+duplicate detection and, for originals not hosted
+on Cloudinary, grid/full-screen variants, which are stored with the
+configured storage backend. Results are written back to the
+image row. None of this runs on the request path. Cloudinary originals get
+their variants from transformation URLs instead (see app.utils.responsive_images).
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from app.config.db import SessionLocal, album_session, close_shard_sessions, unit_of_work
+from app.config.settings import get_settings
+from app.repositories import image_repository
+from app.services import album_cache_service, duplicate_service
+from app.storage import get_storage
+from app.utils.image_processing import process_original
+from app.utils.responsive_images import build_transformation_url, parse_cloudinary_url
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_TIMEOUT_SECONDS = 30
+PROCESS_TIMEOUT_SECONDS = 60
+
+# Rendition fetched when we only need to analyze a Cloudinary image, not re-encode it
+ANALYSIS_TRANSFORMATION = "c_limit,w_256,h_256,f_jpg,q_80"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Create the process pool lazily so importing the app stays cheap."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.image_ingest_workers)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes. Called on application shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def download_image(url: str) -> bytes:
+    """Download an image, refusing unknown hosts and oversized files."""
+    allowed_hosts = {host.strip() for host in settings.image_ingest_allowed_hosts.split(",") if host.strip()}
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or parsed.hostname not in allowed_hosts:
+        raise ValueError(f"Refusing to fetch image from untrusted host: {parsed.hostname}")
+
+    chunks = []
+    size = 0
+    with httpx.stream("GET", url, timeout=DOWNLOAD_TIMEOUT_SECONDS, follow_redirects=False) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            size += len(chunk)
+            if size > settings.image_ingest_max_bytes:
+                raise ValueError(f"Image exceeds {settings.image_ingest_max_bytes} bytes")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def analyze_image(image_url: str, include_variants: bool = False) -> dict:
+    """
+    Download an image and run it through process_original in the process pool.
+
+    When only analysis is needed for a Cloudinary-hosted image, a small
+    rendition is downloaded instead of the full original.
+    """
+    source_url = image_url
+    asset = parse_cloudinary_url(image_url)
+    if asset is not None and not include_variants:
+        source_url = build_transformation_url(asset, ANALYSIS_TRANSFORMATION)
+
+    # Files kept by local storage are read from disk rather than over HTTP
+    data = get_storage().read(source_url)
+    if data is None:
+        data = download_image(source_url)
+    elif len(data) > settings.image_ingest_max_bytes:
+        raise ValueError(f"Image exceeds {settings.image_ingest_max_bytes} bytes")
+    return get_pool().submit(process_original, data, include_variants).result(timeout=PROCESS_TIMEOUT_SECONDS)
+
+
+def ingest_image(image_id: int, image_url: str, user_id: int, album_id: int) -> None:
+    """
+    Compute the placeholder, perceptual hash and, for non-Cloudinary originals, variants for an image.
+
+    Intended to be scheduled with FastAPI BackgroundTasks; failures are logged
+    and leave the columns empty so clients fall back to image_url.
+    """
+    # Cloudinary renders sized variants on the fly from transformation URLs,
+    # so storing our own copies would only add storage
+    include_variants = parse_cloudinary_url(image_url) is None
+
+    thumbnail_url = None
+    medium_url = None
+    try:
+        result = analyze_image(image_url, include_variants)
+
+        if include_variants:
+            base_public_id = f"memento/user_{user_id}/images/variants/{image_id}"
+            thumbnail_url = get_storage().put(result["thumbnail"], f"{base_public_id}_thumb")
+            medium_url = get_storage().put(result["medium"], f"{base_public_id}_medium")
+    except Exception:
+        logger.exception("Failed to ingest image %s", image_id)
+        return
+
+    db = SessionLocal()
+    album_db = album_session(db, album_id)
+    try:
+        with unit_of_work(album_db):
+            updated = image_repository.update_image_ingest(
+                album_db,
+                image_id=image_id,
+                album_id=album_id,
+                source_url=image_url,
+                placeholder=result["placeholder"],
+                phash=result["phash"],
+                thumbnail_url=thumbnail_url,
+                medium_url=medium_url
+            )
+        if updated:
+            duplicate_service.record_hash(album_id, image_id, result["phash"])
+            album_cache_service.album_contents_changed(db, album_id)
+        else:
+            logger.info("Image %s was deleted or replaced during ingest; discarding results", image_id)
+    except Exception:
+        logger.exception("Failed to store ingest results for image %s", image_id)
+    finally:
+        close_shard_sessions(db)
+        db.close()
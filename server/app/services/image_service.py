@@ -1,14 +1,46 @@
-from fastapi import HTTPException, status
+from fastapi import BackgroundTasks, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from app.config.db import album_session, unit_of_work
 from app.repositories import image_repository, album_repository, album_member_repository
-from app.schemas.image import ImageCreate, ImageUpdate, ImageResponse
+from app.schemas.image import ImageCreate, ImageUpdate, ImageResponse, DuplicateCheck, DuplicateMatch
+from app.services import album_cache_service, image_ingest_service, duplicate_service, histogram_service
+from app.utils.responsive_images import ClientHints, responsive_urls
 
+DEFAULT_HINTS = ClientHints()
 
-def create_image(db: Session, image_data: ImageCreate, user_id: int) -> ImageResponse:
-    """Create a new image. User must be owner or member of the album."""
+
+def image_response(image: dict, hints: Optional[ClientHints] = None) -> ImageResponse:
+    """
+    Build an ImageResponse, deriving sized Cloudinary URLs from the client hints.
+
+    Images not hosted on Cloudinary keep whatever variants the ingest pipeline stored.
+    """
+    derived = responsive_urls(image["image_url"], hints or DEFAULT_HINTS)
+    if derived:
+        return ImageResponse(**{**image, **derived})
+    return ImageResponse(**image)
+
+
+def create_image(
+    db: Session,
+    image_data: ImageCreate,
+    user_id: int,
+    background_tasks: Optional[BackgroundTasks] = None,
+    hints: Optional[ClientHints] = None
+) -> ImageResponse:
+    """
+    Create a new image. User must be owner or member of the album.
+
+    If the client sends a perceptual hash and a near-duplicate already exists
+    in the album, a 409 listing the duplicates is returned unless
+    allow_duplicate is set. When background_tasks is given, the ingest
+    pipeline (placeholder, hash, variants) runs after the response is sent.
+    """
+    album_db = album_session(db, image_data.album_id)
+    
     # Verify album exists and user has access
-    album = album_repository.get_album_by_id(db, image_data.album_id)
+    album = album_repository.get_album_by_id(album_db, image_data.album_id)
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -17,7 +49,7 @@ def create_image(db: Session, image_data: ImageCreate, user_id: int) -> ImageRes
     
     # Check if user is owner or member
     is_owner = album["owner_id"] == user_id
-    is_member = album_member_repository.is_album_member(db, image_data.album_id, user_id)
+    is_member = album_member_repository.is_album_member(album_db, image_data.album_id, user_id)
     
     if not (is_owner or is_member):
         raise HTTPException(
@@ -25,29 +57,55 @@ def create_image(db: Session, image_data: ImageCreate, user_id: int) -> ImageRes
             detail="You don't have access to this album"
         )
     
+    phash = duplicate_service.parse_hash(image_data.phash) if image_data.phash else None
+    if phash is not None and not image_data.allow_duplicate:
+        duplicates = duplicate_service.find_duplicates(album_db, image_data.album_id, phash)
+        if duplicates:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={
+                    "message": "A similar image already exists in this album",
+                    "duplicate_image_ids": [image["id"] for image, _ in duplicates]
+                }
+            )
+    
     # Create the image
-    image = image_repository.create_image(
-        db=db,
-        album_id=image_data.album_id,
-        image_url=image_data.image_url,
-        user_id=user_id,
-        caption=image_data.caption,
-        latitude=image_data.latitude,
-        longitude=image_data.longitude
-    )
+    with unit_of_work(album_db):
+        image = image_repository.create_image(
+            db=album_db,
+            album_id=image_data.album_id,
+            image_url=image_data.image_url,
+            user_id=user_id,
+            caption=image_data.caption,
+            latitude=image_data.latitude,
+            longitude=image_data.longitude,
+            phash=phash
+        )
+        
+        if not image:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create image"
+            )
+        histogram_service.enable_rollup_if_large(album_db, image_data.album_id)
     
-    if not image:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create image"
+    album_cache_service.album_contents_changed(db, image["album_id"])
+    
+    if phash is not None:
+        duplicate_service.record_hash(image["album_id"], image["id"], phash)
+    
+    if background_tasks is not None:
+        background_tasks.add_task(
+            image_ingest_service.ingest_image, image["id"], image["image_url"], user_id, image["album_id"]
         )
     
-    return ImageResponse(**image)
+    return image_response(image, hints)
 
 
-def get_image(db: Session, image_id: int, user_id: int) -> ImageResponse:
+def get_image(db: Session, image_id: int, user_id: int, hints: Optional[ClientHints] = None) -> ImageResponse:
     """Get an image by ID. User must have access to the album."""
-    image = image_repository.get_image_by_id(db, image_id)
+    album_db = album_session(db, image_id)
+    image = image_repository.get_image_by_id(album_db, image_id)
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -55,7 +113,7 @@ def get_image(db: Session, image_id: int, user_id: int) -> ImageResponse:
         )
     
     # Verify user has access to the album
-    album = album_repository.get_album_by_id(db, image["album_id"])
+    album = album_repository.get_album_by_id(album_db, image["album_id"])
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -64,7 +122,7 @@ def get_image(db: Session, image_id: int, user_id: int) -> ImageResponse:
     
     # Check if user is owner or member
     is_owner = album["owner_id"] == user_id
-    is_member = album_member_repository.is_album_member(db, image["album_id"], user_id)
+    is_member = album_member_repository.is_album_member(album_db, image["album_id"], user_id)
     
     if not (is_owner or is_member):
         raise HTTPException(
@@ -72,12 +130,20 @@ def get_image(db: Session, image_id: int, user_id: int) -> ImageResponse:
             detail="You don't have access to this image"
         )
     
-    return ImageResponse(**image)
+    return image_response(image, hints)
 
 
-def update_image(db: Session, image_id: int, image_data: ImageUpdate, user_id: int) -> ImageResponse:
-    """Update an image. Only the creator can update."""
-    image = image_repository.get_image_by_id(db, image_id)
+def update_image(
+    db: Session,
+    image_id: int,
+    image_data: ImageUpdate,
+    user_id: int,
+    background_tasks: Optional[BackgroundTasks] = None,
+    hints: Optional[ClientHints] = None
+) -> ImageResponse:
+    """Update an image. Only the creator can update. A new image_url triggers variant regeneration."""
+    album_db = album_session(db, image_id)
+    image = image_repository.get_image_by_id(album_db, image_id)
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -92,27 +158,40 @@ def update_image(db: Session, image_id: int, image_data: ImageUpdate, user_id: i
         )
     
     # Update the image
-    updated_image = image_repository.update_image(
-        db=db,
-        image_id=image_id,
-        caption=image_data.caption,
-        image_url=image_data.image_url,
-        latitude=image_data.latitude,
-        longitude=image_data.longitude
-    )
-    
-    if not updated_image:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update image"
+    with unit_of_work(album_db):
+        updated_image = image_repository.update_image(
+            db=album_db,
+            image_id=image_id,
+            album_id=image["album_id"],
+            caption=image_data.caption,
+            image_url=image_data.image_url,
+            latitude=image_data.latitude,
+            longitude=image_data.longitude
         )
+        
+        if not updated_image:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to update image"
+            )
+    
+    album_cache_service.album_contents_changed(db, updated_image["album_id"])
     
-    return ImageResponse(**updated_image)
+    if image_data.image_url is not None:
+        # The old hash is gone from the row; rebuild the album's duplicate index on next use
+        duplicate_service.invalidate(updated_image["album_id"])
+        if background_tasks is not None:
+            background_tasks.add_task(
+                image_ingest_service.ingest_image, image_id, updated_image["image_url"], user_id, updated_image["album_id"]
+            )
+    
+    return image_response(updated_image, hints)
 
 
 def delete_image(db: Session, image_id: int, user_id: int) -> None:
     """Delete an image. Only the creator can delete."""
-    image = image_repository.get_image_by_id(db, image_id)
+    album_db = album_session(db, image_id)
+    image = image_repository.get_image_by_id(album_db, image_id)
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -126,18 +205,57 @@ def delete_image(db: Session, image_id: int, user_id: int) -> None:
             detail="Only the image creator can delete the image"
         )
     
-    success = image_repository.delete_image(db, image_id)
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to delete image"
-        )
+    with unit_of_work(album_db):
+        success = image_repository.delete_image(album_db, image_id, image["album_id"])
+        if not success:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to delete image"
+            )
+    
+    album_cache_service.album_contents_changed(db, image["album_id"])
 
 
-def get_album_images(db: Session, album_id: int, user_id: int) -> List[ImageResponse]:
+def get_album_images(
+    db: Session,
+    album_id: int,
+    user_id: int,
+    hints: Optional[ClientHints] = None
+) -> List[ImageResponse]:
     """Get all images in an album. User must have access to the album."""
     # Verify album exists and user has access
-    album = album_repository.get_album_by_id(db, album_id)
+    access = album_cache_service.get_album_access(db, album_id)
+    if not access:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Album not found"
+        )
+    
+    # Check if user is owner or member
+    if not album_cache_service.has_access(access, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this album"
+        )
+    
+    images = album_cache_service.get_album_images(db, album_id)
+    return [image_response(image, hints) for image in images]
+
+
+def check_duplicates(
+    db: Session,
+    check: DuplicateCheck,
+    user_id: int,
+    hints: Optional[ClientHints] = None
+) -> List[DuplicateMatch]:
+    """
+    Find near-duplicates of a client-computed hash in an album.
+
+    Lets the client skip uploading a photo that is already in the album.
+    User must have access to the album.
+    """
+    album_db = album_session(db, check.album_id)
+    album = album_repository.get_album_by_id(album_db, check.album_id)
     if not album:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -146,7 +264,7 @@ def get_album_images(db: Session, album_id: int, user_id: int) -> List[ImageResp
     
     # Check if user is owner or member
     is_owner = album["owner_id"] == user_id
-    is_member = album_member_repository.is_album_member(db, album_id, user_id)
+    is_member = album_member_repository.is_album_member(album_db, check.album_id, user_id)
     
     if not (is_owner or is_member):
         raise HTTPException(
@@ -154,6 +272,7 @@ def get_album_images(db: Session, album_id: int, user_id: int) -> List[ImageResp
             detail="You don't have access to this album"
         )
     
-    images = image_repository.get_album_images(db, album_id)
-    return [ImageResponse(**image) for image in images]
-
+    duplicates = duplicate_service.find_duplicates(
+        album_db, check.album_id, duplicate_service.parse_hash(check.phash), check.max_distance
+    )
+    return [DuplicateMatch(image=image_response(image, hints), distance=distance) for image, distance in duplicates]
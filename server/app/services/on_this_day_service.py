@@ -0,0 +1,112 @@
+"""
+"On this day" memories: images added on today's month and day in earlier years.
+
+Days are UTC calendar days; clients in other time zones pass their local
+date. Results are cached per user and day against the user:{id} version, so
+joining or leaving an album, or any change to the user's albums, reloads
+them. precompute() fills the cache for every user with memories ahead of
+the daily notification fan-out (python -m app.jobs.precompute_on_this_day).
+"""
+import heapq
+import logging
+from datetime import date, datetime, time, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.db import all_shard_sessions, close_shard_sessions, open_shard_session, primary_session, shard_router
+from app.repositories import album_member_repository, image_repository
+from app.schemas.image import ImageResponse
+from app.services.album_cache_service import get_cache
+from app.services.image_service import image_response
+from app.utils.responsive_images import ClientHints
+
+logger = logging.getLogger(__name__)
+
+LIMIT = 100  # Memories returned per user and day, newest first
+CACHE_TTL_SECONDS = 24 * 3600
+
+
+def _month_day(day: date) -> int:
+    # Same MMDD encoding as the image_month_day() SQL function
+    return day.month * 100 + day.day
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _sort_key(image: dict):
+    return datetime.fromisoformat(image["date_added"]), image["id"]
+
+
+def _cache_key(user_id: int, day: date) -> tuple:
+    return "on_this_day", f"{user_id}:{day.isoformat()}", [f"user:{user_id}"]
+
+
+def _load(db: Session, user_id: int, day: date) -> List[dict]:
+    per_shard = shard_router.fan_out(
+        all_shard_sessions(db),
+        lambda session: image_repository.get_on_this_day_images(
+            session, user_id, _month_day(day), _day_start(day), LIMIT
+        )
+    )
+    return list(heapq.merge(*per_shard, key=_sort_key, reverse=True))[:LIMIT]
+
+
+def get_on_this_day(
+    db: Session,
+    user_id: int,
+    day: Optional[date] = None,
+    hints: Optional[ClientHints] = None
+) -> List[ImageResponse]:
+    """Get the user's images from this day (default: today, UTC) in earlier years, newest first."""
+    day = day or datetime.now(timezone.utc).date()
+    namespace, key, depends_on = _cache_key(user_id, day)
+    images = get_cache().get_or_load(
+        namespace, key, depends_on, lambda: _load(primary_session(db), user_id, day), ttl=CACHE_TTL_SECONDS
+    )
+    return [image_response(image, hints) for image in images]
+
+
+def _memories_by_user(db: Session, day: date) -> Dict[int, List[dict]]:
+    """Each user's memories for the day, from one scan of the day per shard."""
+
+    def load_shard(session: Session):
+        images = image_repository.get_on_this_day_images_by_album(session, _month_day(day), _day_start(day), LIMIT)
+        members = album_member_repository.get_member_ids_by_album(session, list({image["album_id"] for image in images}))
+        return images, members
+
+    by_user: Dict[int, List[dict]] = {}
+    for images, members in shard_router.fan_out(all_shard_sessions(db), load_shard):
+        for image in images:
+            for user_id in members.get(image["album_id"], ()):
+                by_user.setdefault(user_id, []).append(image)
+
+    for user_id, images in by_user.items():
+        images.sort(key=_sort_key, reverse=True)
+        del images[LIMIT:]
+    return by_user
+
+
+def precompute(day: date) -> int:
+    """
+    Cache the memories of every user who has any on the day. Returns how
+    many users were cached.
+
+    The day is scanned twice: the first scan finds the users, whose cache
+    keys are resolved before the second scan loads what is stored, so a
+    change committed while the job runs can't be cached as current.
+    """
+    cache = get_cache()
+    db = open_shard_session(0)
+    try:
+        keys = {user_id: cache.resolve(*_cache_key(user_id, day)) for user_id in _memories_by_user(db, day)}
+        memories = _memories_by_user(db, day)
+        for user_id, full_key in keys.items():
+            cache.put(full_key, memories.get(user_id, []), CACHE_TTL_SECONDS)
+        logger.info("Cached memories for %s of %d users", day.isoformat(), len(keys))
+        return len(keys)
+    finally:
+        close_shard_sessions(db)
+        db.close()
@@ -0,0 +1,42 @@
+"""
+How much of each shard's ID range is used.
+
+Every album-scoped table hands out IDs from its shard's range (see
+ShardRouter); once a table's range is used up, inserts into it fail on that
+shard. Images use theirs up first.
+"""
+import logging
+from typing import List
+
+from app.config.db import (
+    SHARD_ID_WARN_RATIO, SHARDED_ID_TABLES, all_shard_sessions, close_shard_sessions, open_shard_session, shard_router
+)
+from app.repositories import schema_repository
+
+logger = logging.getLogger(__name__)
+
+
+def id_usage() -> List[dict]:
+    """Per shard and table, how many IDs of the range are used; warns past SHARD_ID_WARN_RATIO."""
+    db = open_shard_session(0)
+    try:
+        positions = shard_router.fan_out(
+            all_shard_sessions(db),
+            lambda session: schema_repository.get_id_sequence_positions(session, list(SHARDED_ID_TABLES))
+        )
+    finally:
+        close_shard_sessions(db)
+        db.close()
+
+    usage = []
+    for shard, last_ids in enumerate(positions):
+        first, last = shard_router.id_range(shard)
+        capacity = last - first + 1
+        for table in SHARDED_ID_TABLES:
+            last_id = last_ids.get(table)
+            used = max(0, last_id - first + 1) if last_id is not None else 0
+            ratio = round(used / capacity, 4)
+            if ratio > SHARD_ID_WARN_RATIO:
+                logger.warning("%s on shard %d has used %d of its %d IDs", table, shard, used, capacity)
+            usage.append({"shard": shard, "table": table, "used": used, "capacity": capacity, "ratio": ratio})
+    return usage
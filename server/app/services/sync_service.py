@@ -0,0 +1,183 @@
+"""
+Delta sync for offline-first clients.
+
+The cursor is the xmin of the snapshot the previous sync read from, so the
+next sync returns every row written by a transaction at or above it. Rows
+from transactions that were still running during the previous sync are
+therefore never missed, at the cost of occasionally resending a row the
+client already has (upserts make that harmless).
+
+Large syncs are paged with a (change_xid, kind, id) keyset; the cursor of a
+partial page also carries the snapshot xmin of the first page, which becomes
+the final cursor once the last page is delivered.
+
+Transaction IDs are per database, so with album shards the cursor holds one
+such cursor per shard, joined by "~". Shards are read in order and a page
+stops at the shard that fills it; shards not reached yet get a mid-sync
+cursor starting at their first change, so the sync finishes when no shard
+is mid-sync. With a single shard the cursor has no "~" and is unchanged.
+"""
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config.db import all_shard_sessions
+from app.repositories import album_repository, album_member_repository, audio_repository, image_repository, sync_repository
+from app.repositories.sync_repository import CHANGE_KINDS
+from app.schemas.album import AlbumResponse, AlbumMemberResponse
+from app.schemas.audio import AudioResponse
+from app.schemas.sync import SyncResponse, SyncTombstone
+from app.services.image_service import image_response
+from app.utils.responsive_images import ClientHints
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+START = (0, -1, 0)  # Keyset position before every change
+SHARD_SEPARATOR = "~"
+
+ShardCursor = Tuple[int, Optional[int], Optional[Tuple[int, int, int]]]
+
+
+def _parse_shard_cursor(cursor: str) -> ShardCursor:
+    """Return (since, final_cursor, position); final_cursor and position are set mid-sync only."""
+    try:
+        parts = [int(part) for part in cursor.split(".")]
+    except ValueError:
+        parts = []
+    if len(parts) == 1 and parts[0] >= 0:
+        return parts[0], None, None
+    if len(parts) == 5:
+        return parts[0], parts[1], (parts[2], parts[3], parts[4])
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid sync cursor"
+    )
+
+
+def _parse_cursor(cursor: Optional[str], shard_count: int) -> List[ShardCursor]:
+    """One (since, final_cursor, position) per shard; a cursor from another shard layout starts over."""
+    if not cursor:
+        return [(0, None, None)] * shard_count
+    shard_cursors = [_parse_shard_cursor(part) for part in cursor.split(SHARD_SEPARATOR)]
+    if len(shard_cursors) != shard_count:
+        return [(0, None, None)] * shard_count
+    return shard_cursors
+
+
+def _format_shard_cursor(since: int, final_cursor: Optional[int], position: Optional[Tuple[int, int, int]]) -> str:
+    if position is None:
+        return str(since)
+    return f"{since}.{final_cursor}.{position[0]}.{position[1]}.{position[2]}"
+
+
+def _sync_shard(
+    db: Session,
+    user_id: int,
+    since: int,
+    final_cursor: int,
+    position: Tuple[int, int, int],
+    limit: int,
+    hints: Optional[ClientHints]
+) -> Tuple[dict, str, int, bool]:
+    """
+    Read one page of a shard's changes.
+
+    Returns the entities by response field, the shard's next cursor, the
+    number of changes read and whether the shard has more.
+    """
+    memberships = sync_repository.get_user_sync_albums(db, user_id, since)
+    known_album_ids = [album_id for album_id, joined_since in memberships if not joined_since]
+    new_album_ids = [album_id for album_id, joined_since in memberships if joined_since]
+
+    changes = sync_repository.get_changes(
+        db, user_id, known_album_ids, new_album_ids, since, position, limit + 1
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    ids_by_kind = defaultdict(list)
+    for _, kind, row_id in changes:
+        ids_by_kind[CHANGE_KINDS[kind]].append(row_id)
+
+    if has_more:
+        next_cursor = _format_shard_cursor(since, final_cursor, changes[-1])
+    else:
+        next_cursor = str(final_cursor)
+
+    # The synced albums bound the partitions the image lookup reads
+    images = image_repository.get_images_by_ids(db, ids_by_kind["image"], known_album_ids + new_album_ids)
+
+    entities = {
+        "albums": [AlbumResponse(**album) for album in album_repository.get_albums_by_ids(db, ids_by_kind["album"])],
+        "members": [
+            AlbumMemberResponse(**member)
+            for member in album_member_repository.get_album_members_by_ids(db, ids_by_kind["album_member"])
+        ],
+        "images": [image_response(image, hints) for image in images],
+        "audio": [AudioResponse(**audio) for audio in audio_repository.get_audio_by_ids(db, ids_by_kind["audio"])],
+        "deleted": [
+            SyncTombstone(**tombstone)
+            for tombstone in sync_repository.get_tombstones_by_ids(db, ids_by_kind["tombstone"])
+        ]
+    }
+    return entities, next_cursor, len(changes), has_more
+
+
+def sync(
+    db: Session,
+    user_id: int,
+    cursor: Optional[str],
+    limit: int = DEFAULT_LIMIT,
+    hints: Optional[ClientHints] = None
+) -> SyncResponse:
+    """Return the albums, members, images, audio and deletions the user hasn't seen since cursor."""
+    sessions = all_shard_sessions(db)
+    shard_cursors = _parse_cursor(cursor, len(sessions))
+    snapshot_xmins = [sync_repository.begin_snapshot(session) for session in sessions]
+
+    reset = False
+    first_page = all(position is None for _, _, position in shard_cursors)
+    if first_page:
+        # First page: pruned tombstones may be missing, so old cursors start over.
+        # The client drops everything on reset, so every shard starts over with it.
+        if any(
+            since == 0 or since <= sync_repository.get_pruned_xid(session)
+            for (since, _, _), session in zip(shard_cursors, sessions)
+        ):
+            shard_cursors = [(0, None, None)] * len(sessions)
+            reset = True
+
+    response = SyncResponse(cursor="", reset=reset)
+    next_cursors = []
+    remaining = limit
+    for session, snapshot_xmin, (since, final_cursor, position) in zip(sessions, snapshot_xmins, shard_cursors):
+        if position is None:
+            if not first_page:
+                # Delivered in full on an earlier page of this sync
+                next_cursors.append(str(since))
+                continue
+            final_cursor = snapshot_xmin
+            position = START
+
+        if remaining == 0:
+            # Not read yet; continues from here on the next page
+            next_cursors.append(_format_shard_cursor(since, final_cursor, position))
+            response.has_more = True
+            continue
+
+        entities, next_cursor, change_count, has_more = _sync_shard(
+            session, user_id, since, final_cursor, position, remaining, hints
+        )
+        next_cursors.append(next_cursor)
+        for field, items in entities.items():
+            getattr(response, field).extend(items)
+        remaining -= change_count
+        if has_more:
+            response.has_more = True
+            remaining = 0
+
+    response.cursor = SHARD_SEPARATOR.join(next_cursors)
+    return response
@@ -0,0 +1,80 @@
+"""
+The timeline: images from every album a user belongs to, newest first.
+
+Each shard returns its own first page (image_repository.get_timeline_images)
+and the pages are merged, so a page costs one query per shard regardless of
+how many albums the user is in. The cursor is the (date_added, id) of the
+last image on the previous page, encoded as "<microseconds since epoch>.<id>".
+"""
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config.db import all_shard_sessions, shard_router
+from app.repositories import audio_repository, image_repository
+from app.schemas.timeline import TimelineImage, TimelinePage
+from app.services.image_service import image_response
+from app.utils.responsive_images import ClientHints
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _encode_cursor(image: dict) -> str:
+    date_added = datetime.fromisoformat(image["date_added"])
+    return f"{(date_added - EPOCH) // MICROSECOND}.{image['id']}"
+
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        micros, image_id = (int(part) for part in cursor.split("."))
+        return EPOCH + micros * MICROSECOND, image_id
+    except (ValueError, OverflowError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid timeline cursor"
+        )
+
+
+def _sort_key(image: dict) -> Tuple[datetime, int]:
+    return datetime.fromisoformat(image["date_added"]), image["id"]
+
+
+def get_timeline(
+    db: Session,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    include_audio: bool = False,
+    hints: Optional[ClientHints] = None
+) -> TimelinePage:
+    """Get a page of the user's timeline, optionally with each image's audio clip."""
+    before = _parse_cursor(cursor)
+
+    def load_shard(session: Session) -> List[dict]:
+        images = image_repository.get_timeline_images(session, user_id, before, limit + 1)
+        if include_audio:
+            audio = audio_repository.get_audio_by_image_ids(session, [image["id"] for image in images])
+            audio_by_image = {clip["image_id"]: clip for clip in audio}
+            images = [{**image, "audio": audio_by_image.get(image["id"])} for image in images]
+        return images
+
+    per_shard = shard_router.fan_out(all_shard_sessions(db), load_shard)
+    images = list(heapq.merge(*per_shard, key=_sort_key, reverse=True))[:limit + 1]
+
+    next_cursor = _encode_cursor(images[limit - 1]) if len(images) > limit else None
+    return TimelinePage(
+        images=[
+            TimelineImage(**image_response(image, hints).model_dump(), audio=image.get("audio"))
+            for image in images[:limit]
+        ],
+        next_cursor=next_cursor
+    )
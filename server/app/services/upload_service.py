@@ -0,0 +1,33 @@
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException, status
+
+from app.config.settings import get_settings
+from app.schemas.upload import UploadResponse, UploadSignatureResponse
+from app.storage import UploadTooLarge, get_storage
+
+FOLDERS = {"image": "images", "audio": "audio"}
+
+
+def user_folder(user_id: int, kind: str) -> str:
+    return f"memento/user_{user_id}/{FOLDERS[kind]}"
+
+
+def get_upload_target(user_id: int, kind: str) -> UploadSignatureResponse:
+    """Tell the client where to upload an image or audio file."""
+    return UploadSignatureResponse(**get_storage().upload_target(user_folder(user_id, kind), kind))
+
+
+def upload(stream: BinaryIO, size: Optional[int], user_id: int, kind: str) -> UploadResponse:
+    """Store a file uploaded through the API. Blocks on I/O; call from a worker thread."""
+    max_bytes = get_settings().media_max_upload_bytes
+    try:
+        if size is not None and size > max_bytes:
+            raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+        stored = get_storage().save(stream, user_folder(user_id, kind), kind)
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    return UploadResponse(url=stored.url, size=stored.size, sha256=stored.sha256)
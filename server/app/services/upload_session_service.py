@@ -0,0 +1,518 @@
+"""
+Resumable uploads, for phones on flaky networks.
+
+1. POST /upload/sessions declares the file (size, SHA-256) and the image or
+   audio record to create from it; access is checked before any bytes move.
+2. PATCH /upload/sessions/{id} with an Upload-Offset header sends bytes from
+   that offset. Bytes that arrive before a connection drops are kept, so the
+   client asks for the offset (GET) and continues from there instead of
+   starting over. An optional Upload-Checksum ("sha256 <base64>") covers the
+   PATCH body; a body that doesn't match it isn't counted.
+3. POST /upload/sessions/{id}/complete checks the whole file against the
+   declared SHA-256, moves it to media storage and creates the record.
+
+Bodies are streamed to a part file in UPLOAD_STAGING_PATH; nothing holds a
+whole file in memory, and no database connection or worker thread is held
+while a body arrives. Apart from append, the functions block on I/O; call
+them from a worker thread.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import AsyncIterable, BinaryIO, Optional, Tuple
+
+from fastapi import BackgroundTasks, HTTPException, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config.db import album_session, shard_router, unit_of_work
+from app.config.settings import get_settings
+from app.repositories import (
+    album_member_repository, album_repository, audio_repository, image_repository, upload_session_repository
+)
+from app.schemas.audio import AudioResponse
+from app.schemas.upload import UploadSessionCreate, UploadSessionResponse, UploadSessionResult
+from app.services import album_cache_service, duplicate_service, histogram_service, image_ingest_service
+from app.services.image_service import image_response
+from app.services.upload_service import user_folder
+from app.storage import get_storage
+from app.utils.responsive_images import ClientHints
+
+CHUNK_SIZE = 1024 * 1024
+ORPHAN_BATCH_SIZE = 1000
+HTTP_460_CHECKSUM_MISMATCH = 460  # tus checksum extension
+
+
+def _part_path(upload_id: int) -> Path:
+    # IDs come from per-shard ranges, so they are unique across shards
+    return Path(get_settings().upload_staging_path) / f"{upload_id}.part"
+
+
+def _session_response(session: dict) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=session["id"],
+        kind=session["kind"],
+        length=session["length"],
+        offset=session["offset"],
+        expires_at=session["expires_at"]
+    )
+
+
+def _check_album_access(album_db: Session, album_id: int, user_id: int) -> None:
+    album = album_repository.get_album_by_id(album_db, album_id)
+    if not album:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Album not found"
+        )
+    if album["owner_id"] != user_id and not album_member_repository.is_album_member(album_db, album_id, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this album"
+        )
+
+
+def _check_audio_target(album_db: Session, image_id: int, user_id: int, album_id: Optional[int] = None) -> dict:
+    image = image_repository.get_image_by_id(album_db, image_id, album_id)
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    if image["user_id"] != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the image creator can add audio"
+        )
+    return image
+
+
+def _get_owned_session(album_db: Session, upload_id: int, user_id: int, for_update: bool = False) -> dict:
+    session = upload_session_repository.get_upload_session(album_db, upload_id, for_update)
+    if not session or session["user_id"] != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return session
+
+
+def create_session(db: Session, data: UploadSessionCreate, user_id: int) -> UploadSessionResponse:
+    """Start a resumable upload after checking the record can be created."""
+    max_bytes = get_settings().media_max_upload_bytes
+    if data.length > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds {max_bytes} bytes"
+        )
+
+    if data.kind == "image":
+        if data.album_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="album_id is required for image uploads"
+            )
+        album_db = album_session(db, data.album_id)
+        _check_album_access(album_db, data.album_id, user_id)
+        album_id, image_id = data.album_id, None
+
+        # Refuse a near-duplicate before its bytes are sent, as POST /images would after
+        phash = duplicate_service.parse_hash(data.phash) if data.phash else None
+        if phash is not None and not data.allow_duplicate:
+            duplicates = duplicate_service.find_duplicates(album_db, album_id, phash)
+            if duplicates:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail={
+                        "message": "A similar image already exists in this album",
+                        "duplicate_image_ids": [image["id"] for image, _ in duplicates]
+                    }
+                )
+        metadata = data.model_dump(include={"caption", "latitude", "longitude", "phash"})
+    else:
+        if data.image_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="image_id is required for audio uploads"
+            )
+        album_db = album_session(db, data.image_id)
+        image = _check_audio_target(album_db, data.image_id, user_id)
+        if audio_repository.get_audio_by_image_id(album_db, data.image_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Audio already exists for this image. Use update endpoint to modify it."
+            )
+        album_id, image_id = image["album_id"], data.image_id
+        metadata = {}
+
+    with unit_of_work(album_db):
+        session = upload_session_repository.create_upload_session(
+            db=album_db,
+            user_id=user_id,
+            kind=data.kind,
+            album_id=album_id,
+            image_id=image_id,
+            length=data.length,
+            sha256=data.sha256,
+            metadata=metadata,
+            ttl_hours=get_settings().upload_session_ttl_hours
+        )
+        part = _part_path(session["id"])
+        part.parent.mkdir(parents=True, exist_ok=True)
+        part.touch()
+
+    return _session_response(session)
+
+
+def get_session(db: Session, upload_id: int, user_id: int) -> UploadSessionResponse:
+    """Get an upload's progress."""
+    album_db = album_session(db, upload_id)
+    return _session_response(_get_owned_session(album_db, upload_id, user_id))
+
+
+def _parse_checksum(checksum: Optional[str]) -> Optional[bytes]:
+    if checksum is None:
+        return None
+    algorithm, _, encoded = checksum.strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload-Checksum must be \"sha256 <base64 digest>\""
+        )
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except binascii.Error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload-Checksum digest is not valid base64"
+        )
+
+
+def _offset_conflict(offset: int, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=detail,
+        headers={"Upload-Offset": str(offset)}
+    )
+
+
+def _open_for_append(db: Session, upload_id: int, user_id: int, offset: int) -> Tuple[dict, BinaryIO]:
+    album_db = album_session(db, upload_id)
+    try:
+        session = _get_owned_session(album_db, upload_id, user_id)
+    finally:
+        # Hold no connection while the body streams in: neither the shard's
+        # nor the primary's, which authenticated the request
+        album_db.close()
+        db.close()
+
+    if session["url"] is not None:
+        raise _offset_conflict(session["offset"], "Upload is already complete")
+    if offset != session["offset"]:
+        raise _offset_conflict(session["offset"], "Upload-Offset doesn't match the upload's offset")
+
+    try:
+        # Writing at the offset, not appending, overwrites whatever an
+        # interrupted request left past it
+        out = open(_part_path(upload_id), "r+b")
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="The upload's data is gone; start a new upload"
+        )
+    out.seek(offset)
+    return session, out
+
+
+def _write(out: BinaryIO, digest, data: bytes) -> None:
+    out.write(data)
+    digest.update(data)
+
+
+def _sync(out: BinaryIO) -> None:
+    out.flush()
+    os.fsync(out.fileno())
+
+
+def _advance(db: Session, upload_id: int, offset: int, written: int) -> int:
+    album_db = album_session(db, upload_id)
+    with unit_of_work(album_db):
+        if not upload_session_repository.move_upload_offset(album_db, upload_id, offset, offset + written):
+            raise _offset_conflict(offset, "The upload was changed by another request")
+    return offset + written
+
+
+async def append(
+    db: Session,
+    upload_id: int,
+    user_id: int,
+    offset: int,
+    chunks: AsyncIterable[bytes],
+    checksum: Optional[str] = None
+) -> int:
+    """
+    Write a PATCH body at offset, which must be the upload's current offset.
+    Returns the new offset.
+
+    The body is read on the event loop; only database calls and file writes,
+    in CHUNK_SIZE batches, go to worker threads, so a slow upload doesn't
+    occupy one. If the body breaks off, the bytes received so far still
+    count unless the request carried a checksum, which can then no longer
+    be checked.
+    """
+    expected_digest = _parse_checksum(checksum)
+    session, out = await run_in_threadpool(_open_for_append, db, upload_id, user_id, offset)
+
+    remaining = session["length"] - offset
+    digest = hashlib.sha256()
+    written = 0
+    pending = bytearray()
+
+    async def flush() -> None:
+        nonlocal written
+        if pending:
+            await run_in_threadpool(_write, out, digest, bytes(pending))
+            written += len(pending)
+            pending.clear()
+
+    try:
+        try:
+            async for chunk in chunks:
+                if written + len(pending) + len(chunk) > remaining:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Body goes past the upload's length"
+                    )
+                pending += chunk
+                if len(pending) >= CHUNK_SIZE:
+                    await flush()
+            await flush()
+            await run_in_threadpool(_sync, out)
+        except HTTPException:
+            raise
+        except Exception:
+            # The client went away mid-body: keep what arrived
+            if expected_digest is None:
+                await flush()
+                if written:
+                    await run_in_threadpool(_sync, out)
+                    await run_in_threadpool(_advance, db, upload_id, offset, written)
+            raise
+    finally:
+        await run_in_threadpool(out.close)
+
+    if expected_digest is not None and digest.digest() != expected_digest:
+        raise HTTPException(
+            status_code=HTTP_460_CHECKSUM_MISMATCH,
+            detail="Checksum mismatch"
+        )
+    return await run_in_threadpool(_advance, db, upload_id, offset, written)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _store_upload(album_db: Session, upload_id: int, user_id: int) -> None:
+    """
+    Verify the finished file and move it to media storage, once.
+
+    Hashing and storing (a chunked upload, for Cloudinary) can take minutes,
+    so they run outside any transaction; the URL is then recorded only if no
+    concurrent completion recorded one first. Each completion stores its own
+    hard link to the part file, and the part file is removed only after a URL
+    is recorded, so a completion that finds it gone always finds the URL.
+    """
+    session = _get_owned_session(album_db, upload_id, user_id)
+    album_db.commit()
+    if session["url"] is not None:
+        return
+    if session["offset"] != session["length"]:
+        raise _offset_conflict(session["offset"], "Upload is not finished")
+
+    part = _part_path(upload_id)
+    claim = part.with_suffix(f".{os.urandom(8).hex()}.claim")
+    try:
+        try:
+            os.link(part, claim)
+        except FileNotFoundError:
+            # A concurrent completion stored the file and recorded its URL
+            if _get_owned_session(album_db, upload_id, user_id)["url"] is not None:
+                return
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="The upload's data is gone; start a new upload"
+            )
+        sha256 = _file_sha256(claim)
+        if sha256 == session["sha256"]:
+            stored = get_storage().save_file(claim, sha256, user_folder(user_id, session["kind"]), session["kind"])
+    finally:
+        claim.unlink(missing_ok=True)
+
+    if sha256 != session["sha256"]:
+        # Nothing sent so far can be trusted; start over from byte zero
+        with unit_of_work(album_db):
+            upload_session_repository.move_upload_offset(album_db, upload_id, session["offset"], 0)
+        raise HTTPException(
+            status_code=HTTP_460_CHECKSUM_MISMATCH,
+            detail="The uploaded file doesn't match its SHA-256; upload it again from offset 0"
+        )
+
+    with unit_of_work(album_db):
+        recorded = upload_session_repository.set_upload_session_url(album_db, upload_id, stored.url)
+        winner = stored.url if recorded else _get_owned_session(album_db, upload_id, user_id)["url"]
+    part.unlink(missing_ok=True)
+    if winner != stored.url:
+        get_storage().delete(stored.url)
+
+
+def complete(
+    db: Session,
+    upload_id: int,
+    user_id: int,
+    background_tasks: Optional[BackgroundTasks] = None,
+    hints: Optional[ClientHints] = None
+) -> UploadSessionResult:
+    """
+    Create the image or audio record from a finished upload. Completing an
+    upload again returns the same record.
+
+    The record is created and the session marked complete in one
+    transaction, so a retry after a lost response can't create a second one.
+    """
+    album_db = album_session(db, upload_id)
+    _store_upload(album_db, upload_id, user_id)
+
+    with unit_of_work(album_db):
+        session = _get_owned_session(album_db, upload_id, user_id, for_update=True)
+        if session["record_id"] is not None:
+            if session["kind"] == "image":
+                image = image_repository.get_image_by_id(album_db, session["record_id"], session["album_id"])
+                return UploadSessionResult(image=image_response(image, hints) if image else None)
+            audio = audio_repository.get_audio_by_id(album_db, session["record_id"])
+            return UploadSessionResult(audio=AudioResponse(**audio) if audio else None)
+
+        metadata = session["metadata"]
+        phash = duplicate_service.parse_hash(metadata["phash"]) if metadata.get("phash") else None
+        if session["kind"] == "image":
+            # Access may have been revoked while the file was uploading
+            _check_album_access(album_db, session["album_id"], user_id)
+            image = image_repository.create_image(
+                db=album_db,
+                album_id=session["album_id"],
+                image_url=session["url"],
+                user_id=user_id,
+                caption=metadata.get("caption"),
+                latitude=metadata.get("latitude"),
+                longitude=metadata.get("longitude"),
+                phash=phash
+            )
+            if not image:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to create image"
+                )
+            histogram_service.enable_rollup_if_large(album_db, session["album_id"])
+            record_id = image["id"]
+        else:
+            _check_audio_target(album_db, session["image_id"], user_id, session["album_id"])
+            audio = audio_repository.create_audio(
+                db=album_db,
+                image_id=session["image_id"],
+                album_id=session["album_id"],
+                url=session["url"]
+            )
+            if not audio:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Audio already exists for this image. Use update endpoint to modify it."
+                )
+            record_id = audio["id"]
+        upload_session_repository.complete_upload_session(album_db, upload_id, record_id)
+
+    album_cache_service.album_contents_changed(db, session["album_id"])
+
+    if session["kind"] == "audio":
+        return UploadSessionResult(audio=AudioResponse(**audio))
+
+    if phash is not None:
+        duplicate_service.record_hash(image["album_id"], image["id"], phash)
+    if background_tasks is not None:
+        background_tasks.add_task(
+            image_ingest_service.ingest_image, image["id"], image["image_url"], user_id, image["album_id"]
+        )
+    return UploadSessionResult(image=image_response(image, hints))
+
+
+def cancel(db: Session, upload_id: int, user_id: int) -> None:
+    """Abandon an upload and delete its staged bytes."""
+    album_db = album_session(db, upload_id)
+    with unit_of_work(album_db):
+        _get_owned_session(album_db, upload_id, user_id, for_update=True)
+        upload_session_repository.delete_upload_session(album_db, upload_id)
+    _part_path(upload_id).unlink(missing_ok=True)
+
+
+def delete_expired(db: Session, limit: int = 1000) -> int:
+    """Delete expired sessions on db's shard and their staged bytes. Returns how many were removed."""
+    removed = 0
+    while True:
+        with unit_of_work(db):
+            upload_ids = upload_session_repository.delete_expired_upload_sessions(db, limit)
+        for upload_id in upload_ids:
+            _part_path(upload_id).unlink(missing_ok=True)
+        removed += len(upload_ids)
+        if len(upload_ids) < limit:
+            return removed
+
+
+def delete_orphaned_parts(db: Session, shard: int, min_age_seconds: int = 3600) -> int:
+    """
+    Delete staged part files of db's shard that no session row refers to any
+    more, e.g. after their album was deleted, and claim files left behind by
+    a completion that crashed. Files younger than min_age_seconds are left
+    alone, since create_session writes the file before its row commits.
+    Returns how many were removed.
+    """
+    staging = Path(get_settings().upload_staging_path)
+    if not staging.is_dir():
+        return 0
+    cutoff = time.time() - min_age_seconds
+    removed = 0
+    for claim in staging.glob("*.claim"):
+        upload_id = claim.name.split(".", 1)[0]
+        if upload_id.isdigit() and shard_router.shard_for_id(int(upload_id)) == shard:
+            try:
+                # A hard link shares the part file's mtime; creating it sets the ctime
+                if claim.stat().st_ctime < cutoff:
+                    claim.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+
+    candidates = {}
+    for part in staging.glob("*.part"):
+        if part.stem.isdigit() and shard_router.shard_for_id(int(part.stem)) == shard:
+            try:
+                if part.stat().st_mtime < cutoff:
+                    candidates[int(part.stem)] = part
+            except FileNotFoundError:
+                continue
+
+    upload_ids = list(candidates)
+    for start in range(0, len(upload_ids), ORPHAN_BATCH_SIZE):
+        batch = upload_ids[start:start + ORPHAN_BATCH_SIZE]
+        existing = set(upload_session_repository.get_existing_upload_session_ids(db, batch))
+        db.commit()
+        for upload_id in batch:
+            if upload_id not in existing:
+                candidates[upload_id].unlink(missing_ok=True)
+                removed += 1
+    return removed
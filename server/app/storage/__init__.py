@@ -0,0 +1,36 @@
+"""
+Media storage behind one interface (StorageBackend), chosen by STORAGE_BACKEND:
+- cloudinary (default): clients upload straight to Cloudinary with a signature
+- local: content-addressed files on this server's disk, uploaded through
+  POST /upload/{image,audio} and served from /media (app.routers.media)
+"""
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app.config.settings import get_settings
+from app.storage.base import StorageBackend, StoredAsset
+from app.storage.local import LocalStorage, UploadTooLarge
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Create the configured backend on first use."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            settings = get_settings()
+            if settings.storage_backend == "local":
+                _storage = LocalStorage(
+                    Path(settings.local_storage_path), settings.public_base_url, settings.media_max_upload_bytes
+                )
+            else:
+                # Imported here so local storage works without the Cloudinary SDK
+                from app.storage.cloudinary import CloudinaryStorage
+                _storage = CloudinaryStorage()
+        return _storage
+
+
+__all__ = ["LocalStorage", "StorageBackend", "StoredAsset", "UploadTooLarge", "get_storage"]
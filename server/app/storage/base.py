@@ -0,0 +1,41 @@
+from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional, Protocol
+
+
+class StoredAsset(NamedTuple):
+    url: str
+    size: int
+    sha256: Optional[str] = None  # Content hash, when the backend computes one
+
+
+class StorageBackend(Protocol):
+    """
+    Where uploaded media and generated variants live.
+
+    kind is "image" or "audio"; folder is the per-user folder clients upload
+    into (e.g. "memento/user_1/images").
+    """
+
+    def upload_target(self, folder: str, kind: str) -> dict:
+        """Describe where a client uploads a file directly (UploadSignatureResponse fields)."""
+        ...
+
+    def save(self, stream: BinaryIO, folder: str, kind: str) -> StoredAsset:
+        """Store a file streamed through the API."""
+        ...
+
+    def save_file(self, path: Path, sha256: str, folder: str, kind: str) -> StoredAsset:
+        """Store a finished resumable upload whose contents hash to sha256. The file at path is consumed."""
+        ...
+
+    def put(self, data: bytes, public_id: str) -> str:
+        """Store an image generated by the server under public_id; returns its URL."""
+        ...
+
+    def read(self, url: str) -> Optional[bytes]:
+        """The contents of a file this backend stores locally, or None to fetch the URL over HTTP."""
+        ...
+
+    def delete(self, url: str) -> bool:
+        """Delete the file behind a URL this backend issued. False if it isn't one or the delete failed."""
+        ...
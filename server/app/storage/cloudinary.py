@@ -0,0 +1,40 @@
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import cloudinary.uploader
+
+from app.storage.base import StoredAsset
+from app.utils.cloudinary_utils import delete_asset, generate_upload_signature, public_id_from_url, upload_asset
+
+# Audio is stored as raw files; Cloudinary's audio support lives under video
+RESOURCE_TYPES = {"image": "image", "audio": "raw"}
+
+
+class CloudinaryStorage:
+    """Media hosted on Cloudinary, which clients usually upload to directly."""
+
+    def upload_target(self, folder: str, kind: str) -> dict:
+        return {"provider": "cloudinary", **generate_upload_signature(folder=folder, resource_type=RESOURCE_TYPES[kind])}
+
+    def save(self, stream: BinaryIO, folder: str, kind: str) -> StoredAsset:
+        result = cloudinary.uploader.upload(stream, folder=folder, resource_type=RESOURCE_TYPES[kind])
+        return StoredAsset(url=result["secure_url"], size=result["bytes"])
+
+    def save_file(self, path: Path, sha256: str, folder: str, kind: str) -> StoredAsset:
+        # upload_large sends the file in chunks rather than as one request body
+        result = cloudinary.uploader.upload_large(str(path), folder=folder, resource_type=RESOURCE_TYPES[kind])
+        path.unlink()
+        return StoredAsset(url=result["secure_url"], size=result["bytes"], sha256=sha256)
+
+    def put(self, data: bytes, public_id: str) -> str:
+        return upload_asset(data, public_id)
+
+    def read(self, url: str) -> Optional[bytes]:
+        return None
+
+    def delete(self, url: str) -> bool:
+        parsed = public_id_from_url(url)
+        if parsed is None:
+            return False
+        resource_type, public_id = parsed
+        return delete_asset(public_id, resource_type)
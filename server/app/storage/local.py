@@ -0,0 +1,199 @@
+"""
+Content-addressed media on the local disk.
+
+A file is stored once, under the SHA-256 of its contents, at
+<root>/<hash[0:2]>/<hash[2:4]>/<hash><extension>, where the extension is
+sniffed from the first bytes. Storing the same bytes again returns the
+existing URL without writing anything, and because a name always refers to
+the same bytes, app.routers.media serves files with the hash as a strong
+ETag and immutable cache headers.
+
+Identical uploads share one file, so only delete files that no image or
+audio row references any more (app.jobs.media_gc). Storing a file again
+refreshes its modification time, which media_gc's age threshold relies on.
+"""
+import errno
+import hashlib
+import io
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from app.storage.base import StoredAsset
+
+CHUNK_SIZE = 1024 * 1024
+SNIFF_BYTES = 16
+NAME_PATTERN = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{3,4})?$")
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".heic": "image/heic",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".mp4": "video/mp4",
+    ".aac": "audio/aac",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+}
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def sniff_extension(head: bytes) -> str:
+    """Guess a file's extension from its first bytes; empty when unknown."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if head.startswith(b"RIFF"):
+        return {b"WEBP": ".webp", b"WAVE": ".wav"}.get(head[8:12], "")
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return ".heic"
+        return ".m4a" if brand in (b"M4A ", b"M4B ") else ".mp4"
+    if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return ".mp3"
+    if head[:2] in (b"\xff\xf1", b"\xff\xf9"):
+        return ".aac"
+    if head.startswith(b"OggS"):
+        return ".ogg"
+    if head.startswith(b"fLaC"):
+        return ".flac"
+    return ""
+
+
+def _touch(path: Path) -> None:
+    # A file that is stored again is in use again; media_gc skips recent files
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+class LocalStorage:
+    """Files under root, served by this API at <base_url>/media/<name>."""
+
+    def __init__(self, root: Path, base_url: str, max_bytes: int):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.max_bytes = max_bytes
+        self._incoming = root / ".incoming"
+        self._incoming.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, name: str) -> Optional[Path]:
+        """Where a file name lives, or None if it isn't a valid name (which also rules out traversal)."""
+        if not NAME_PATTERN.match(name):
+            return None
+        return self.root / name[:2] / name[2:4] / name
+
+    def _name_from_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.base_url}/media/"
+        if not url.startswith(prefix):
+            return None
+        name = url[len(prefix):]
+        return name if NAME_PATTERN.match(name) else None
+
+    def upload_target(self, folder: str, kind: str) -> dict:
+        return {"provider": "local", "upload_url": f"{self.base_url}/upload/{kind}", "folder": folder}
+
+    def save(self, stream: BinaryIO, folder: str, kind: str) -> StoredAsset:
+        """
+        Stream a file to disk while hashing it, then move it to its content
+        address. The folder is not part of the address.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        fd, temp_path = tempfile.mkstemp(dir=self._incoming)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := stream.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"File exceeds {self.max_bytes} bytes")
+                    if len(head) < SNIFF_BYTES:
+                        head += chunk[:SNIFF_BYTES - len(head)]
+                    digest.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+
+            name = digest.hexdigest() + sniff_extension(head)
+            path = self.path_for(name)
+            if path.exists():
+                os.unlink(temp_path)
+                _touch(path)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Atomic, so readers never see a partly written file
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return StoredAsset(url=f"{self.base_url}/media/{name}", size=size, sha256=digest.hexdigest())
+
+    def save_file(self, path: Path, sha256: str, folder: str, kind: str) -> StoredAsset:
+        """Move a verified file to its content address; copied only when it is on another filesystem."""
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+        size = path.stat().st_size
+        name = sha256 + sniff_extension(head)
+        target = self.path_for(name)
+        if target.exists():
+            path.unlink()
+            _touch(target)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(path, target)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                with open(path, "rb") as f:
+                    stored = self.save(f, folder, kind)
+                path.unlink()
+                return stored
+        return StoredAsset(url=f"{self.base_url}/media/{name}", size=size, sha256=sha256)
+
+    def put(self, data: bytes, public_id: str) -> str:
+        return self.save(io.BytesIO(data), "", "image").url
+
+    def read(self, url: str) -> Optional[bytes]:
+        name = self._name_from_url(url)
+        if name is None:
+            return None
+        # A missing file raises FileNotFoundError rather than falling back to HTTP
+        return self.path_for(name).read_bytes()
+
+    def list_files(self) -> Iterator[Tuple[str, float]]:
+        """(URL, modification time) of every stored file, stat'ed as the iteration reaches it."""
+        for path in self.root.glob("??/??/*"):
+            if not NAME_PATTERN.match(path.name):
+                continue
+            try:
+                modified_at = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            yield f"{self.base_url}/media/{path.name}", modified_at
+
+    def delete(self, url: str) -> bool:
+        name = self._name_from_url(url)
+        if name is None:
+            return False
+        try:
+            self.path_for(name).unlink()
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,184 @@
+"""
+Admission control: bounded concurrency per route class with a short queue.
+
+Requests beyond a class's concurrency limit wait in a small queue; once the
+queue is full, or a request has waited too long, it is rejected immediately
+with 503 and Retry-After instead of piling up on the database pool and
+slowing every other request down. Limits are per worker process.
+"""
+import asyncio
+import json
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# Upper bounds (milliseconds) of the queue-time histogram buckets
+QUEUE_TIME_BUCKETS_MS = (1, 10, 50, 100, 250, 500, 1000, 2500)
+
+
+class AdmissionGate:
+    """Concurrency limit plus a bounded wait queue for one route class."""
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.queue_time_buckets = [0] * (len(QUEUE_TIME_BUCKETS_MS) + 1)
+
+    async def acquire(self) -> Optional[float]:
+        """Wait for a slot. Returns the seconds spent queued, or None if rejected."""
+        if self._semaphore.locked():
+            if self.queued >= self.queue_size:
+                self.rejected += 1
+                return None
+            started = time.monotonic()
+            self.queued += 1
+            acquired = False
+            try:
+                # Not wait_for: on 3.11 it can time out after the acquire has
+                # already succeeded and drop the permit on the floor.
+                async with asyncio.timeout(self.queue_timeout):
+                    await self._semaphore.acquire()
+                    acquired = True
+            except TimeoutError:
+                self.rejected += 1
+                return None
+            except BaseException:
+                # Cancelled after the permit was granted: hand it back
+                if acquired:
+                    self._semaphore.release()
+                raise
+            finally:
+                self.queued -= 1
+            waited = time.monotonic() - started
+        else:
+            await self._semaphore.acquire()
+            waited = 0.0
+
+        self.in_flight += 1
+        self.admitted += 1
+        self._record_queue_time(waited)
+        return waited
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def _record_queue_time(self, seconds: float) -> None:
+        self.queue_time_total += seconds
+        self.queue_time_max = max(self.queue_time_max, seconds)
+        millis = seconds * 1000
+        for index, bound in enumerate(QUEUE_TIME_BUCKETS_MS):
+            if millis <= bound:
+                self.queue_time_buckets[index] += 1
+                return
+        self.queue_time_buckets[-1] += 1
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in QUEUE_TIME_BUCKETS_MS] + ["inf"]
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_time_avg_ms": round(self.queue_time_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "queue_time_max_ms": round(self.queue_time_max * 1000, 2),
+            "queue_time_histogram": dict(zip(labels, self.queue_time_buckets))
+        }
+
+
+class AdmissionController:
+    """Classifies requests into route classes and holds a gate for each."""
+
+    def __init__(
+        self,
+        gates: Dict[str, AdmissionGate],
+        exempt_prefixes: Iterable[str] = (),
+        exempt_method_prefixes: Iterable[Tuple[str, str]] = ()
+    ):
+        self.gates = gates
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.exempt_method_prefixes = tuple(exempt_method_prefixes)  # (method, path prefix) pairs
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        """Return the route class of a request, or None if it bypasses admission control."""
+        if method == "OPTIONS" or path == "/" or path.startswith(self.exempt_prefixes):
+            return None
+        if any(method == exempt_method and path.startswith(prefix) for exempt_method, prefix in self.exempt_method_prefixes):
+            return None
+        # Login and registration spend most of their time in bcrypt
+        if path.startswith("/auth/") and method == "POST":
+            return "auth"
+        if method in ("GET", "HEAD"):
+            return "read"
+        return "write"
+
+    def snapshot(self) -> dict:
+        return {name: gate.snapshot() for name, gate in self.gates.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that runs every request through an AdmissionController."""
+
+    def __init__(self, app, controller: AdmissionController, retry_after: int = 1):
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.controller.classify(scope["method"], scope["path"])
+        gate = self.controller.gates.get(route_class) if route_class else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        waited = await gate.acquire()
+        if waited is None:
+            await self._reject(send, route_class)
+            return
+
+        released = False
+
+        def release_once():
+            nonlocal released
+            if not released:
+                released = True
+                gate.release()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"queue;dur={waited * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+            # Background tasks run after the response inside the same call;
+            # they must not hold a slot that new requests are waiting for
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release_once()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            release_once()
+
+    async def _reject(self, send, route_class: str) -> None:
+        body = json.dumps({"detail": f"Server is busy ({route_class}), retry shortly"}).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(self.retry_after).encode()),
+        ]
+        await send({"type": "http.response.start", "status": 503, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
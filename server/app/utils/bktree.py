@@ -0,0 +1,78 @@
+"""
+BK-tree for Hamming-distance lookups over 64-bit perceptual hashes.
+
+A BK-tree stores each node's children keyed by their distance to it. The
+triangle inequality lets a radius search skip every subtree whose edge
+distance falls outside [d - radius, d + radius], so near-duplicate lookups
+touch a small fraction of the hashes even in large albums.
+"""
+from typing import Dict, List, Optional, Tuple
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two 64-bit hashes (signed or unsigned)."""
+    return bin((a ^ b) & HASH_MASK).count("1")
+
+
+class _Node:
+    __slots__ = ("hash", "ids", "children")
+
+    def __init__(self, value: int, item_id: int):
+        self.hash = value
+        self.ids = [item_id]  # Exact duplicates share a node
+        self.children: Dict[int, "_Node"] = {}
+
+
+class BKTree:
+    """Hamming-distance BK-tree mapping 64-bit hashes to item ids."""
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, item_id: int) -> None:
+        """Insert a hash for an item."""
+        value &= HASH_MASK
+        self._size += 1
+        if self._root is None:
+            self._root = _Node(value, item_id)
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node.hash)
+            if distance == 0:
+                node.ids.append(item_id)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(value, item_id)
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """Return (item_id, distance) pairs within radius of value, closest first."""
+        if self._root is None:
+            return []
+
+        value &= HASH_MASK
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node.hash)
+            if distance <= radius:
+                matches.extend((item_id, distance) for item_id in node.ids)
+            low, high = distance - radius, distance + radius
+            for edge, child in node.children.items():
+                if low <= edge <= high:
+                    stack.append(child)
+
+        matches.sort(key=lambda match: match[1])
+        return matches
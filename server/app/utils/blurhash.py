@@ -0,0 +1,84 @@
+"""
+Vectorized BlurHash encoder (https://blurha.sh).
+
+A BlurHash is a ~30 character string holding a handful of DCT components of
+an image; clients decode it into a blurry placeholder while the real image
+loads. The whole transform is done with NumPy matrix products instead of
+per-pixel Python loops.
+"""
+import numpy as np
+
+BASE83_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value: int, length: int) -> str:
+    chars = []
+    for i in range(1, length + 1):
+        digit = (value // (83 ** (length - i))) % 83
+        chars.append(BASE83_CHARS[digit])
+    return "".join(chars)
+
+
+def _srgb_to_linear(pixels: np.ndarray) -> np.ndarray:
+    values = pixels.astype(np.float64) / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = min(max(value, 0.0), 1.0)
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def encode(pixels: np.ndarray, x_components: int = 4, y_components: int = 3) -> str:
+    """
+    Encode an RGB image into a BlurHash string.
+
+    Args:
+        pixels: uint8 array of shape (height, width, 3); a small (~32px) image is plenty
+        x_components: Horizontal DCT components (1-9)
+        y_components: Vertical DCT components (1-9)
+    """
+    if not (1 <= x_components <= 9 and 1 <= y_components <= 9):
+        raise ValueError("BlurHash components must be between 1 and 9")
+
+    height, width = pixels.shape[:2]
+    linear = _srgb_to_linear(pixels[:, :, :3])
+
+    # Cosine bases: (y_components, height) and (x_components, width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    basis_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+
+    # factors[j, i, c] = sum over y, x of basis_y[j, y] * basis_x[i, x] * linear[y, x, c]
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear) / (width * height)
+    normalisation = np.full((y_components, x_components, 1), 2.0)
+    normalisation[0, 0, 0] = 1.0
+    factors *= normalisation
+
+    dc = factors[0, 0]
+    ac = factors.reshape(-1, 3)[1:]
+
+    size_flag = (x_components - 1) + (y_components - 1) * 9
+    result = [_base83(size_flag, 1)]
+
+    if len(ac):
+        actual_max = float(np.abs(ac).max())
+        quantised_max = int(max(0, min(82, np.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        result.append(_base83(quantised_max, 1))
+    else:
+        max_value = 1.0
+        result.append(_base83(0, 1))
+
+    dc_value = (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2])
+    result.append(_base83(dc_value, 4))
+
+    if len(ac):
+        scaled = ac / max_value
+        quantised = np.floor(np.sign(scaled) * np.abs(scaled) ** 0.5 * 9 + 9.5)
+        quantised = np.clip(quantised, 0, 18).astype(np.int64)
+        ac_values = quantised[:, 0] * 19 * 19 + quantised[:, 1] * 19 + quantised[:, 2]
+        result.extend(_base83(int(value), 2) for value in ac_values)
+
+    return "".join(result)
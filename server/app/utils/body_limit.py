@@ -0,0 +1,58 @@
+"""
+Request body size limits enforced while the body arrives.
+
+Multipart uploads are spooled to disk by Starlette before the endpoint runs,
+so a limit checked in the endpoint only applies after the whole body has
+been received. This middleware refuses a declared Content-Length over the
+limit up front and stops reading a body (chunked or lying about its length)
+as soon as it passes the limit.
+"""
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, status
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware limiting the body size of specific (method, path) routes."""
+
+    def __init__(self, app, limits: Dict[Tuple[str, str], int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the endpoint's body parsing, so it becomes a 413 response
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Request body exceeds {limit} bytes"
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send, limit: int) -> None:
+        body = f'{{"detail":"Request body exceeds {limit} bytes"}}'.encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ]
+        await send({"type": "http.response.start", "status": 413, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,305 @@
+"""
+Read-through cache with versioned keys and pluggable backends.
+
+Cached values are stored under keys that embed the current version of every
+entity they depend on (e.g. "album_images:12@album:12=1735…"). Writers never
+delete cache entries; they bump the entity's version, which makes every key
+built from the old version unreachable. Stale entries then age out of the
+LRU or expire by TTL.
+
+Two backends are provided:
+- MemoryCacheBackend: in-process LRU, the default. Versions are per process
+  too, so a write in one worker doesn't invalidate another worker's entries
+  before they expire; callers keep anything that must not go stale that
+  long (such as authorization) out of it, see VersionedCache.shared
+- RedisCacheBackend: shared between workers; works against any local Redis
+  (or Redis-compatible) server
+
+Concurrent misses on the same key within a process are coalesced: one
+caller runs the loader and the others wait for its result (single-flight).
+Because keys embed versions, a read that starts after a write never joins a
+load that started before it. Waiting blocks the thread, so callers on an
+event loop thread load for themselves instead; async routes should call
+cached services through run_in_threadpool to be coalesced.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Protocol, Tuple
+
+
+class CacheBackend(Protocol):
+    shared: bool  # Whether every worker sees the same entries and versions
+
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        ...
+
+    def get_version(self, key: str) -> int:
+        """Return the version stored at key, initializing it if missing."""
+        ...
+
+    def bump_version(self, key: str) -> int:
+        ...
+
+
+def _initial_version() -> int:
+    # Versions start at the current time rather than 0 so a version that was
+    # evicted and recreated can never match keys built from its old value
+    return time.time_ns()
+
+
+class MemoryCacheBackend:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    shared = False
+
+    def __init__(self, max_entries: int = 10000):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Versions are tiny and must not be evicted by value churn, so they live
+        # apart, in an LRU of their own. Evicting one only orphans the entries
+        # built from it: it is recreated from the clock, never at an old value.
+        self._max_versions = 2 * max_entries
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _store_version(self, key: str, version: int) -> int:
+        self._versions[key] = version
+        self._versions.move_to_end(key)
+        while len(self._versions) > self._max_versions:
+            self._versions.popitem(last=False)
+        return version
+
+    def get_version(self, key):
+        with self._lock:
+            version = self._versions.get(key)
+            return self._store_version(key, version if version is not None else _initial_version())
+
+    def bump_version(self, key):
+        with self._lock:
+            return self._store_version(key, self._versions.get(key, _initial_version()) + 1)
+
+
+class RedisCacheBackend:
+    """Shared backend using Redis. Values are stored as JSON."""
+
+    shared = True
+    VERSION_TTL_SECONDS = 7 * 24 * 3600
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)") from e
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(key, json.dumps(value), ex=ttl)
+
+    def get_version(self, key):
+        self._client.set(key, _initial_version(), nx=True, ex=self.VERSION_TTL_SECONDS)
+        return int(self._client.get(key))
+
+    def bump_version(self, key):
+        pipe = self._client.pipeline()
+        pipe.set(key, _initial_version(), nx=True, ex=self.VERSION_TTL_SECONDS)
+        pipe.incr(key)
+        pipe.expire(key, self.VERSION_TTL_SECONDS)
+        return int(pipe.execute()[1])
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers share its result.
+
+    A caller on an event loop thread never waits for another caller's call,
+    which would stall every request on the loop; it makes its own call.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another caller's call was joined."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if _on_event_loop():
+                return fn(), False
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            flight.value = fn()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, False
+
+
+class CacheStats:
+    """Hit/miss/coalesced counters per cache namespace."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, namespace: str, hit: bool, coalesced: bool = False) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(namespace, {"hits": 0, "misses": 0, "coalesced": 0})
+            counts["hits" if hit else "misses"] += 1
+            if coalesced:
+                counts["coalesced"] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            result = {}
+            for namespace, counts in self._counts.items():
+                total = counts["hits"] + counts["misses"]
+                result[namespace] = {
+                    **counts,
+                    "hit_ratio": round(counts["hits"] / total, 4) if total else 0.0,
+                    # Share of misses that waited on another request's load instead of querying
+                    "coalesced_ratio": round(counts["coalesced"] / counts["misses"], 4) if counts["misses"] else 0.0,
+                }
+            return result
+
+
+class VersionedCache:
+    """Read-through cache whose keys embed the versions of the entities they depend on."""
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: int = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._flights = SingleFlight()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def shared(self) -> bool:
+        """Whether a bump in one worker invalidates the entries of every worker."""
+        return self.backend is not None and self.backend.shared
+
+    def resolve(self, namespace: str, key: str, depends_on: Iterable[str]) -> Optional[str]:
+        """
+        Build the versioned key for the current versions of depends_on.
+
+        A value loaded after this call can be stored under the key with put:
+        a write that lands in between bumps a version, so the key is already
+        unreachable and the value can't be served stale. None when caching
+        is disabled.
+        """
+        if self.backend is None:
+            return None
+        versions = ",".join(f"{dep}={self.backend.get_version(f'ver:{dep}')}" for dep in depends_on)
+        return f"{namespace}:{key}@{versions}"
+
+    def put(self, full_key: Optional[str], value: Any, ttl: Optional[int] = None) -> None:
+        """Store a value under a key from resolve (a no-op when caching is disabled)."""
+        if self.backend is not None and full_key is not None and value is not None:
+            self.backend.set(full_key, value, ttl or self.ttl)
+
+    def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        depends_on: Iterable[str],
+        loader: Callable[[], Any],
+        ttl: Optional[int] = None,
+        should_cache: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Return the cached value for key, calling loader on a miss.
+
+        depends_on lists version keys (e.g. "album:12"); bumping any of them
+        invalidates this entry. ttl overrides the cache-wide entry lifetime.
+        A loaded value for which should_cache returns False is returned (also
+        to joined callers) but not stored, e.g. a degraded result.
+        """
+        if self.backend is None:
+            return loader()
+
+        full_key = self.resolve(namespace, key, depends_on)
+
+        value = self.backend.get(full_key)
+        if value is not None:
+            self.stats.record(namespace, hit=True)
+            return value
+
+        def load():
+            # A flight that finished since the lookup above may have filled the key
+            cached = self.backend.get(full_key)
+            if cached is not None:
+                return cached
+            loaded = loader()
+            if loaded is not None and (should_cache is None or should_cache(loaded)):
+                self.put(full_key, loaded, ttl)
+            return loaded
+
+        value, shared = self._flights.do(full_key, load)
+        self.stats.record(namespace, hit=False, coalesced=shared)
+        return value
+
+    def bump(self, *dependencies: str) -> None:
+        """Invalidate everything cached against the given version keys."""
+        if self.backend is None:
+            return
+        for dep in dependencies:
+            self.backend.bump_version(f"ver:{dep}")
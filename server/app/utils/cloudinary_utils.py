@@ -4,8 +4,10 @@ Allows direct uploads from mobile clients without backend processing
 """
 import cloudinary
 import cloudinary.api
+import cloudinary.uploader
 import cloudinary.utils
 import time
+from typing import Optional, Tuple
 from app.config.settings import get_settings
 
 settings = get_settings()
@@ -69,3 +71,60 @@ def delete_asset(public_id: str, resource_type: str = "image") -> bool:
     except Exception:
         return False
 
+
+
+def upload_asset(data: bytes, public_id: str, resource_type: str = "image") -> str:
+    """
+    Upload raw bytes to Cloudinary from the server.
+    
+    Args:
+        data: File contents
+        public_id: Full public_id including folder (e.g., "memento/user_1/images/variants/5_thumb")
+        resource_type: "image", "video", or "raw" (for audio)
+    
+    Returns:
+        The secure URL of the uploaded asset
+    """
+    result = cloudinary.uploader.upload(
+        data,
+        public_id=public_id,
+        resource_type=resource_type,
+        overwrite=True,
+        invalidate=True
+    )
+    return result["secure_url"]
+
+
+def public_id_from_url(url: str) -> Optional[Tuple[str, str]]:
+    """
+    Extract the resource type and public_id from a Cloudinary delivery URL.
+    
+    Transformations and the version segment are skipped. Image and video
+    public_ids don't include the file extension; raw ones (audio) do.
+    
+    Returns:
+        (resource_type, public_id), or None if the URL isn't a Cloudinary upload URL
+    """
+    marker = "res.cloudinary.com/"
+    start = url.find(marker)
+    if start == -1:
+        return None
+    
+    segments = url[start + len(marker):].split("?", 1)[0].split("/")
+    # <cloud_name>/<resource_type>/upload/[transformations/][v<version>/]<public_id>
+    if len(segments) < 4 or segments[2] != "upload":
+        return None
+    resource_type = segments[1]
+    path = segments[3:]
+    
+    for index, segment in enumerate(path):
+        if len(segment) > 1 and segment[0] == "v" and segment[1:].isdigit():
+            path = path[index + 1:]
+            break
+    if not path:
+        return None
+    
+    public_id = "/".join(path)
+    if resource_type != "raw":
+        public_id = public_id.rsplit(".", 1)[0]
+    return resource_type, public_id
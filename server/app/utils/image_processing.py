@@ -0,0 +1,180 @@
+"""
+Pillow helpers for generating image variants.
+
+These functions are pure (bytes in, bytes out) so they can run inside a
+process pool without touching the database or network.
+"""
+from io import BytesIO
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageOps, features
+from app.utils import blurhash
+
+THUMBNAIL_SIZE = 256  # Square crop used by the album grid
+MEDIUM_SIZE = 1280  # Longest edge for full-screen viewing on phones
+MOSAIC_SIZE = 384  # Square album cover collage
+MOSAIC_GAP = 2  # White gutter between collage tiles
+
+PLACEHOLDER_SAMPLE_SIZE = 32  # BlurHash only needs a tiny image
+PLACEHOLDER_COMPONENTS = (4, 3)  # (long edge, short edge) DCT components
+
+DHASH_SIZE = 8  # 8x8 gradient bits = 64-bit hash
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def _output_format() -> str:
+    """Prefer WebP, falling back to JPEG when Pillow was built without it."""
+    return "WEBP" if features.check("webp") else "JPEG"
+
+
+def _normalize(image: Image.Image) -> Image.Image:
+    """Apply EXIF orientation and convert to a mode the encoders accept."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        # Flatten transparency onto white so JPEG output doesn't turn it black
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    """Encode without copying EXIF, ICC or XMP metadata from the source."""
+    buffer = BytesIO()
+    if fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def compute_placeholder(image: Image.Image) -> str:
+    """Compute a BlurHash placeholder for an already-normalized RGB image."""
+    sample = image.resize((PLACEHOLDER_SAMPLE_SIZE, PLACEHOLDER_SAMPLE_SIZE), Image.Resampling.BILINEAR)
+    long_edge, short_edge = PLACEHOLDER_COMPONENTS
+    if image.width >= image.height:
+        x_components, y_components = long_edge, short_edge
+    else:
+        x_components, y_components = short_edge, long_edge
+    return blurhash.encode(np.asarray(sample), x_components, y_components)
+
+
+def compute_dhash(image: Image.Image) -> int:
+    """
+    Compute a 64-bit difference hash (dHash) as an unsigned integer.
+
+    The image is converted to grayscale and resized to 9x8; each bit records
+    whether a pixel is brighter than its right-hand neighbour, row by row with
+    the first pixel in the most significant bit. Clients computing the same
+    hash before uploading can check for duplicates without sending the file.
+    """
+    gray = image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, :-1] > pixels[:, 1:]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def _render_variants(image: Image.Image) -> dict:
+    fmt = _output_format()
+
+    medium = image.copy()
+    medium.thumbnail((MEDIUM_SIZE, MEDIUM_SIZE), Image.Resampling.LANCZOS)
+
+    thumbnail = ImageOps.fit(medium, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+
+    return {
+        "format": "webp" if fmt == "WEBP" else "jpg",
+        "thumbnail": _encode(thumbnail, fmt),
+        "medium": _encode(medium, fmt),
+    }
+
+
+def process_original(data: bytes, include_variants: bool = True) -> dict:
+    """
+    Decode an original once and derive everything the ingest pipeline stores.
+
+    Args:
+        data: Raw bytes of the original image
+        include_variants: Also render thumbnail and medium variants
+
+    Returns:
+        dict with "placeholder" (BlurHash string), "phash" (unsigned 64-bit dHash)
+        and, when include_variants is set, "format" ("webp" or "jpg"),
+        "thumbnail" and "medium" bytes
+    """
+    with Image.open(BytesIO(data)) as original:
+        # Let the decoder downscale JPEGs while decoding; much cheaper for large photos
+        original.draft("RGB", (MEDIUM_SIZE, MEDIUM_SIZE))
+        image = _normalize(original)
+
+    result = {"placeholder": compute_placeholder(image), "phash": compute_dhash(image)}
+    if include_variants:
+        result.update(_render_variants(image))
+    return result
+
+
+def _mosaic_layout(count: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Tile boxes (left, top, right, bottom) for a collage of 1 to 4 images.
+
+    One image fills the cover, two sit side by side, three put the newest on
+    the left half, and four form a 2x2 grid.
+    """
+    full, half = MOSAIC_SIZE, MOSAIC_SIZE // 2
+    gap = MOSAIC_GAP // 2
+    if count == 1:
+        return [(0, 0, full, full)]
+    if count == 2:
+        return [(0, 0, half - gap, full), (half + gap, 0, full, full)]
+    if count == 3:
+        return [(0, 0, half - gap, full), (half + gap, 0, full, half - gap), (half + gap, half + gap, full, full)]
+    return [
+        (0, 0, half - gap, half - gap), (half + gap, 0, full, half - gap),
+        (0, half + gap, half - gap, full), (half + gap, half + gap, full, full)
+    ]
+
+
+def _decode_tile(data: bytes) -> Optional[Image.Image]:
+    """Decode a collage tile at roughly cover size, or None if it isn't a readable image."""
+    try:
+        with Image.open(BytesIO(data)) as original:
+            original.draft("RGB", (MOSAIC_SIZE, MOSAIC_SIZE))
+            original.load()
+            return _normalize(original)
+    except Exception:
+        return None
+
+
+def render_mosaic(tiles: List[bytes]) -> Optional[dict]:
+    """
+    Compose up to four images into a square collage cover.
+
+    Args:
+        tiles: Raw bytes of the images, newest first; extra images are ignored
+
+    Returns:
+        dict with "format" ("webp" or "jpg"), "data" bytes and "tiles" (how
+        many images made it in; unreadable ones are skipped), or None if
+        none of them could be decoded
+    """
+    images = [image for image in map(_decode_tile, tiles[:4]) if image is not None]
+    if not images:
+        return None
+
+    mosaic = Image.new("RGB", (MOSAIC_SIZE, MOSAIC_SIZE), (255, 255, 255))
+    for image, (left, top, right, bottom) in zip(images, _mosaic_layout(len(images))):
+        mosaic.paste(ImageOps.fit(image, (right - left, bottom - top), Image.Resampling.LANCZOS), (left, top))
+
+    fmt = _output_format()
+    return {"format": "webp" if fmt == "WEBP" else "jpg", "data": _encode(mosaic, fmt), "tiles": len(images)}
+
+
+def render_cover_placeholder() -> dict:
+    """A plain cover for albums whose collage can't be rendered; same shape as render_mosaic's result."""
+    fmt = _output_format()
+    cover = Image.new("RGB", (MOSAIC_SIZE, MOSAIC_SIZE), (224, 224, 224))
+    return {"format": "webp" if fmt == "WEBP" else "jpg", "data": _encode(cover, fmt), "tiles": 0}
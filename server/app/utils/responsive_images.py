@@ -0,0 +1,146 @@
+"""
+Responsive image URL helpers.
+
+Builds Cloudinary delivery URLs with on-the-fly transformations (resize,
+f_auto, q_auto) using plain string operations, so listing an album doesn't
+call into the Cloudinary SDK once per row. Sizes are picked from client
+hints and snapped to a small set of buckets to keep CDN hit rates high.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+CLOUDINARY_HOST_PREFIXES = ("https://res.cloudinary.com/", "http://res.cloudinary.com/")
+
+# Physical pixel widths we are willing to generate
+THUMBNAIL_WIDTHS = (128, 192, 256, 384, 512)
+DISPLAY_WIDTHS = (640, 828, 1080, 1280, 1600, 2048)
+
+# Transformation parameter keys, used to tell a transformation path segment
+# (c_fill,w_384) from a folder in the public id of an unversioned URL
+TRANSFORMATION_KEYS = frozenset((
+    "a", "ac", "af", "ar", "b", "bo", "br", "c", "co", "cs", "d", "dl", "dn", "dpr", "du", "e", "eo",
+    "f", "fl", "fn", "fps", "g", "h", "if", "ki", "l", "o", "p", "pg", "q", "r", "so", "sp", "t", "u",
+    "vc", "vs", "w", "x", "y", "z",
+))
+
+GRID_COLUMNS = 3  # Matches PhotoGrid on Android
+DEFAULT_VIEWPORT_WIDTH = 412  # CSS/dp width of a typical Android phone
+DEFAULT_DPR = 2.0
+MAX_DPR = 3.0
+
+
+@dataclass(frozen=True)
+class ClientHints:
+    """Rendering hints sent by the client (Save-Data, viewport width, DPR)."""
+    save_data: bool = False
+    viewport_width: Optional[int] = None
+    dpr: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class CloudinaryAsset:
+    """The parts of a Cloudinary delivery URL needed to rebuild it."""
+    cloud_name: str
+    version: Optional[str]
+    public_id: str  # Includes the file extension
+
+
+def parse_cloudinary_url(url: str) -> Optional[CloudinaryAsset]:
+    """
+    Extract cloud name, version and public id from a Cloudinary image URL.
+
+    Any transformations already in the URL are dropped. Returns None for
+    URLs that aren't Cloudinary image delivery URLs.
+    """
+    for prefix in CLOUDINARY_HOST_PREFIXES:
+        if url.startswith(prefix):
+            path = url[len(prefix):]
+            break
+    else:
+        return None
+
+    cloud_name, sep, rest = path.partition("/image/upload/")
+    if not sep or not cloud_name or "/" in cloud_name or not rest:
+        return None
+
+    rest = rest.split("?", 1)[0]
+    segments = rest.split("/")
+    for index, segment in enumerate(segments):
+        if len(segment) > 1 and segment[0] == "v" and segment[1:].isdigit():
+            public_id = "/".join(segments[index + 1:])
+            if not public_id:
+                return None
+            return CloudinaryAsset(cloud_name=cloud_name, version=segment, public_id=public_id)
+
+    # No version segment: the public id follows any transformation segments
+    while len(segments) > 1 and _is_transformation(segments[0]):
+        segments.pop(0)
+    return CloudinaryAsset(cloud_name=cloud_name, version=None, public_id="/".join(segments))
+
+
+def _is_transformation(segment: str) -> bool:
+    """Whether a path segment is a transformation, e.g. c_fill,w_384 or f_auto."""
+    for component in segment.split(","):
+        key, sep, value = component.partition("_")
+        if not sep or not value or key not in TRANSFORMATION_KEYS:
+            return False
+    return True
+
+
+def _snap(width: float, buckets: Tuple[int, ...]) -> int:
+    """Round up to the nearest bucket, capped at the largest one."""
+    for bucket in buckets:
+        if bucket >= width:
+            return bucket
+    return buckets[-1]
+
+
+@lru_cache(maxsize=256)
+def select_transformations(hints: ClientHints) -> Tuple[str, str, str]:
+    """
+    Pick transformation strings for the thumbnail, display and full variants.
+
+    Cached per distinct set of hints since a listing applies the same hints
+    to every row.
+    """
+    viewport = hints.viewport_width or DEFAULT_VIEWPORT_WIDTH
+    dpr = min(max(hints.dpr or DEFAULT_DPR, 1.0), MAX_DPR)
+    quality = "q_auto:good"
+    if hints.save_data:
+        # Users asked for fewer bytes: render at 1x and let Cloudinary compress harder
+        dpr = 1.0
+        quality = "q_auto:eco"
+
+    thumbnail_width = _snap(viewport / GRID_COLUMNS * dpr, THUMBNAIL_WIDTHS)
+    display_width = _snap(viewport * dpr, DISPLAY_WIDTHS)
+
+    thumbnail = f"c_fill,g_auto,w_{thumbnail_width},h_{thumbnail_width},f_auto,{quality}"
+    display = f"c_limit,w_{display_width},f_auto,{quality}"
+    full = f"f_auto,{quality}"
+    return thumbnail, display, full
+
+
+def build_transformation_url(asset: CloudinaryAsset, transformation: str) -> str:
+    """Build a delivery URL for an asset with the given transformation string."""
+    if asset.version:
+        return f"https://res.cloudinary.com/{asset.cloud_name}/image/upload/{transformation}/{asset.version}/{asset.public_id}"
+    return f"https://res.cloudinary.com/{asset.cloud_name}/image/upload/{transformation}/{asset.public_id}"
+
+
+def responsive_urls(image_url: str, hints: ClientHints) -> Optional[dict]:
+    """
+    Derive thumbnail, display-sized and full-size optimized URLs for an image.
+
+    Returns None when image_url isn't hosted on Cloudinary.
+    """
+    asset = parse_cloudinary_url(image_url)
+    if asset is None:
+        return None
+
+    thumbnail, display, full = select_transformations(hints)
+    return {
+        "thumbnail_url": build_transformation_url(asset, thumbnail),
+        "medium_url": build_transformation_url(asset, display),
+        "full_url": build_transformation_url(asset, full),
+    }
@@ -0,0 +1,3 @@
+-- Resized variants generated by the server-side ingest pipeline
+ALTER TABLE images ADD COLUMN IF NOT EXISTS thumbnail_url VARCHAR(500);
+ALTER TABLE images ADD COLUMN IF NOT EXISTS medium_url VARCHAR(500);
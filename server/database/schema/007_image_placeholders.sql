@@ -0,0 +1,5 @@
+-- BlurHash placeholder computed at ingest, rendered while the real image loads
+ALTER TABLE images ADD COLUMN IF NOT EXISTS placeholder VARCHAR(64);
+
+-- Lets the backfill job find remaining rows without scanning the whole table
+CREATE INDEX IF NOT EXISTS idx_images_missing_placeholder ON images(id) WHERE placeholder IS NULL;
@@ -0,0 +1,9 @@
+-- 64-bit perceptual hash (dHash) used to detect near-duplicate uploads
+ALTER TABLE images ADD COLUMN IF NOT EXISTS phash BIGINT;
+
+-- Covers loading an album's hashes into the BK-tree with an index-only scan
+CREATE INDEX IF NOT EXISTS idx_images_album_phash ON images(album_id, phash) WHERE phash IS NOT NULL;
+
+-- The backfill job now fills hashes as well as placeholders
+DROP INDEX IF EXISTS idx_images_missing_placeholder;
+CREATE INDEX IF NOT EXISTS idx_images_missing_analysis ON images(id) WHERE placeholder IS NULL OR phash IS NULL;
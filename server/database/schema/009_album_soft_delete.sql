@@ -0,0 +1,5 @@
+-- Soft deletion: albums are hidden immediately and purged in the background
+ALTER TABLE albums ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE;
+
+-- Lets the purger find pending albums without scanning live ones
+CREATE INDEX IF NOT EXISTS idx_albums_pending_purge ON albums(deleted_at) WHERE deleted_at IS NOT NULL;
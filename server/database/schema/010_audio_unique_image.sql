@@ -0,0 +1,12 @@
+-- One audio clip per image, enforced by the database so create_audio can use
+-- INSERT ... ON CONFLICT instead of check-then-insert
+
+-- Keep the earliest clip where concurrent requests slipped in duplicates
+DELETE FROM audio a
+USING audio earlier
+WHERE a.image_id = earlier.image_id AND a.id > earlier.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_audio_image_id_unique ON audio(image_id);
+
+-- The unique index serves image_id lookups; the old plain index is redundant
+DROP INDEX IF EXISTS idx_audio_image_id;
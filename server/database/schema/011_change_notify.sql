@@ -0,0 +1,99 @@
+-- Change feed: every committed write to albums, images, audio and album_members
+-- sends a small JSON payload on the memento_changes channel. NOTIFY is
+-- transactional, so listeners only ever see committed changes.
+--
+-- Rows removed by the background purge of a soft-deleted album are not
+-- announced; the album's deletion was already sent when deleted_at was set.
+
+CREATE OR REPLACE FUNCTION notify_change(entity TEXT, op TEXT, entity_id INTEGER, album_id INTEGER, user_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    PERFORM pg_notify('memento_changes', json_build_object(
+        'entity', entity,
+        'op', op,
+        'id', entity_id,
+        'album_id', album_id,
+        'user_id', user_id
+    )::text);
+END;
+$$ LANGUAGE plpgsql;
+
+-- True when the album no longer exists or is waiting to be purged
+CREATE OR REPLACE FUNCTION album_is_gone(target_album_id INTEGER)
+RETURNS BOOLEAN AS $$
+    SELECT NOT EXISTS (SELECT 1 FROM albums WHERE id = target_album_id AND deleted_at IS NULL);
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION notify_albums_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM notify_change('album', 'INSERT', NEW.id, NEW.id, NEW.owner_id);
+    ELSIF NEW.deleted_at IS NOT NULL AND OLD.deleted_at IS NULL THEN
+        PERFORM notify_change('album', 'DELETE', NEW.id, NEW.id, NEW.owner_id);
+    ELSIF NEW.deleted_at IS NULL THEN
+        PERFORM notify_change('album', 'UPDATE', NEW.id, NEW.id, NEW.owner_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_images_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF NOT album_is_gone(OLD.album_id) THEN
+            PERFORM notify_change('image', 'DELETE', OLD.id, OLD.album_id, OLD.user_id);
+        END IF;
+    ELSE
+        PERFORM notify_change('image', TG_OP, NEW.id, NEW.album_id, NEW.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_audio_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_image_id INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.image_id ELSE NEW.image_id END;
+    row_id INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END;
+    image_album_id INTEGER;
+BEGIN
+    -- NULL when the image itself is being deleted, which is announced on its own
+    SELECT album_id INTO image_album_id FROM images WHERE id = row_image_id;
+    IF image_album_id IS NOT NULL AND NOT album_is_gone(image_album_id) THEN
+        PERFORM notify_change('audio', TG_OP, row_id, image_album_id, NULL);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_album_members_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF NOT album_is_gone(OLD.album_id) THEN
+            PERFORM notify_change('album_member', 'DELETE', OLD.id, OLD.album_id, OLD.user_id);
+        END IF;
+    ELSE
+        PERFORM notify_change('album_member', TG_OP, NEW.id, NEW.album_id, NEW.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_albums_change ON albums;
+CREATE TRIGGER notify_albums_change AFTER INSERT OR UPDATE ON albums
+FOR EACH ROW EXECUTE FUNCTION notify_albums_change();
+
+DROP TRIGGER IF EXISTS notify_images_change ON images;
+CREATE TRIGGER notify_images_change AFTER INSERT OR UPDATE OR DELETE ON images
+FOR EACH ROW EXECUTE FUNCTION notify_images_change();
+
+DROP TRIGGER IF EXISTS notify_audio_change ON audio;
+CREATE TRIGGER notify_audio_change AFTER INSERT OR UPDATE OR DELETE ON audio
+FOR EACH ROW EXECUTE FUNCTION notify_audio_change();
+
+DROP TRIGGER IF EXISTS notify_album_members_change ON album_members;
+CREATE TRIGGER notify_album_members_change AFTER INSERT OR UPDATE OR DELETE ON album_members
+FOR EACH ROW EXECUTE FUNCTION notify_album_members_change();
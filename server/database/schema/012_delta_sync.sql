@@ -0,0 +1,123 @@
+-- Delta sync: every row records the transaction that last wrote it, and
+-- deletions leave tombstones, so GET /sync can return only what changed.
+--
+-- Transaction IDs are used instead of a sequence or updated_at because they
+-- let the cursor be a snapshot's xmin: every transaction below it had finished
+-- when the previous sync ran, so rows committed out of order are never skipped.
+
+-- Existing rows get 0 and are picked up by a client's first (full) sync
+ALTER TABLE albums ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT '0';
+ALTER TABLE images ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT '0';
+ALTER TABLE audio ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT '0';
+ALTER TABLE album_members ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT '0';
+
+CREATE OR REPLACE FUNCTION set_change_xid()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_xid = pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS set_albums_change_xid ON albums;
+CREATE TRIGGER set_albums_change_xid BEFORE INSERT OR UPDATE ON albums
+FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
+DROP TRIGGER IF EXISTS set_images_change_xid ON images;
+CREATE TRIGGER set_images_change_xid BEFORE INSERT OR UPDATE ON images
+FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
+DROP TRIGGER IF EXISTS set_audio_change_xid ON audio;
+CREATE TRIGGER set_audio_change_xid BEFORE INSERT OR UPDATE ON audio
+FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
+DROP TRIGGER IF EXISTS set_album_members_change_xid ON album_members;
+CREATE TRIGGER set_album_members_change_xid BEFORE INSERT OR UPDATE ON album_members
+FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
+CREATE INDEX IF NOT EXISTS idx_images_album_change ON images(album_id, change_xid);
+CREATE INDEX IF NOT EXISTS idx_audio_change ON audio(change_xid);
+CREATE INDEX IF NOT EXISTS idx_album_members_album_change ON album_members(album_id, change_xid);
+
+-- Deleted rows. user_id is set when the deletion only concerns one user
+-- (they left the album, or the album was deleted); album_id otherwise.
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(20) NOT NULL,  -- album, image, audio or album_member
+    entity_id INTEGER NOT NULL,
+    album_id INTEGER NOT NULL,
+    user_id INTEGER,
+    change_xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_album_change ON sync_tombstones(album_id, change_xid);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_user_change ON sync_tombstones(user_id, change_xid) WHERE user_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_created_at ON sync_tombstones(created_at);
+
+-- Highest change_xid of any pruned tombstone; older cursors must do a full resync
+CREATE TABLE IF NOT EXISTS sync_horizon (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    pruned_xid xid8 NOT NULL DEFAULT '0'
+);
+INSERT INTO sync_horizon (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+-- Purged rows of soft-deleted albums need no tombstones (album_is_gone is
+-- defined in 011); the album tombstones written at deletion cover them
+CREATE OR REPLACE FUNCTION record_tombstone()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_album_id INTEGER;
+BEGIN
+    IF TG_TABLE_NAME = 'audio' THEN
+        -- NULL when the image is being deleted too; its tombstone covers the audio
+        SELECT album_id INTO row_album_id FROM images WHERE id = OLD.image_id;
+    ELSE
+        row_album_id := OLD.album_id;
+    END IF;
+
+    IF row_album_id IS NULL OR album_is_gone(row_album_id) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_TABLE_NAME = 'album_members' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, album_id, user_id)
+        VALUES ('album_member', OLD.id, row_album_id, OLD.user_id);
+    ELSIF TG_TABLE_NAME = 'images' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, album_id)
+        VALUES ('image', OLD.id, row_album_id);
+    ELSE
+        INSERT INTO sync_tombstones (entity, entity_id, album_id)
+        VALUES ('audio', OLD.id, row_album_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_album_tombstones()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sync_tombstones (entity, entity_id, album_id, user_id)
+    SELECT 'album', NEW.id, NEW.id, user_id
+    FROM album_members
+    WHERE album_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS record_images_tombstone ON images;
+CREATE TRIGGER record_images_tombstone AFTER DELETE ON images
+FOR EACH ROW EXECUTE FUNCTION record_tombstone();
+
+DROP TRIGGER IF EXISTS record_audio_tombstone ON audio;
+CREATE TRIGGER record_audio_tombstone AFTER DELETE ON audio
+FOR EACH ROW EXECUTE FUNCTION record_tombstone();
+
+DROP TRIGGER IF EXISTS record_album_members_tombstone ON album_members;
+CREATE TRIGGER record_album_members_tombstone AFTER DELETE ON album_members
+FOR EACH ROW EXECUTE FUNCTION record_tombstone();
+
+DROP TRIGGER IF EXISTS record_albums_tombstones ON albums;
+CREATE TRIGGER record_albums_tombstones AFTER UPDATE OF deleted_at ON albums
+FOR EACH ROW WHEN (OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL)
+EXECUTE FUNCTION record_album_tombstones();
@@ -0,0 +1,159 @@
+-- Per-album aggregates for the album list (counts, cover image, last activity),
+-- maintained by triggers so GET /albums needs no per-album queries.
+--
+-- Kept out of the albums table so counter updates don't touch albums.updated_at
+-- or fire the album change feed and sync triggers on every upload.
+CREATE TABLE IF NOT EXISTS album_stats (
+    album_id INTEGER PRIMARY KEY REFERENCES albums(id) ON DELETE CASCADE,
+    image_count INTEGER NOT NULL DEFAULT 0,
+    audio_count INTEGER NOT NULL DEFAULT 0,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    cover_image_id INTEGER,  -- Most recently added image
+    cover_image_url VARCHAR(500),
+    cover_thumbnail_url VARCHAR(500),
+    cover_placeholder VARCHAR(64),
+    last_activity_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Serves the cover lookup below as well as the album image listing order
+CREATE INDEX IF NOT EXISTS idx_images_album_date_added ON images(album_id, date_added DESC, id DESC);
+
+-- Point the album's cover at its newest image, skipping one being deleted
+CREATE OR REPLACE FUNCTION refresh_album_cover(target_album_id INTEGER, excluded_image_id INTEGER DEFAULT NULL)
+RETURNS VOID AS $$
+    UPDATE album_stats s
+    SET cover_image_id = cover.id,
+        cover_image_url = cover.image_url,
+        cover_thumbnail_url = cover.thumbnail_url,
+        cover_placeholder = cover.placeholder
+    FROM (SELECT target_album_id AS album_id) target
+    LEFT JOIN LATERAL (
+        SELECT id, image_url, thumbnail_url, placeholder
+        FROM images
+        WHERE album_id = target_album_id AND id IS DISTINCT FROM excluded_image_id
+        ORDER BY date_added DESC, id DESC
+        LIMIT 1
+    ) cover ON TRUE
+    WHERE s.album_id = target.album_id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bump_album_stats(
+    target_album_id INTEGER,
+    image_delta INTEGER,
+    audio_delta INTEGER,
+    member_delta INTEGER
+)
+RETURNS VOID AS $$
+    INSERT INTO album_stats (album_id, image_count, audio_count, member_count, last_activity_at)
+    VALUES (target_album_id, GREATEST(image_delta, 0), GREATEST(audio_delta, 0), GREATEST(member_delta, 0), CURRENT_TIMESTAMP)
+    ON CONFLICT (album_id) DO UPDATE
+    SET image_count = album_stats.image_count + image_delta,
+        audio_count = album_stats.audio_count + audio_delta,
+        member_count = album_stats.member_count + member_delta,
+        last_activity_at = CURRENT_TIMESTAMP;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION album_stats_on_album_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO album_stats (album_id) VALUES (NEW.id) ON CONFLICT (album_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION album_stats_on_image_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_album_stats(NEW.album_id, 1, 0, 0);
+        PERFORM refresh_album_cover(NEW.album_id);
+        RETURN NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_album_cover(NEW.album_id);
+        RETURN NULL;
+    END IF;
+
+    -- DELETE runs BEFORE the row and its audio are removed, while the audio
+    -- can still be counted; purges of soft-deleted albums are skipped
+    IF NOT album_is_gone(OLD.album_id) THEN
+        PERFORM bump_album_stats(
+            OLD.album_id, -1, -(SELECT COUNT(*) FROM audio WHERE image_id = OLD.id)::INTEGER, 0
+        );
+        PERFORM refresh_album_cover(OLD.album_id, OLD.id);
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION album_stats_on_audio_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    image_album_id INTEGER;
+BEGIN
+    -- NULL when the image is being deleted; its trigger already counted the audio
+    SELECT album_id INTO image_album_id
+    FROM images
+    WHERE id = CASE WHEN TG_OP = 'DELETE' THEN OLD.image_id ELSE NEW.image_id END;
+
+    IF image_album_id IS NOT NULL AND NOT album_is_gone(image_album_id) THEN
+        PERFORM bump_album_stats(
+            image_album_id, 0, CASE TG_OP WHEN 'INSERT' THEN 1 WHEN 'DELETE' THEN -1 ELSE 0 END, 0
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION album_stats_on_member_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_album_stats(NEW.album_id, 0, 0, 1);
+    ELSIF NOT album_is_gone(OLD.album_id) THEN
+        PERFORM bump_album_stats(OLD.album_id, 0, 0, -1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS album_stats_on_album_insert ON albums;
+CREATE TRIGGER album_stats_on_album_insert AFTER INSERT ON albums
+FOR EACH ROW EXECUTE FUNCTION album_stats_on_album_insert();
+
+DROP TRIGGER IF EXISTS album_stats_on_image_write ON images;
+CREATE TRIGGER album_stats_on_image_write AFTER INSERT ON images
+FOR EACH ROW EXECUTE FUNCTION album_stats_on_image_change();
+
+-- Only the columns the cover shows; caption edits don't move the cover
+DROP TRIGGER IF EXISTS album_stats_on_image_update ON images;
+CREATE TRIGGER album_stats_on_image_update AFTER UPDATE OF image_url, thumbnail_url, placeholder, date_added ON images
+FOR EACH ROW EXECUTE FUNCTION album_stats_on_image_change();
+
+DROP TRIGGER IF EXISTS album_stats_on_image_delete ON images;
+CREATE TRIGGER album_stats_on_image_delete BEFORE DELETE ON images
+FOR EACH ROW EXECUTE FUNCTION album_stats_on_image_change();
+
+DROP TRIGGER IF EXISTS album_stats_on_audio_change ON audio;
+CREATE TRIGGER album_stats_on_audio_change AFTER INSERT OR UPDATE OR DELETE ON audio
+FOR EACH ROW EXECUTE FUNCTION album_stats_on_audio_change();
+
+DROP TRIGGER IF EXISTS album_stats_on_member_change ON album_members;
+CREATE TRIGGER album_stats_on_member_change AFTER INSERT OR DELETE ON album_members
+FOR EACH ROW EXECUTE FUNCTION album_stats_on_member_change();
+
+-- Backfill existing albums
+INSERT INTO album_stats (album_id, image_count, audio_count, member_count, last_activity_at)
+SELECT
+    a.id,
+    (SELECT COUNT(*) FROM images i WHERE i.album_id = a.id),
+    (SELECT COUNT(*) FROM audio au JOIN images i ON i.id = au.image_id WHERE i.album_id = a.id),
+    (SELECT COUNT(*) FROM album_members am WHERE am.album_id = a.id),
+    GREATEST(a.updated_at, (SELECT MAX(i.date_added) FROM images i WHERE i.album_id = a.id))
+FROM albums a
+ON CONFLICT (album_id) DO UPDATE
+SET image_count = EXCLUDED.image_count,
+    audio_count = EXCLUDED.audio_count,
+    member_count = EXCLUDED.member_count,
+    last_activity_at = EXCLUDED.last_activity_at;
+
+SELECT refresh_album_cover(id) FROM albums;
@@ -0,0 +1,12 @@
+-- migrate:no-transaction
+-- Indexes whose columns lead another index on the same table. Every insert
+-- paid to maintain them while the other index served the same lookups:
+--   idx_users_email            -> users_email_key (UNIQUE email)
+--   idx_album_members_album_id -> album_members_album_id_user_id_key (UNIQUE album_id, user_id)
+--   idx_images_album_id        -> idx_images_album_date_added (album_id, date_added DESC, id DESC)
+--
+-- Dropped CONCURRENTLY so writes to these tables aren't blocked, which is
+-- why this file runs outside a transaction (see app.jobs.migrate).
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_email;
+DROP INDEX CONCURRENTLY IF EXISTS idx_album_members_album_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_images_album_id;
@@ -0,0 +1,9 @@
+-- migrate:no-transaction
+-- Incremental sync for a member of many albums reads the recent changes
+-- first and filters by album; (album_id, change_xid) alone means one probe
+-- per known album, which the planner rightly abandons for a full scan once
+-- a user belongs to a large share of the albums. audio already has this
+-- index (012); albums, memberships and tombstones get the same.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_albums_change ON albums(change_xid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_album_members_change ON album_members(change_xid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sync_tombstones_change ON sync_tombstones(change_xid);
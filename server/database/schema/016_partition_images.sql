@@ -0,0 +1,296 @@
+-- migrate:no-transaction
+-- Hash-partition images by album_id. Listing, cover, duplicate and sync
+-- queries all filter by album, so each one reads a single partition, and
+-- vacuum and index maintenance run per partition instead of on one heap.
+--
+-- Unique keys on a partitioned table must include the partition key, so the
+-- primary key becomes (id, album_id). IDs still come from images_id_seq and
+-- stay unique. audio gains an album_id column so its foreign key can point
+-- at (id, album_id) and it can be joined to images on the partition key.
+-- An image never moves between albums, so the copy in audio never goes stale.
+--
+-- The partition count is fixed at 16; changing it means rewriting the table.
+--
+-- The table is rebuilt alongside the live one, so writes continue until the
+-- final swap:
+-- 1. images_partitioned is created with its partitions, keys and indexes,
+--    but no triggers, so copied rows keep their change_xid, timestamps and
+--    counts.
+-- 2. A trigger on images mirrors every write into images_partitioned.
+-- 3. Rows are copied in ID batches of 10,000, each committed on its own. FOR
+--    SHARE waits for concurrent writers, so a batch never copies a version
+--    that a mirrored write has already replaced or deleted.
+-- 4. audio.album_id is filled in batches the same way. A temporary partial
+--    index finds the audio still missing it, so the swap doesn't scan audio.
+-- 5. One short transaction locks images, audio and the tables their triggers
+--    and keys touch, fills album_id for audio written in the meantime, drops
+--    the old table, renames the new one into place and creates its triggers. It gives up after lock_timeout rather
+--    than queue writes behind a long query; rerun the migration then.
+-- 6. audio's new keys are validated without blocking writes.
+-- Every step checks what is already done, so a failed run can be resumed.
+--
+-- Autovacuum analyzes each partition but never the parent table. Queries
+-- that span partitions, like the hot-album ranking, use the parent's
+-- statistics, so run ANALYZE images after bulk loads.
+
+DO $$
+BEGIN
+    IF to_regclass('images_partitioned') IS NOT NULL
+        OR (SELECT relkind FROM pg_class WHERE oid = 'images'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    CREATE TABLE images_partitioned (LIKE images INCLUDING DEFAULTS)
+    PARTITION BY HASH (album_id);
+
+    FOR remainder IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE images_p%s PARTITION OF images_partitioned FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+            lpad(remainder::text, 2, '0'), remainder
+        );
+    END LOOP;
+
+    -- Index names are global, so they take their final names at the swap
+    ALTER TABLE images_partitioned ADD CONSTRAINT images_partitioned_pkey PRIMARY KEY (id, album_id);
+    ALTER TABLE images_partitioned ADD CONSTRAINT images_album_id_fkey
+        FOREIGN KEY (album_id) REFERENCES albums(id) ON DELETE CASCADE;
+    ALTER TABLE images_partitioned ADD CONSTRAINT images_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+
+    CREATE INDEX idx_images_partitioned_album_date_added ON images_partitioned(album_id, date_added DESC, id DESC);
+    CREATE INDEX idx_images_partitioned_album_change ON images_partitioned(album_id, change_xid);
+    -- Incremental sync for a member of many albums would otherwise probe
+    -- (album_id, change_xid) once per album in every partition (see 015)
+    CREATE INDEX idx_images_partitioned_change ON images_partitioned(change_xid);
+    CREATE INDEX idx_images_partitioned_album_phash ON images_partitioned(album_id, phash) WHERE phash IS NOT NULL;
+    CREATE INDEX idx_images_partitioned_user_id ON images_partitioned(user_id);
+    CREATE INDEX idx_images_partitioned_date_added ON images_partitioned(date_added);
+    CREATE INDEX idx_images_partitioned_missing_analysis ON images_partitioned(id) WHERE placeholder IS NULL OR phash IS NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION mirror_images_to_partitioned()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM images_partitioned WHERE id = OLD.id AND album_id = OLD.album_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO images_partitioned SELECT NEW.*;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF to_regclass('images_partitioned') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'mirror_images_to_partitioned' AND tgrelid = 'images'::regclass
+    ) THEN
+        CREATE TRIGGER mirror_images_to_partitioned AFTER INSERT OR UPDATE OR DELETE ON images
+        FOR EACH ROW EXECUTE FUNCTION mirror_images_to_partitioned();
+    END IF;
+END $$;
+
+DO $$
+DECLARE
+    batch_start BIGINT;
+    last_id BIGINT;
+BEGIN
+    IF to_regclass('images_partitioned') IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Rows inserted after last_id is read are mirrored
+    SELECT MIN(id), MAX(id) INTO batch_start, last_id FROM images;
+    WHILE batch_start <= last_id LOOP
+        INSERT INTO images_partitioned
+        SELECT * FROM images WHERE id >= batch_start AND id < batch_start + 10000
+        FOR SHARE
+        ON CONFLICT DO NOTHING;
+        COMMIT;
+        batch_start := batch_start + 10000;
+    END LOOP;
+
+    -- Plans right after the swap need statistics
+    ANALYZE images_partitioned;
+END $$;
+
+ALTER TABLE audio ADD COLUMN IF NOT EXISTS album_id INTEGER;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audio_missing_album ON audio(id) WHERE album_id IS NULL;
+
+DO $$
+DECLARE
+    batch_start BIGINT;
+    last_id BIGINT;
+BEGIN
+    IF to_regclass('images_partitioned') IS NULL THEN
+        RETURN;
+    END IF;
+
+    SELECT MIN(id), MAX(id) INTO batch_start, last_id FROM audio;
+    WHILE batch_start <= last_id LOOP
+        -- Skip the audio triggers; the rows have not changed for clients
+        ALTER TABLE audio DISABLE TRIGGER USER;
+        UPDATE audio au
+        SET album_id = i.album_id
+        FROM images i
+        WHERE i.id = au.image_id AND au.id >= batch_start AND au.id < batch_start + 10000 AND au.album_id IS NULL;
+        ALTER TABLE audio ENABLE TRIGGER USER;
+        COMMIT;
+        batch_start := batch_start + 10000;
+    END LOOP;
+END $$;
+
+DO $swap$
+BEGIN
+    IF to_regclass('images_partitioned') IS NULL THEN
+        RETURN;
+    END IF;
+
+    PERFORM set_config('lock_timeout', '10s', true);
+    -- Everything the swap locks, up front and in the order writers take them
+    -- (images, the mirror copy, then albums and users from the triggers and
+    -- the dropped foreign keys), so a writer mid-transaction can't deadlock it
+    LOCK TABLE images, images_partitioned, audio, albums, users IN ACCESS EXCLUSIVE MODE;
+
+    -- Audio written since the backfill
+    ALTER TABLE audio DISABLE TRIGGER USER;
+    UPDATE audio au
+    SET album_id = i.album_id
+    FROM images i
+    WHERE i.id = au.image_id AND au.album_id IS NULL;
+    ALTER TABLE audio ENABLE TRIGGER USER;
+    -- Becomes NOT NULL once validated below, without a scan under this lock
+    ALTER TABLE audio ADD CONSTRAINT audio_album_id_not_null CHECK (album_id IS NOT NULL) NOT VALID;
+    ALTER TABLE audio DROP CONSTRAINT audio_image_id_fkey;
+
+    ALTER SEQUENCE images_id_seq OWNED BY images_partitioned.id;
+    DROP TABLE images;
+    ALTER TABLE images_partitioned RENAME TO images;
+    ALTER TABLE images RENAME CONSTRAINT images_partitioned_pkey TO images_pkey;
+    ALTER INDEX idx_images_partitioned_album_date_added RENAME TO idx_images_album_date_added;
+    ALTER INDEX idx_images_partitioned_album_change RENAME TO idx_images_album_change;
+    ALTER INDEX idx_images_partitioned_change RENAME TO idx_images_change;
+    ALTER INDEX idx_images_partitioned_album_phash RENAME TO idx_images_album_phash;
+    ALTER INDEX idx_images_partitioned_user_id RENAME TO idx_images_user_id;
+    ALTER INDEX idx_images_partitioned_date_added RENAME TO idx_images_date_added;
+    ALTER INDEX idx_images_partitioned_missing_analysis RENAME TO idx_images_missing_analysis;
+
+    ALTER TABLE audio ADD CONSTRAINT audio_image_id_fkey
+        FOREIGN KEY (image_id, album_id) REFERENCES images(id, album_id) ON DELETE CASCADE NOT VALID;
+
+    CREATE TRIGGER update_images_updated_at BEFORE UPDATE ON images
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+    CREATE TRIGGER notify_images_change AFTER INSERT OR UPDATE OR DELETE ON images
+    FOR EACH ROW EXECUTE FUNCTION notify_images_change();
+
+    CREATE TRIGGER set_images_change_xid BEFORE INSERT OR UPDATE ON images
+    FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
+    CREATE TRIGGER record_images_tombstone AFTER DELETE ON images
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone();
+
+    CREATE TRIGGER album_stats_on_image_write AFTER INSERT ON images
+    FOR EACH ROW EXECUTE FUNCTION album_stats_on_image_change();
+
+    CREATE TRIGGER album_stats_on_image_update AFTER UPDATE OF image_url, thumbnail_url, placeholder, date_added ON images
+    FOR EACH ROW EXECUTE FUNCTION album_stats_on_image_change();
+
+    CREATE TRIGGER album_stats_on_image_delete BEFORE DELETE ON images
+    FOR EACH ROW EXECUTE FUNCTION album_stats_on_image_change();
+
+-- The audio triggers look the image up to tell whether it is being deleted
+-- too; include the partition key so the lookup reads a single partition.
+-- record_tombstone can no longer match images by TG_TABLE_NAME, which names
+-- the partition the row is in.
+CREATE OR REPLACE FUNCTION notify_audio_change()
+RETURNS TRIGGER AS $fn$
+DECLARE
+    row_image_id INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.image_id ELSE NEW.image_id END;
+    row_album_id INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.album_id ELSE NEW.album_id END;
+    row_id INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END;
+    image_album_id INTEGER;
+BEGIN
+    -- NULL when the image itself is being deleted, which is announced on its own
+    SELECT album_id INTO image_album_id FROM images WHERE id = row_image_id AND album_id = row_album_id;
+    IF image_album_id IS NOT NULL AND NOT album_is_gone(image_album_id) THEN
+        PERFORM notify_change('audio', TG_OP, row_id, image_album_id, NULL);
+    END IF;
+    RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_tombstone()
+RETURNS TRIGGER AS $fn$
+DECLARE
+    row_album_id INTEGER;
+BEGIN
+    IF TG_TABLE_NAME = 'audio' THEN
+        -- NULL when the image is being deleted too; its tombstone covers the audio
+        SELECT album_id INTO row_album_id FROM images WHERE id = OLD.image_id AND album_id = OLD.album_id;
+    ELSE
+        row_album_id := OLD.album_id;
+    END IF;
+
+    IF row_album_id IS NULL OR album_is_gone(row_album_id) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_TABLE_NAME = 'album_members' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, album_id, user_id)
+        VALUES ('album_member', OLD.id, row_album_id, OLD.user_id);
+    ELSIF TG_TABLE_NAME = 'audio' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, album_id)
+        VALUES ('audio', OLD.id, row_album_id);
+    ELSE
+        -- images: row triggers on a partitioned table see the partition's name
+        INSERT INTO sync_tombstones (entity, entity_id, album_id)
+        VALUES ('image', OLD.id, row_album_id);
+    END IF;
+    RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION album_stats_on_audio_change()
+RETURNS TRIGGER AS $fn$
+DECLARE
+    image_album_id INTEGER;
+BEGIN
+    -- NULL when the image is being deleted; its trigger already counted the audio
+    IF TG_OP = 'DELETE' THEN
+        SELECT album_id INTO image_album_id FROM images WHERE id = OLD.image_id AND album_id = OLD.album_id;
+    ELSE
+        SELECT album_id INTO image_album_id FROM images WHERE id = NEW.image_id AND album_id = NEW.album_id;
+    END IF;
+
+    IF image_album_id IS NOT NULL AND NOT album_is_gone(image_album_id) THEN
+        PERFORM bump_album_stats(
+            image_album_id, 0, CASE TG_OP WHEN 'INSERT' THEN 1 WHEN 'DELETE' THEN -1 ELSE 0 END, 0
+        );
+    END IF;
+    RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+END $swap$;
+
+DROP FUNCTION IF EXISTS mirror_images_to_partitioned();
+DROP INDEX CONCURRENTLY IF EXISTS idx_audio_missing_album;
+
+ALTER TABLE audio VALIDATE CONSTRAINT audio_image_id_fkey;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'audio_album_id_not_null' AND conrelid = 'audio'::regclass
+    ) THEN
+        ALTER TABLE audio VALIDATE CONSTRAINT audio_album_id_not_null;
+        COMMIT;
+        -- Uses the validated check instead of scanning the table
+        ALTER TABLE audio ALTER COLUMN album_id SET NOT NULL;
+        ALTER TABLE audio DROP CONSTRAINT audio_album_id_not_null;
+    END IF;
+END $$;
+
+-- Sync reads audio by album like the other synced tables
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audio_album_change ON audio(album_id, change_xid);
@@ -0,0 +1,16 @@
+-- Albums can live on other databases than the users table (album shards, see
+-- DATABASE_SHARD_URLS), and every shard runs these migrations with an empty
+-- users table of its own, so album-scoped tables can no longer reference
+-- users with foreign keys. The services check that users exist in the
+-- primary database before adding them to an album.
+--
+-- Deleting a user therefore no longer cascades to their albums, memberships
+-- and images. Nothing deletes users today; account deletion will have to
+-- remove those rows on every shard.
+
+ALTER TABLE albums DROP CONSTRAINT IF EXISTS albums_owner_id_fkey;
+ALTER TABLE album_members DROP CONSTRAINT IF EXISTS album_members_user_id_fkey;
+ALTER TABLE images DROP CONSTRAINT IF EXISTS images_user_id_fkey;
+
+-- Only the cascade from users looked images up by uploader
+DROP INDEX IF EXISTS idx_images_user_id;
@@ -0,0 +1,71 @@
+-- migrate:no-transaction
+-- "On this day" memories match images by month and day of any year, which
+-- idx_images_date_added can't serve. image_month_day() gives the day as
+-- MMDD in UTC; it is IMMUTABLE (AT TIME ZONE 'UTC' doesn't depend on the
+-- session time zone), so it can be indexed, and queries must use the same
+-- function to match the index.
+--
+-- The index leads with the day, so the daily precompute reads one day of
+-- every album, and a single user's lookup probes (day, album_id) for each
+-- of their albums.
+--
+-- images is partitioned and CREATE INDEX CONCURRENTLY doesn't work on a
+-- partitioned table, so the parent index is created empty (ON ONLY) and
+-- each partition's index is built concurrently and attached; the parent
+-- index becomes valid once every partition's index is attached.
+
+CREATE OR REPLACE FUNCTION image_month_day(taken_at TIMESTAMP WITH TIME ZONE)
+RETURNS SMALLINT AS $$
+    SELECT (EXTRACT(MONTH FROM taken_at AT TIME ZONE 'UTC') * 100
+        + EXTRACT(DAY FROM taken_at AT TIME ZONE 'UTC'))::SMALLINT
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE INDEX IF NOT EXISTS idx_images_month_day ON ONLY images(image_month_day(date_added), album_id, date_added DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p00_month_day ON images_p00(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p00_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p01_month_day ON images_p01(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p01_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p02_month_day ON images_p02(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p02_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p03_month_day ON images_p03(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p03_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p04_month_day ON images_p04(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p04_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p05_month_day ON images_p05(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p05_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p06_month_day ON images_p06(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p06_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p07_month_day ON images_p07(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p07_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p08_month_day ON images_p08(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p08_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p09_month_day ON images_p09(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p09_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p10_month_day ON images_p10(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p10_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p11_month_day ON images_p11(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p11_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p12_month_day ON images_p12(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p12_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p13_month_day ON images_p13(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p13_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p14_month_day ON images_p14(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p14_month_day;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p15_month_day ON images_p15(image_month_day(date_added), album_id, date_added DESC, id DESC);
+ALTER INDEX idx_images_month_day ATTACH PARTITION idx_images_p15_month_day;
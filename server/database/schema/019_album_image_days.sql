@@ -0,0 +1,80 @@
+-- Per-day image counts (UTC days) for the timeline scrubber histograms.
+--
+-- Small albums are counted straight from idx_images_album_date_added with an
+-- index-only scan. Once an album is large, the API turns on its rollup
+-- (enable_album_day_rollup), and from then on the image triggers keep its
+-- rows here current, so its histogram reads one row per day instead of one
+-- per image.
+CREATE TABLE IF NOT EXISTS album_image_days (
+    album_id INTEGER NOT NULL REFERENCES albums(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    image_count INTEGER NOT NULL,
+    PRIMARY KEY (album_id, day)
+);
+
+ALTER TABLE album_stats ADD COLUMN IF NOT EXISTS day_rollup BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Callers must hold the album's album_stats row lock (bump_album_stats takes
+-- it), so enable_album_day_rollup can't flip the flag in between
+CREATE OR REPLACE FUNCTION bump_album_image_day(target_album_id INTEGER, taken_at TIMESTAMP WITH TIME ZONE, delta INTEGER)
+RETURNS VOID AS $$
+    INSERT INTO album_image_days (album_id, day, image_count)
+    SELECT album_id, (taken_at AT TIME ZONE 'UTC')::DATE, delta
+    FROM album_stats
+    WHERE album_id = target_album_id AND day_rollup AND taken_at IS NOT NULL
+    ON CONFLICT (album_id, day) DO UPDATE
+    SET image_count = album_image_days.image_count + delta;
+$$ LANGUAGE sql;
+
+-- Start maintaining an album's rollup. Updating the flag takes the
+-- album_stats row lock that every image write of the album holds until it
+-- commits: writes that took it first have committed before the backfill
+-- reads, and later ones wait, then see the flag and count themselves.
+CREATE OR REPLACE FUNCTION enable_album_day_rollup(target_album_id INTEGER)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE album_stats SET day_rollup = TRUE WHERE album_id = target_album_id AND NOT day_rollup;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO album_image_days (album_id, day, image_count)
+    SELECT target_album_id, (date_added AT TIME ZONE 'UTC')::DATE AS day, COUNT(*)
+    FROM images
+    WHERE album_id = target_album_id AND date_added IS NOT NULL
+    GROUP BY day;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION album_stats_on_image_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_album_stats(NEW.album_id, 1, 0, 0);
+        PERFORM bump_album_image_day(NEW.album_id, NEW.date_added, 1);
+        PERFORM refresh_album_cover(NEW.album_id);
+        RETURN NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF (OLD.date_added AT TIME ZONE 'UTC')::DATE IS DISTINCT FROM (NEW.date_added AT TIME ZONE 'UTC')::DATE THEN
+            -- The lock bump_album_stats takes on the other paths
+            PERFORM 1 FROM album_stats WHERE album_id = NEW.album_id FOR NO KEY UPDATE;
+            PERFORM bump_album_image_day(NEW.album_id, OLD.date_added, -1);
+            PERFORM bump_album_image_day(NEW.album_id, NEW.date_added, 1);
+        END IF;
+        PERFORM refresh_album_cover(NEW.album_id);
+        RETURN NULL;
+    END IF;
+
+    -- DELETE runs BEFORE the row and its audio are removed, while the audio
+    -- can still be counted; purges of soft-deleted albums are skipped
+    IF NOT album_is_gone(OLD.album_id) THEN
+        PERFORM bump_album_stats(
+            OLD.album_id, -1, -(SELECT COUNT(*) FROM audio WHERE image_id = OLD.id)::INTEGER, 0
+        );
+        PERFORM bump_album_image_day(OLD.album_id, OLD.date_added, -1);
+        PERFORM refresh_album_cover(OLD.album_id, OLD.id);
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
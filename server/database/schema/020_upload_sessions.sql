@@ -0,0 +1,26 @@
+-- Resumable uploads (POST /upload/sessions). The bytes received so far are
+-- staged on disk; this row records how many, and what the finished file's
+-- SHA-256 must be.
+--
+-- A session lives on the shard of the album its image or audio will belong
+-- to, and its ID comes from that shard's range like the album-scoped tables'
+-- (see app.jobs.migrate), so completing the upload creates the record and
+-- marks the session done in one transaction.
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    kind VARCHAR(10) NOT NULL CHECK (kind IN ('image', 'audio')),
+    album_id INTEGER NOT NULL REFERENCES albums(id) ON DELETE CASCADE,
+    image_id INTEGER,  -- Audio uploads: the image the clip is for
+    upload_length BIGINT NOT NULL CHECK (upload_length > 0),
+    upload_offset BIGINT NOT NULL DEFAULT 0 CHECK (upload_offset BETWEEN 0 AND upload_length),
+    sha256 CHAR(64) NOT NULL,
+    metadata JSONB NOT NULL DEFAULT '{}',  -- Fields of the record to create (caption, location, ...)
+    url VARCHAR(500),  -- Set once the verified file has been moved to media storage
+    record_id INTEGER,  -- The image or audio created from the upload
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_album_id ON upload_sessions(album_id);
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires_at ON upload_sessions(expires_at);
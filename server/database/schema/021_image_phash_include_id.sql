@@ -0,0 +1,62 @@
+-- migrate:no-transaction
+-- The near-duplicate check loads an album's (id, phash) pairs, but
+-- idx_images_album_phash only holds (album_id, phash), so every row still
+-- needed a heap fetch for its id. The replacement carries id in INCLUDE,
+-- which makes the load an index-only scan once the visibility map is set.
+--
+-- Built the same way as idx_images_month_day: an empty parent index (ON ONLY)
+-- with each partition's index built concurrently and attached. The old
+-- index is a partitioned index, which can't be dropped concurrently, so the
+-- final DROP takes a brief exclusive lock on images.
+
+CREATE INDEX IF NOT EXISTS idx_images_album_phash_id ON ONLY images(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p00_album_phash_id ON images_p00(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p00_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p01_album_phash_id ON images_p01(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p01_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p02_album_phash_id ON images_p02(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p02_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p03_album_phash_id ON images_p03(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p03_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p04_album_phash_id ON images_p04(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p04_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p05_album_phash_id ON images_p05(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p05_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p06_album_phash_id ON images_p06(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p06_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p07_album_phash_id ON images_p07(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p07_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p08_album_phash_id ON images_p08(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p08_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p09_album_phash_id ON images_p09(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p09_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p10_album_phash_id ON images_p10(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p10_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p11_album_phash_id ON images_p11(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p11_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p12_album_phash_id ON images_p12(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p12_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p13_album_phash_id ON images_p13(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p13_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p14_album_phash_id ON images_p14(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p14_album_phash_id;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_p15_album_phash_id ON images_p15(album_id, phash) INCLUDE (id) WHERE phash IS NOT NULL;
+ALTER INDEX idx_images_album_phash_id ATTACH PARTITION idx_images_p15_album_phash_id;
+
+DROP INDEX IF EXISTS idx_images_album_phash;
@@ -0,0 +1,53 @@
+-- migrate:no-transaction
+-- The album of every image, keyed by image ID. images is partitioned by
+-- album (016), so routes that carry only an image ID (/images/{id}, audio
+-- by image) would otherwise probe the primary key of all 16 partitions; with
+-- this they read one row here and then only the album's partition. An image
+-- never moves between albums, so rows are only ever inserted and deleted.
+CREATE TABLE IF NOT EXISTS image_albums (
+    image_id INTEGER PRIMARY KEY,
+    album_id INTEGER NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION sync_image_albums()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO image_albums (image_id, album_id) VALUES (NEW.id, NEW.album_id)
+        ON CONFLICT (image_id) DO NOTHING;
+    ELSE
+        DELETE FROM image_albums WHERE image_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'sync_image_albums' AND tgrelid = 'images'::regclass
+    ) THEN
+        CREATE TRIGGER sync_image_albums AFTER INSERT OR DELETE ON images
+        FOR EACH ROW EXECUTE FUNCTION sync_image_albums();
+    END IF;
+END $$;
+
+-- Existing images, in committed ID batches like 016's copy. FOR SHARE waits
+-- for concurrent deletes, so a deleted image is never added back.
+DO $$
+DECLARE
+    batch_start BIGINT;
+    last_id BIGINT;
+BEGIN
+    SELECT MIN(id), MAX(id) INTO batch_start, last_id FROM images;
+    WHILE batch_start <= last_id LOOP
+        INSERT INTO image_albums (image_id, album_id)
+        SELECT id, album_id FROM images WHERE id >= batch_start AND id < batch_start + 10000
+        FOR SHARE
+        ON CONFLICT (image_id) DO NOTHING;
+        COMMIT;
+        batch_start := batch_start + 10000;
+    END LOOP;
+END $$;
+
+ANALYZE image_albums;
@@ -0,0 +1,118 @@
+-- Production-shaped data for the query plan regression checks (test_query_plans.py).
+-- Expects an empty, fully migrated database; the seed.scale setting multiplies
+-- every row count (scale 1 = 5k users, 10k albums, 300k images).
+--
+-- Popularity is skewed like real usage: a few albums hold most images and a
+-- few users belong to many albums, so plans are checked against the hot rows
+-- as well as typical ones.
+
+SELECT setseed(0.42);
+
+-- Skip the per-row triggers (notify, sync, stats); stats are rebuilt below
+SET session_replication_role = replica;
+
+INSERT INTO users (email, password_hash, name, created_at)
+SELECT 'seed' || g || '@example.com', 'seed', 'Seed User ' || g, CURRENT_TIMESTAMP - g * INTERVAL '1 minute'
+FROM generate_series(1, 5000 * current_setting('seed.scale')::int) g;
+
+INSERT INTO albums (name, owner_id, created_at, updated_at, deleted_at, change_xid)
+SELECT
+    'Album ' || g,
+    1 + floor(random() ^ 2 * (SELECT COUNT(*) FROM users))::int,
+    CURRENT_TIMESTAMP - random() * INTERVAL '730 days',
+    CURRENT_TIMESTAMP - random() * INTERVAL '30 days',
+    CASE WHEN random() < 0.01 THEN CURRENT_TIMESTAMP - random() * INTERVAL '1 day' END,
+    (g * 10)::text::xid8
+FROM generate_series(1, 10000 * current_setting('seed.scale')::int) g;
+
+INSERT INTO album_members (album_id, user_id, created_at, change_xid)
+SELECT id, owner_id, created_at, change_xid FROM albums;
+
+INSERT INTO album_members (album_id, user_id, created_at, change_xid)
+SELECT
+    1 + floor(random() ^ 2 * (SELECT COUNT(*) FROM albums))::int,
+    1 + floor(random() ^ 3 * (SELECT COUNT(*) FROM users))::int,
+    CURRENT_TIMESTAMP - random() * INTERVAL '365 days',
+    (g * 3)::text::xid8
+FROM generate_series(1, 30000 * current_setting('seed.scale')::int) g
+ON CONFLICT (album_id, user_id) DO NOTHING;
+
+INSERT INTO images (
+    album_id, caption, image_url, latitude, longitude, date_added, user_id,
+    placeholder, phash, change_xid
+)
+SELECT
+    album_id,
+    CASE WHEN random() < 0.3 THEN 'Caption ' || g END,
+    'https://res.cloudinary.com/demo/image/upload/v1/memento/seed/images/' || g || '.jpg',
+    CASE WHEN random() < 0.6 THEN 40 + random() END,
+    CASE WHEN random() < 0.6 THEN -74 + random() END,
+    CURRENT_TIMESTAMP - random() * INTERVAL '730 days',
+    1 + floor(random() * (SELECT COUNT(*) FROM users))::int,
+    CASE WHEN random() < 0.95 THEN 'LEHV6nWB2yk8pyo0adR*.7kCMdnj' END,
+    CASE WHEN random() < 0.95 THEN (random() * 9e18)::bigint END,
+    g::text::xid8
+FROM (
+    SELECT g, 1 + floor(random() ^ 3 * (SELECT COUNT(*) FROM albums))::int AS album_id
+    FROM generate_series(1, 300000 * current_setting('seed.scale')::int) g
+) picked;
+
+INSERT INTO image_albums (image_id, album_id)
+SELECT id, album_id FROM images;
+
+INSERT INTO audio (image_id, album_id, url, change_xid)
+SELECT id, album_id, 'https://res.cloudinary.com/demo/raw/upload/v1/memento/seed/audio/' || id || '.mp3', change_xid
+FROM images
+WHERE random() < 0.2;
+
+INSERT INTO sync_tombstones (entity, entity_id, album_id, user_id, change_xid, created_at)
+SELECT
+    (ARRAY['image', 'audio', 'album_member'])[1 + g % 3],
+    g,
+    1 + floor(random() ^ 2 * (SELECT COUNT(*) FROM albums))::int,
+    CASE WHEN g % 3 = 2 THEN 1 + floor(random() * (SELECT COUNT(*) FROM users))::int END,
+    (g * 15)::text::xid8,
+    CURRENT_TIMESTAMP - random() * INTERVAL '31 days'
+FROM generate_series(1, 20000 * current_setting('seed.scale')::int) g;
+
+-- Resumable uploads: mostly in progress, some stored or done, a quarter expired
+INSERT INTO upload_sessions (
+    user_id, kind, album_id, upload_length, upload_offset, sha256, url, record_id, expires_at, created_at
+)
+SELECT
+    user_id, 'image', album_id, 4194304, CASE WHEN state > 0 THEN 4194304 ELSE 1048576 END, repeat('0', 64),
+    CASE WHEN state > 0 THEN 'https://res.cloudinary.com/demo/image/upload/v1/memento/seed/uploads/' || g || '.jpg' END,
+    CASE WHEN state = 2 THEN g END,
+    expires_at, expires_at - INTERVAL '1 day'
+FROM (
+    SELECT
+        g,
+        1 + floor(random() * (SELECT COUNT(*) FROM users))::int AS user_id,
+        1 + floor(random() ^ 2 * (SELECT COUNT(*) FROM albums))::int AS album_id,
+        CASE WHEN random() < 0.7 THEN 0 WHEN random() < 0.5 THEN 1 ELSE 2 END AS state,
+        CURRENT_TIMESTAMP + (random() * 4 - 3) * INTERVAL '8 hours' AS expires_at
+    FROM generate_series(1, 2000 * current_setting('seed.scale')::int) g
+) picked;
+
+SET session_replication_role = origin;
+
+INSERT INTO album_stats (album_id, image_count, audio_count, member_count, last_activity_at)
+SELECT
+    a.id,
+    (SELECT COUNT(*) FROM images i WHERE i.album_id = a.id),
+    (SELECT COUNT(*) FROM audio au WHERE au.album_id = a.id),
+    (SELECT COUNT(*) FROM album_members am WHERE am.album_id = a.id),
+    a.updated_at
+FROM albums a;
+
+SELECT COUNT(refresh_album_cover(id)) FROM albums;
+
+-- Large albums have their per-day rollup, as the histogram endpoint leaves them
+SELECT COUNT(enable_album_day_rollup(album_id)) FROM album_stats WHERE image_count >= 2000;
+ANALYZE album_image_days;
+
+CREATE TABLE IF NOT EXISTS query_plan_seed (
+    scale INTEGER NOT NULL,
+    seeded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO query_plan_seed (scale) VALUES (current_setting('seed.scale')::int);
@@ -0,0 +1,112 @@
+"""
+Checks for admission control (app.utils.admission), driving the ASGI
+middleware directly around a small FastAPI app; no database is needed:
+- a write's slot is released once its response is sent, so a background
+  task still running after it doesn't turn the next write into a 503
+- a request that fails before responding still releases its slot
+- requests over the limit and the queue are rejected with 503
+
+Usage (from the server directory):
+
+    python test_admission.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+
+def _app(background_done: asyncio.Event):
+    from fastapi import BackgroundTasks, FastAPI
+
+    app = FastAPI()
+
+    async def slow_job():
+        await background_done.wait()
+
+    @app.post("/albums")
+    async def create(background_tasks: BackgroundTasks):
+        background_tasks.add_task(slow_job)
+        return {"ok": True}
+
+    @app.post("/fail")
+    async def fail():
+        raise RuntimeError("boom")
+
+    return app
+
+
+async def _call(middleware, method: str, path: str):
+    """Start one request through the middleware; returns (task, response finished event, sent messages)."""
+    sent = []
+    finished = asyncio.Event()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            finished.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [], "client": ("127.0.0.1", 1), "server": ("testserver", 80)
+    }
+    task = asyncio.create_task(middleware(scope, receive, send))
+    return task, finished, sent
+
+
+async def _check() -> None:
+    from app.utils.admission import AdmissionController, AdmissionGate, AdmissionMiddleware
+
+    background_done = asyncio.Event()
+    gate = AdmissionGate(limit=1, queue_size=0, queue_timeout=0.1)
+    middleware = AdmissionMiddleware(_app(background_done), AdmissionController({"write": gate}))
+
+    first, first_finished, first_sent = await _call(middleware, "POST", "/albums")
+    await asyncio.wait_for(first_finished.wait(), timeout=5)
+    assert first_sent[0]["status"] == 200, first_sent[0]
+    assert not first.done() and gate.in_flight == 0, gate.snapshot()
+
+    second, second_finished, second_sent = await _call(middleware, "POST", "/albums")
+    await asyncio.wait_for(second_finished.wait(), timeout=5)
+    assert second_sent[0]["status"] == 200, second_sent[0]
+    assert not first.done(), "the first request's background task should still be running"
+    print("   ok: a write is admitted while an earlier write's background task runs")
+
+    background_done.set()
+    await asyncio.gather(first, second)
+    assert gate.in_flight == 0 and gate._semaphore._value == 1, gate.snapshot()
+    print("   ok: the slot is released exactly once per request")
+
+    failing, _, _ = await _call(middleware, "POST", "/fail")
+    try:
+        await failing
+    except RuntimeError:
+        pass
+    assert gate.in_flight == 0 and gate._semaphore._value == 1, gate.snapshot()
+    print("   ok: a request that fails before responding releases its slot")
+
+    # Another request holds the only slot and hasn't responded yet
+    await gate.acquire()
+    rejected, _, rejected_sent = await _call(middleware, "POST", "/albums")
+    await rejected
+    assert rejected_sent[0]["status"] == 503, rejected_sent[0]
+    assert (b"retry-after", b"1") in rejected_sent[0]["headers"]
+    gate.release()
+    assert gate.in_flight == 0 and gate._semaphore._value == 1, gate.snapshot()
+    print("   ok: a request over the limit and the queue gets 503 with Retry-After")
+
+
+def main() -> None:
+    sys.path.insert(0, str(SERVER_DIR))
+    print("1. Admission middleware")
+    asyncio.run(_check())
+    print("All admission checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Checks for album collage covers (app.services.album_cover_service) against
+a local Postgres database, with local media storage in a temporary directory:
+- tiles of images stored locally are read from disk, so the cover is a real
+  collage rather than the placeholder
+- a tile whose file is gone is left out and the others still render
+- the ETag follows the images shown, and If-None-Match gets a 304
+
+Usage (from the server directory, against a scratch database that the script
+migrates on first use):
+
+    ALBUM_COVER_TEST_DATABASE_URL=postgresql+psycopg2://postgres@localhost/memento_covers python test_album_covers.py
+
+Rows are never cleaned up, so never point this at a database you care about.
+"""
+import io
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+DATABASE_URL = os.environ.get("ALBUM_COVER_TEST_DATABASE_URL", "")
+MEDIA_DIR = Path(tempfile.mkdtemp(prefix="memento-covers-"))
+if DATABASE_URL:
+    # Must happen before app modules build their engines and storage from the settings
+    os.environ["DATABASE_URL"] = DATABASE_URL
+    os.environ["DATABASE_SHARD_URLS"] = ""
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["LOCAL_STORAGE_PATH"] = str(MEDIA_DIR)
+    os.environ["PUBLIC_BASE_URL"] = "http://testserver"
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+COLORS = [(200, 40, 40), (40, 200, 40), (40, 40, 200), (200, 200, 40)]
+
+
+def _register(client) -> dict:
+    email = f"covers-{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post("/auth/register", json={"email": email, "password": "cover-test", "name": "Covers"})
+    assert response.status_code == 201, response.text
+    token = client.post("/auth/login", json={"email": email, "password": "cover-test"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _photo(color) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _add_image(client, headers, album_id: int, color) -> dict:
+    response = client.post("/upload/image", files={"file": ("photo.jpg", _photo(color), "image/jpeg")}, headers=headers)
+    assert response.status_code == 201, response.text
+    response = client.post("/images", json={"album_id": album_id, "image_url": response.json()["url"]}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def _cover(client, headers, album_id: int, etag: str = None):
+    request_headers = {**headers, "If-None-Match": etag} if etag else headers
+    return client.get(f"/albums/{album_id}/cover", headers=request_headers)
+
+
+def _share(data: bytes, target) -> float:
+    """Fraction of the cover's pixels close to a color; blended tile edges count for little."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    near = sum(
+        count for count, color in image.getcolors(maxcolors=image.width * image.height)
+        if all(abs(a - b) < 30 for a, b in zip(color, target))
+    )
+    return near / (image.width * image.height)
+
+
+def _check_local_tiles(client, headers, album_id: int) -> None:
+    for color in COLORS[:3]:
+        _add_image(client, headers, album_id, color)
+
+    response = _cover(client, headers, album_id)
+    assert response.status_code == 200, response.text
+    assert not response.headers["etag"].endswith('-placeholder"'), response.headers
+    assert response.headers["cache-control"] == "private, max-age=60"
+    assert all(_share(response.content, color) > 0.1 for color in COLORS[:3])
+    print("   ok: locally stored tiles are read from disk and composed into a collage")
+
+    assert _cover(client, headers, album_id, response.headers["etag"]).status_code == 304
+    print("   ok: an unchanged cover answers If-None-Match with 304")
+
+
+def _check_missing_tile(client, headers, album_id: int) -> None:
+    before = _cover(client, headers, album_id).headers["etag"]
+    image_id = _add_image(client, headers, album_id, COLORS[3])["id"]
+    # Re-read it for the variants ingest stored, then take every rendition away
+    image = client.get(f"/images/{image_id}", headers=headers).json()
+    assert image["thumbnail_url"], image
+    for url in {image["image_url"], image["thumbnail_url"], image["medium_url"], image["full_url"]} - {None}:
+        name = url.rsplit("/", 1)[1]
+        for path in MEDIA_DIR.glob(f"??/??/{name}"):
+            path.unlink()
+
+    response = _cover(client, headers, album_id)
+    assert response.status_code == 200, response.text
+    assert response.headers["etag"] != before
+    assert not response.headers["etag"].endswith('-placeholder"'), response.headers
+    assert _share(response.content, COLORS[0]) > 0.1 and _share(response.content, COLORS[3]) < 0.01
+    print("   ok: a tile whose file is gone is left out and the rest still render")
+
+
+def run() -> int:
+    from fastapi.testclient import TestClient
+    from app.jobs.migrate import migrate
+    from app.main import app
+
+    migrate()
+
+    with TestClient(app) as client:
+        headers = _register(client)
+        response = client.post("/albums", json={"name": "Covered"}, headers=headers)
+        assert response.status_code == 201, response.text
+        album_id = response.json()["id"]
+
+        print("1. Local storage tiles")
+        _check_local_tiles(client, headers, album_id)
+        print("2. Missing tile")
+        _check_missing_tile(client, headers, album_id)
+
+    print("All album cover checks passed")
+    return 0
+
+
+def main() -> None:
+    if not DATABASE_URL:
+        sys.exit("Set ALBUM_COVER_TEST_DATABASE_URL to a scratch database")
+    sys.path.insert(0, str(SERVER_DIR))
+    sys.exit(run())
+
+
+if __name__ == "__main__":
+    main()
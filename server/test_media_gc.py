@@ -0,0 +1,194 @@
+"""
+Checks for the media garbage collector (app.jobs.media_gc) against a local
+Postgres database, with InMemoryMediaClient standing in for the Cloudinary
+Admin API and a temporary directory for local storage:
+- assets referenced by an image, an audio clip or a stored upload are kept
+- unreferenced assets younger than the grace window are kept
+- a dry run counts orphans without deleting anything
+- orphans are deleted in batches of at most 100, across listing pages
+- a delete batch that fails once is retried
+- local storage: referenced and fresh files are kept, old orphans deleted
+
+Usage (from the server directory, against a scratch database that the script
+migrates on first use):
+
+    MEDIA_GC_TEST_DATABASE_URL=postgresql+psycopg2://postgres@localhost/memento_gc python test_media_gc.py
+
+Rows are never cleaned up, so never point this at a database you care about.
+"""
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+DATABASE_URL = os.environ.get("MEDIA_GC_TEST_DATABASE_URL", "")
+MEDIA_DIR = Path(tempfile.mkdtemp(prefix="memento-gc-"))
+if DATABASE_URL:
+    # Must happen before app modules build their engines and storage from the settings
+    os.environ["DATABASE_URL"] = DATABASE_URL
+    os.environ["DATABASE_SHARD_URLS"] = ""
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["LOCAL_STORAGE_PATH"] = str(MEDIA_DIR)
+    os.environ["PUBLIC_BASE_URL"] = "http://testserver"
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+GRACE = timedelta(hours=1)
+OLD = datetime.now(timezone.utc) - timedelta(days=2)
+
+
+def _register(client) -> tuple:
+    email = f"gc-{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post("/auth/register", json={"email": email, "password": "gc-test", "name": "Collector"})
+    assert response.status_code == 201, response.text
+    token = client.post("/auth/login", json={"email": email, "password": "gc-test"}).json()["access_token"]
+    return response.json(), {"Authorization": f"Bearer {token}"}
+
+
+def _cloudinary_url(resource_type: str, public_id: str) -> str:
+    return f"https://res.cloudinary.com/demo/{resource_type}/upload/v1700000000/{public_id}"
+
+
+def _store_references(client, headers, album_id: int, folder: str) -> None:
+    """An image, its audio clip and a stored upload that isn't a record yet, all on Cloudinary."""
+    from sqlalchemy import text
+    from app.config.db import engine
+
+    response = client.post("/images", json={
+        "album_id": album_id, "image_url": _cloudinary_url("image", f"{folder}/images/kept.jpg")
+    }, headers=headers)
+    assert response.status_code == 201, response.text
+    response = client.post("/audio", json={
+        "image_id": response.json()["id"], "url": _cloudinary_url("raw", f"{folder}/audio/kept.m4a")
+    }, headers=headers)
+    assert response.status_code == 201, response.text
+
+    response = client.post("/upload/sessions", json={
+        "kind": "image", "length": 1, "sha256": "0" * 64, "album_id": album_id
+    }, headers=headers)
+    assert response.status_code == 201, response.text
+    with engine.begin() as connection:
+        connection.execute(
+            text("UPDATE upload_sessions SET url = :url WHERE id = :id"),
+            {"url": _cloudinary_url("image", f"{folder}/images/uploaded.jpg"), "id": response.json()["id"]}
+        )
+
+
+class _FlakyClient:
+    """Fails the first delete call, then behaves like the wrapped client."""
+
+    def __init__(self, client):
+        self._client = client
+        self.failures = 0
+
+    def list_resources(self, prefix, resource_type, cursor):
+        return self._client.list_resources(prefix, resource_type, cursor)
+
+    def delete_resources(self, public_ids, resource_type):
+        if self.failures == 0:
+            self.failures += 1
+            raise ConnectionError("rate limited")
+        return self._client.delete_resources(public_ids, resource_type)
+
+
+def _check_cloudinary(client, headers, album_id: int, user_id: int) -> None:
+    from app.jobs import media_gc
+    from app.jobs.media_gc import InMemoryMediaClient, collect_garbage
+
+    folder = f"memento/user_{user_id}"
+    _store_references(client, headers, album_id, folder)
+
+    media = InMemoryMediaClient(page_size=40)
+    media.add(f"{folder}/images/kept", "image", OLD)
+    media.add(f"{folder}/audio/kept.m4a", "raw", OLD)
+    media.add(f"{folder}/images/uploaded", "image", OLD)
+    media.add(f"{folder}/images/in-flight", "image", datetime.now(timezone.utc))
+    orphans = [f"{folder}/images/orphan-{n:03d}" for n in range(230)]
+    for public_id in orphans:
+        media.add(public_id, "image", OLD)
+    media.add(f"{folder}/audio/orphan.m4a", "raw", OLD)
+    mine = lambda: {(kind, pid) for kind, ids in media.assets.items() for pid in ids if pid.startswith(folder)}
+
+    result = collect_garbage(media, min_age=GRACE, dry_run=True)
+    assert result.orphaned == len(orphans) + 1, result
+    assert not media.delete_calls and len(mine()) == len(orphans) + 5
+    print("   ok: a dry run counts orphans without deleting anything")
+
+    flaky = _FlakyClient(media)
+    result = collect_garbage(flaky, min_age=GRACE, concurrency=2)
+    assert flaky.failures == 1
+    assert result.deleted == len(orphans) + 1 and result.failed == 0, result
+    assert mine() == {
+        ("image", f"{folder}/images/kept"),
+        ("raw", f"{folder}/audio/kept.m4a"),
+        ("image", f"{folder}/images/uploaded"),
+        ("image", f"{folder}/images/in-flight"),
+    }, mine()
+    print("   ok: image, audio and stored upload references are kept, and so are assets inside the grace window")
+    assert all(len(public_ids) <= media_gc.DELETE_BATCH_SIZE for _, public_ids in media.delete_calls)
+    assert sum(len(public_ids) for kind, public_ids in media.delete_calls if kind == "image") == len(orphans)
+    print("   ok: orphans across listing pages are deleted in batches of at most 100, retrying a failed batch")
+
+
+def _check_local(client, headers, album_id: int) -> None:
+    from app.jobs.media_gc import collect_local_garbage
+    from app.storage import get_storage
+
+    storage = get_storage()
+    kept_url = storage.put(b"\xff\xd8\xff\xe0 kept " + os.urandom(16), "kept")
+    response = client.post("/images", json={"album_id": album_id, "image_url": kept_url}, headers=headers)
+    assert response.status_code == 201, response.text
+    orphan_url = storage.put(b"\xff\xd8\xff\xe0 orphan " + os.urandom(16), "orphan")
+    fresh_url = storage.put(b"\xff\xd8\xff\xe0 fresh " + os.urandom(16), "fresh")
+
+    def path(url: str) -> Path:
+        return next(MEDIA_DIR.glob(f"??/??/{url.rsplit('/', 1)[1]}"))
+
+    for url in (kept_url, orphan_url):
+        os.utime(path(url), (OLD.timestamp(), OLD.timestamp()))
+
+    result = collect_local_garbage(storage, min_age=GRACE, dry_run=True)
+    assert result.orphaned == 1 and path(orphan_url).exists(), result
+    print("   ok: a dry run leaves local files in place")
+
+    result = collect_local_garbage(storage, min_age=GRACE)
+    assert result.deleted == 1, result
+    assert not list(MEDIA_DIR.glob(f"??/??/{orphan_url.rsplit('/', 1)[1]}"))
+    assert path(kept_url).exists() and path(fresh_url).exists()
+    print("   ok: old unreferenced files are deleted, referenced and fresh ones kept")
+
+
+def run() -> int:
+    from fastapi.testclient import TestClient
+    from app.jobs.migrate import migrate
+    from app.main import app
+
+    migrate()
+
+    with TestClient(app) as client:
+        user, headers = _register(client)
+        response = client.post("/albums", json={"name": "Collected"}, headers=headers)
+        assert response.status_code == 201, response.text
+        album_id = response.json()["id"]
+
+        print("1. Cloudinary")
+        _check_cloudinary(client, headers, album_id, user["id"])
+        print("2. Local storage")
+        _check_local(client, headers, album_id)
+
+    print("All media GC checks passed")
+    return 0
+
+
+def main() -> None:
+    if not DATABASE_URL:
+        sys.exit("Set MEDIA_GC_TEST_DATABASE_URL to a scratch database")
+    sys.path.insert(0, str(SERVER_DIR))
+    sys.exit(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Query plan regression checks for the repository layer.
+
+Runs every query in app/repositories/ with EXPLAIN (ANALYZE, BUFFERS) against
+a seeded, production-shaped local Postgres and fails on:
+- sequential scans of large tables (or partitions) that discard most rows
+- sorts that spill to disk
+- row estimates far off the actual row counts
+
+Each case's plan shape (node types, tables, indexes; no costs or timings) is
+stored under database/query_plans/, so plan changes show up in review. A
+changed shape fails the run until the snapshot is updated with --update.
+
+Usage (from the server directory, against a scratch database that the
+script migrates and seeds on first use):
+
+    QUERY_PLAN_DATABASE_URL=postgresql+psycopg2://postgres@localhost/memento_plans \\
+        python test_query_plans.py [--scale 1] [--update] [-k get_user_albums]
+
+Writes run inside transactions that are rolled back, but never point this at
+a database you care about.
+"""
+import argparse
+import difflib
+import inspect
+import os
+import sys
+import time
+from pathlib import Path
+
+PLAN_DATABASE_URL = os.environ.get("QUERY_PLAN_DATABASE_URL")
+if PLAN_DATABASE_URL:
+    # Must happen before app modules build their engine from the settings
+    os.environ["DATABASE_URL"] = PLAN_DATABASE_URL
+
+SERVER_DIR = Path(__file__).resolve().parent
+SNAPSHOT_DIR = SERVER_DIR / "database" / "query_plans"
+SEED_FILE = SERVER_DIR / "database" / "seed" / "query_plans.sql"
+
+LARGE_TABLE_ROWS = 10000  # Sequential scans of bigger tables fail the check...
+SEQ_SCAN_MIN_KEPT = 0.25  # ...unless the filter keeps at least this share of the rows
+ESTIMATE_FACTOR = 100  # Estimates off by more than this factor fail the check...
+ESTIMATE_MIN_ROWS = 1000  # ...when either side has at least this many rows
+
+# Repository functions with nothing worth planning
+SKIPPED = {
+    "schema_repository.get_indexes": "catalog query for the index audit",
+    "schema_repository.get_foreign_keys": "catalog query for the index audit",
+    "schema_repository.get_stats_reset": "catalog query for the index audit",
+    "schema_repository.get_id_sequence_positions": "catalog query for shard ID usage",
+    "sync_repository.begin_snapshot": "SET TRANSACTION and pg_current_snapshot(), no table access",
+    "health_repository.ping_database": "reads the health table, which database/schema doesn't create",
+}
+
+
+def _samples(db):
+    """IDs of hot and typical rows in the seeded data, used as query arguments."""
+    from sqlalchemy import text
+
+    def scalar(sql):
+        return db.execute(text(sql)).scalar()
+
+    hot_album = scalar("SELECT album_id FROM album_stats ORDER BY image_count DESC LIMIT 1")
+    typical_album = scalar("""
+        SELECT album_id FROM album_stats
+        WHERE image_count >= (SELECT AVG(image_count) FROM album_stats)
+        ORDER BY image_count, album_id LIMIT 1
+    """)
+    deleted_album = scalar("""
+        SELECT s.album_id FROM album_stats s JOIN albums a ON a.id = s.album_id
+        WHERE a.deleted_at IS NOT NULL ORDER BY s.image_count DESC LIMIT 1
+    """)
+    heavy_user = scalar("SELECT user_id FROM album_members GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1")
+    typical_user = scalar("SELECT user_id FROM album_members GROUP BY user_id HAVING COUNT(*) = 2 ORDER BY user_id LIMIT 1")
+    image_id = scalar(f"SELECT id FROM images WHERE album_id = {hot_album} ORDER BY id DESC LIMIT 1")
+    audio = db.execute(text("SELECT id, image_id FROM audio ORDER BY id DESC LIMIT 1")).fetchone()
+    max_xid = int(scalar("SELECT MAX(change_xid)::text FROM images"))
+    return {
+        "hot_album": hot_album,
+        "typical_album": typical_album,
+        "deleted_album": deleted_album,
+        "heavy_user": heavy_user,
+        "typical_user": typical_user,
+        "image_id": image_id,
+        "audio_id": audio[0],
+        "audio_image_id": audio[1],
+        "image_ids": [image_id - n for n in range(50)],
+        "known_albums": [row[0] for row in db.execute(text(
+            f"SELECT album_id FROM album_members WHERE user_id = {heavy_user}"
+        ))],
+        "recent_xid": max_xid - max_xid // 100,
+        "album_ids": list(range(1, 51)),
+        "member_ids": list(range(1, 51)),
+        "audio_ids": [audio[0] - n for n in range(50)],
+        "tombstone_ids": list(range(1, 51)),
+        "user_ids": list(range(100, 180)),
+        "timeline_before": scalar("SELECT CURRENT_TIMESTAMP - INTERVAL '365 days'"),
+        "month_day": scalar("SELECT image_month_day(CURRENT_TIMESTAMP)"),
+        "day_start": scalar("SELECT date_trunc('day', CURRENT_TIMESTAMP, 'UTC')"),
+    }
+
+
+def _cases():
+    """Case name -> callable(db, samples) exercising one repository function."""
+    from app.repositories import (
+        album_member_repository as members,
+        album_repository as albums,
+        audio_repository as audio,
+        image_repository as images,
+        sync_repository as sync,
+        upload_session_repository as uploads,
+        user_repository as users,
+    )
+
+    return {
+        "album_member_repository.add_album_member": lambda db, s: members.add_album_member(db, s["hot_album"], s["typical_user"]),
+        "album_member_repository.remove_album_member": lambda db, s: members.remove_album_member(db, s["hot_album"], s["heavy_user"]),
+        "album_member_repository.add_album_members": lambda db, s: members.add_album_members(db, s["hot_album"], s["user_ids"]),
+        "album_member_repository.remove_album_members": lambda db, s: members.remove_album_members(db, s["hot_album"], s["user_ids"]),
+        "album_member_repository.get_album_members_page": lambda db, s: members.get_album_members_page(db, s["hot_album"], 0, 50),
+        "album_member_repository.get_album_members_by_ids": lambda db, s: members.get_album_members_by_ids(db, s["member_ids"]),
+        "album_member_repository.is_album_member": lambda db, s: members.is_album_member(db, s["hot_album"], s["heavy_user"]),
+        "album_member_repository.get_album_member_ids": lambda db, s: members.get_album_member_ids(db, s["hot_album"]),
+        "album_member_repository.get_user_album_ids": lambda db, s: members.get_user_album_ids(db, s["heavy_user"]),
+        "album_member_repository.get_member_ids_by_album": lambda db, s: members.get_member_ids_by_album(db, s["album_ids"]),
+        "album_repository.create_album": lambda db, s: albums.create_album(db, "Plan check", s["typical_user"]),
+        "album_repository.get_album_by_id": lambda db, s: albums.get_album_by_id(db, s["hot_album"]),
+        "album_repository.get_albums_by_ids": lambda db, s: albums.get_albums_by_ids(db, s["album_ids"]),
+        "album_repository.update_album": lambda db, s: albums.update_album(db, s["typical_album"], "Renamed"),
+        "album_repository.delete_album": lambda db, s: albums.delete_album(db, s["typical_album"]),
+        "album_repository.get_user_albums": lambda db, s: albums.get_user_albums(db, s["heavy_user"]),
+        "album_repository.get_user_albums[typical_user]": lambda db, s: albums.get_user_albums(db, s["typical_user"]),
+        "album_repository.get_hottest_album_ids": lambda db, s: albums.get_hottest_album_ids(db, 100),
+        "album_repository.get_albums_pending_purge": lambda db, s: albums.get_albums_pending_purge(db, 10),
+        "album_repository.purge_album_images_chunk": lambda db, s: albums.purge_album_images_chunk(db, s["deleted_album"], 500),
+        "album_repository.purge_album_members_chunk": lambda db, s: albums.purge_album_members_chunk(db, s["deleted_album"], 500),
+        "album_repository.purge_album": lambda db, s: albums.purge_album(db, s["typical_album"]),
+        "audio_repository.create_audio": lambda db, s: audio.create_audio(db, s["image_id"], s["hot_album"], "https://example.com/a.mp3"),
+        "audio_repository.get_audio_by_id": lambda db, s: audio.get_audio_by_id(db, s["audio_id"]),
+        "audio_repository.get_audio_by_ids": lambda db, s: audio.get_audio_by_ids(db, s["audio_ids"]),
+        "audio_repository.get_audio_by_image_ids": lambda db, s: audio.get_audio_by_image_ids(db, s["image_ids"]),
+        "audio_repository.get_audio_by_image_id": lambda db, s: audio.get_audio_by_image_id(db, s["audio_image_id"]),
+        "audio_repository.update_audio": lambda db, s: audio.update_audio(db, s["audio_id"], "https://example.com/b.mp3"),
+        "audio_repository.delete_audio": lambda db, s: audio.delete_audio(db, s["audio_id"]),
+        "audio_repository.delete_audio_by_image_id": lambda db, s: audio.delete_audio_by_image_id(db, s["audio_image_id"]),
+        "audio_repository.get_audio_urls": lambda db, s: audio.get_audio_urls(db, 0, 1000),
+        "image_repository.create_image": lambda db, s: images.create_image(db, s["hot_album"], "https://example.com/i.jpg", s["typical_user"]),
+        "image_repository.get_image_by_id": lambda db, s: images.get_image_by_id(db, s["image_id"], s["hot_album"]),
+        "image_repository.get_image_by_id[any album]": lambda db, s: images.get_image_by_id(db, s["image_id"]),
+        "image_repository.update_image": lambda db, s: images.update_image(db, s["image_id"], s["hot_album"], caption="Updated"),
+        "image_repository.update_image_ingest": lambda db, s: images.update_image_ingest(
+            db, s["image_id"], s["hot_album"], "https://res.cloudinary.com/demo/image/upload/v1/memento/seed/images/1.jpg", "L00000fQfQfQfQfQfQfQfQfQfQfQ", 1
+        ),
+        "image_repository.get_images_without_analysis": lambda db, s: images.get_images_without_analysis(db, 0, 100),
+        "image_repository.set_image_analysis": lambda db, s: images.set_image_analysis(
+            db, [
+                {"id": image_id, "album_id": s["hot_album"], "image_url": "https://example.com/i.jpg", "placeholder": "L00000fQfQfQfQfQfQfQfQfQfQfQ", "phash": 1}
+                for image_id in s["image_ids"]
+            ]
+        ),
+        "image_repository.get_album_hashes": lambda db, s: images.get_album_hashes(db, s["hot_album"]),
+        "image_repository.get_images_by_ids": lambda db, s: images.get_images_by_ids(db, s["image_ids"], [s["hot_album"]]),
+        "image_repository.delete_image": lambda db, s: images.delete_image(db, s["image_id"], s["hot_album"]),
+        "image_repository.get_album_images": lambda db, s: images.get_album_images(db, s["hot_album"]),
+        "image_repository.get_recent_album_images": lambda db, s: images.get_recent_album_images(db, s["hot_album"], 4),
+        "image_repository.get_timeline_images": lambda db, s: images.get_timeline_images(db, s["heavy_user"], None, 51),
+        "image_repository.get_timeline_images[next page]": lambda db, s: images.get_timeline_images(
+            db, s["heavy_user"], (s["timeline_before"], s["image_id"]), 51
+        ),
+        "image_repository.get_timeline_images[typical_user]": lambda db, s: images.get_timeline_images(db, s["typical_user"], None, 51),
+        "image_repository.get_on_this_day_images": lambda db, s: images.get_on_this_day_images(
+            db, s["heavy_user"], s["month_day"], s["day_start"], 100
+        ),
+        "image_repository.get_on_this_day_images[typical_user]": lambda db, s: images.get_on_this_day_images(
+            db, s["typical_user"], s["month_day"], s["day_start"], 100
+        ),
+        "image_repository.get_on_this_day_images_by_album": lambda db, s: images.get_on_this_day_images_by_album(
+            db, s["month_day"], s["day_start"], 100
+        ),
+        "image_repository.enable_day_rollups": lambda db, s: images.enable_day_rollups(db, s["known_albums"], 2000),
+        "image_repository.get_image_histogram": lambda db, s: images.get_image_histogram(db, [s["hot_album"]], "day"),
+        "image_repository.get_image_histogram[heavy_user]": lambda db, s: images.get_image_histogram(
+            db, s["known_albums"], "month"
+        ),
+        "image_repository.get_image_media_urls": lambda db, s: images.get_image_media_urls(db, 0, 1000),
+        "sync_repository.get_pruned_xid": lambda db, s: sync.get_pruned_xid(db),
+        "sync_repository.get_user_sync_albums": lambda db, s: sync.get_user_sync_albums(db, s["heavy_user"], s["recent_xid"]),
+        "sync_repository.get_changes": lambda db, s: sync.get_changes(
+            db, s["heavy_user"], s["known_albums"], [], s["recent_xid"], (0, -1, 0), 501
+        ),
+        "sync_repository.get_changes[full]": lambda db, s: sync.get_changes(
+            db, s["typical_user"], [], [s["typical_album"]], 0, (0, -1, 0), 501
+        ),
+        "sync_repository.get_tombstones_by_ids": lambda db, s: sync.get_tombstones_by_ids(db, s["tombstone_ids"]),
+        "sync_repository.prune_tombstones": lambda db, s: sync.prune_tombstones(db, 30),
+        "upload_session_repository.create_upload_session": lambda db, s: uploads.create_upload_session(
+            db, s["typical_user"], "image", s["hot_album"], None, 1 << 20, "0" * 64, {"caption": "Plan check"}, 24
+        ),
+        "upload_session_repository.get_upload_session": lambda db, s: uploads.get_upload_session(db, 1, for_update=True),
+        "upload_session_repository.move_upload_offset": lambda db, s: uploads.move_upload_offset(db, 1, 0, 1024),
+        "upload_session_repository.set_upload_session_url": lambda db, s: uploads.set_upload_session_url(db, 1, "https://example.com/a.jpg"),
+        "upload_session_repository.complete_upload_session": lambda db, s: uploads.complete_upload_session(db, 1, s["image_id"]),
+        "upload_session_repository.delete_upload_session": lambda db, s: uploads.delete_upload_session(db, 1),
+        "upload_session_repository.delete_expired_upload_sessions": lambda db, s: uploads.delete_expired_upload_sessions(db, 1000),
+        "upload_session_repository.get_existing_upload_session_ids": lambda db, s: uploads.get_existing_upload_session_ids(db, s["audio_ids"]),
+        "upload_session_repository.get_upload_session_urls": lambda db, s: uploads.get_upload_session_urls(db, 0, 5000),
+        "user_repository.create_user": lambda db, s: users.create_user(db, "plan-check@example.com", "x", "Plan Check"),
+        "user_repository.get_user_by_email": lambda db, s: users.get_user_by_email(db, "seed42@example.com"),
+        "user_repository.get_user_by_id": lambda db, s: users.get_user_by_id(db, s["typical_user"]),
+        "user_repository.get_user_names": lambda db, s: users.get_user_names(db, s["user_ids"]),
+    }
+
+
+def _repository_functions():
+    """Every public repository function, as "module.function"."""
+    import app.repositories as package
+    names = set()
+    for path in sorted(Path(package.__file__).parent.glob("*_repository.py")):
+        module = __import__(f"app.repositories.{path.stem}", fromlist=["_"])
+        for name, member in inspect.getmembers(module):
+            if name.startswith("_") or getattr(member, "__module__", None) != module.__name__:
+                continue
+            if inspect.isfunction(member):
+                names.add(f"{path.stem}.{name}")
+            elif inspect.isclass(member):
+                names.update(
+                    f"{path.stem}.{method}" for method, _ in inspect.getmembers(member, inspect.isfunction)
+                    if not method.startswith("_")
+                )
+    return names
+
+
+def _prepare_database(scale: int) -> None:
+    from sqlalchemy import text
+    from app.config.db import engine
+    from app.jobs.migrate import migrate
+
+    migrate()
+    with engine.connect() as connection:
+        seeded = connection.execute(text("SELECT to_regclass('query_plan_seed') IS NOT NULL")).scalar()
+        if seeded:
+            return
+        if connection.execute(text("SELECT EXISTS (SELECT 1 FROM users)")).scalar():
+            sys.exit("Refusing to seed a database that already has users; use an empty scratch database")
+
+    print(f"Seeding (scale {scale})...")
+    started = time.monotonic()
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("SELECT set_config('seed.scale', %s, false)", (str(scale),))
+        cursor.execute(SEED_FILE.read_text())
+        raw.commit()
+        raw.driver_connection.autocommit = True
+        cursor.execute("VACUUM ANALYZE")
+    finally:
+        raw.driver_connection.autocommit = False
+        raw.close()
+    print(f"Seeded in {time.monotonic() - started:.1f}s")
+
+
+def _capture_statements(case, db, samples):
+    """Run a case in a rolled-back transaction and return the (statement, parameters) it executed."""
+    from sqlalchemy import event
+    from app.config.db import engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        case(db, samples)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        db.rollback()
+    return statements
+
+
+def _explain(statement, parameters):
+    from app.config.db import engine
+
+    # executemany batches share one statement; the first parameter set stands for all
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], dict):
+        parameters = parameters[0]
+
+    raw = engine.raw_connection()
+    try:
+        # ANALYZE really runs writes; they must stay inside the rolled-back transaction
+        raw.driver_connection.autocommit = False
+        cursor = raw.cursor()
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        return cursor.fetchone()[0][0]["Plan"]
+    finally:
+        raw.rollback()
+        raw.close()
+
+
+def _walk(plan, depth=0, stops_early=False):
+    # Below a Limit, or in an InitPlan/SubPlan such as EXISTS, execution stops early
+    stops_early = stops_early or plan.get("Parent Relationship") in ("InitPlan", "SubPlan")
+    yield plan, depth, stops_early
+    for child in plan.get("Plans", []):
+        yield from _walk(child, depth + 1, stops_early or plan["Node Type"] == "Limit")
+
+
+def _shape(plan) -> str:
+    """
+    Plan tree without costs, timings or row counts. Partitions that run-time
+    pruning skipped in an Append run once are counted instead of listed.
+    """
+    lines, pruned, parents, skip_depth = [], {}, {}, None  # parents: depth -> (line, node)
+    for node, depth, stops_early in _walk(plan):
+        if skip_depth is not None and depth > skip_depth:
+            continue
+        skip_depth = None
+        parent_line, parent = parents.get(depth - 1, (None, {}))
+        if (node.get("Parent Relationship") == "Member" and node.get("Actual Loops") == 0
+                and parent.get("Actual Loops") == 1 and not stops_early):
+            pruned[parent_line] = pruned.get(parent_line, 0) + 1
+            skip_depth = depth
+            continue
+        parts = [node["Node Type"]]
+        for key, label in (("Join Type", ""), ("Strategy", ""), ("Index Name", "using "),
+                           ("Relation Name", "on "), ("Parent Relationship", "as ")):
+            if node.get(key) and node[key] not in ("Outer", "Plain"):
+                parts.append(f"{label}{node[key]}")
+        parents[depth] = (len(lines), node)
+        lines.append("  " * depth + " ".join(parts))
+    for line, count in pruned.items():
+        lines[line] += f" ({count} pruned)"
+    return "\n".join(lines)
+
+
+def _problems(plan, table_rows):
+    problems = []
+    for node, _, stops_early in _walk(plan):
+        relation = node.get("Relation Name")
+        if node["Node Type"] == "Seq Scan" and table_rows.get(relation, 0) > LARGE_TABLE_ROWS:
+            # Keeping a large share of the rows, e.g. a hot album filling its partition, beats an index
+            kept, removed = node.get("Actual Rows", 0), node.get("Rows Removed by Filter")
+            if removed is None or kept < SEQ_SCAN_MIN_KEPT * (kept + removed):
+                problems.append(f"sequential scan of {relation} ({table_rows[relation]:.0f} rows)")
+        if node.get("Sort Space Type") == "Disk":
+            problems.append(f"sort spilled to disk ({node.get('Sort Space Used')} kB)")
+        # Nodes that stop early are expected to return fewer rows than estimated
+        if stops_early or node.get("Actual Loops", 0) == 0:
+            continue
+        estimated, actual = node["Plan Rows"], node["Actual Rows"]
+        if max(estimated, actual) >= ESTIMATE_MIN_ROWS and max(estimated, actual) > ESTIMATE_FACTOR * max(min(estimated, actual), 1):
+            problems.append(f"{node['Node Type']} on {relation or '-'} estimated {estimated} rows, got {actual}")
+    return problems
+
+
+def run(scale: int, update: bool, keyword: str) -> int:
+    from sqlalchemy import text
+    from app.config.db import SessionLocal
+
+    _prepare_database(scale)
+    cases = _cases()
+    missing = _repository_functions() - {name.split("[")[0] for name in cases} - set(SKIPPED)
+    failures = [f"{name}: no plan case (add one to _cases or SKIPPED)" for name in sorted(missing)]
+
+    db = SessionLocal()
+    try:
+        samples = _samples(db)
+        table_rows = dict(db.execute(text(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p') AND relnamespace = 'public'::regnamespace"
+        )).fetchall())
+
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        for name, case in cases.items():
+            if keyword and keyword not in name:
+                continue
+            shapes = []
+            try:
+                statements = _capture_statements(case, db, samples)
+                for number, (statement, parameters) in enumerate(statements, 1):
+                    plan = _explain(statement, parameters)
+                    shapes.append(f"-- statement {number}\n{_shape(plan)}")
+                    failures += [f"{name} (statement {number}): {problem}" for problem in _problems(plan, table_rows)]
+            except Exception as error:
+                failures.append(f"{name}: {type(error).__name__}: {error}")
+                continue
+
+            snapshot = "\n".join(shapes) + "\n"
+            path = SNAPSHOT_DIR / f"{name}.plan"
+            if update or not path.exists():
+                path.write_text(snapshot)
+            elif path.read_text() != snapshot:
+                diff = "".join(difflib.unified_diff(
+                    path.read_text().splitlines(True), snapshot.splitlines(True), "snapshot", "current"
+                ))
+                failures.append(f"{name}: plan changed (rerun with --update if intended)\n{diff}")
+    finally:
+        db.close()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(cases)} cases, {len(failures)} failures")
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check repository query plans against seeded data")
+    parser.add_argument("--scale", type=int, default=1, help="Seed size multiplier (first run only)")
+    parser.add_argument("--update", action="store_true", help="Rewrite plan snapshots instead of comparing")
+    parser.add_argument("-k", dest="keyword", default="", help="Only run cases whose name contains this")
+    args = parser.parse_args()
+
+    if not PLAN_DATABASE_URL:
+        sys.exit("Set QUERY_PLAN_DATABASE_URL to a scratch database")
+    sys.path.insert(0, str(SERVER_DIR))
+    sys.exit(run(args.scale, args.update, args.keyword))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+End-to-end checks for album sharding against several local Postgres databases.
+
+Runs the API in-process (FastAPI TestClient) with the first database as
+shard 0, which also holds users, and the others as further album shards,
+then checks that:
+- new albums are spread over every shard and their rows, members, images
+  and audio are stored only on that shard
+- album, image and audio IDs route to the right shard
+- a user's album list merges every shard, newest first
+- memberships reference users from the primary database
+- paged sync walks every shard and an incremental sync sees later changes
+- deleted albums are purged on their own shard
+
+Usage (from the server directory, against scratch databases that the script
+migrates on first use):
+
+    SHARD_TEST_DATABASE_URLS=postgresql+psycopg2://postgres@localhost/memento_s0,postgresql+psycopg2://postgres@localhost/memento_s1 \\
+        python test_shards.py
+
+Rows are never cleaned up, so never point this at databases you care about.
+"""
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+SHARD_DATABASE_URLS = [url.strip() for url in os.environ.get("SHARD_TEST_DATABASE_URLS", "").split(",") if url.strip()]
+if len(SHARD_DATABASE_URLS) >= 2:
+    # Must happen before app modules build their engines from the settings
+    os.environ["DATABASE_URL"] = SHARD_DATABASE_URLS[0]
+    os.environ["DATABASE_SHARD_URLS"] = ",".join(SHARD_DATABASE_URLS[1:])
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+
+def _count(shard: int, query: str, **params) -> int:
+    from sqlalchemy import text
+    from app.config.db import shard_engines
+
+    with shard_engines[shard].connect() as connection:
+        return connection.execute(text(query), params).scalar()
+
+
+def _register(client) -> tuple:
+    email = f"shards-{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post("/auth/register", json={"email": email, "password": "shard-test", "name": f"Shard {email[7:11]}"})
+    assert response.status_code == 201, response.text
+    token = client.post("/auth/login", json={"email": email, "password": "shard-test"}).json()["access_token"]
+    return response.json(), {"Authorization": f"Bearer {token}"}
+
+
+def _check_placement(client, owner_headers, member, shard_count: int) -> list:
+    from app.config.db import shard_router
+
+    albums = []
+    for number in range(2 * shard_count):
+        response = client.post("/albums", json={"name": f"Sharded {number}"}, headers=owner_headers)
+        assert response.status_code == 201, response.text
+        albums.append(response.json())
+
+    shards = {shard_router.shard_for_id(album["id"]) for album in albums}
+    assert shards == set(range(shard_count)), f"albums landed on shards {shards}"
+
+    for album in albums:
+        shard = shard_router.shard_for_id(album["id"])
+        for other in range(shard_count):
+            expected = 1 if other == shard else 0
+            stored = _count(other, "SELECT COUNT(*) FROM albums WHERE id = :id", id=album["id"])
+            assert stored == expected, f"album {album['id']} stored {stored} times on shard {other}"
+
+        response = client.post(f"/albums/{album['id']}/members", json={"user_id": member["id"]}, headers=owner_headers)
+        assert response.status_code == 201, response.text
+        assert shard_router.shard_for_id(response.json()["id"]) == shard
+    print(f"   ok: {len(albums)} albums over {shard_count} shards")
+    return albums
+
+
+def _check_members(client, album, owner_headers, member_headers, member) -> None:
+    response = client.post(f"/albums/{album['id']}/members", json={"user_id": 2_000_000_000}, headers=owner_headers)
+    assert response.status_code == 404, response.text
+
+    response = client.post(
+        f"/albums/{album['id']}/members/bulk", json={"add": [member["id"], 2_000_000_000], "remove": []}, headers=owner_headers
+    )
+    assert response.status_code == 200 and response.json()["added"] == [], response.text
+
+    page = client.get(f"/albums/{album['id']}/members", headers=member_headers).json()
+    names = {entry["user_id"]: entry["name"] for entry in page["members"]}
+    assert names.get(member["id"]) == member["name"], page
+    print("   ok: memberships use the global users table")
+
+
+def _check_media(client, album, owner, owner_headers, member_headers) -> int:
+    from app.config.db import shard_router
+
+    shard = shard_router.shard_for_id(album["id"])
+    url = f"https://res.cloudinary.com/demo/image/upload/v1/memento/user_{owner['id']}/images/shard.jpg"
+    response = client.post("/images", json={"album_id": album["id"], "image_url": url}, headers=owner_headers)
+    assert response.status_code == 201, response.text
+    image_id = response.json()["id"]
+    assert shard_router.shard_for_id(image_id) == shard
+
+    audio_url = f"https://res.cloudinary.com/demo/raw/upload/v1/memento/user_{owner['id']}/audio/shard.mp3"
+    response = client.post("/audio", json={"image_id": image_id, "url": audio_url}, headers=owner_headers)
+    assert response.status_code == 201, response.text
+    audio_id = response.json()["id"]
+    assert shard_router.shard_for_id(audio_id) == shard
+
+    assert client.get(f"/images/{image_id}", headers=member_headers).status_code == 200
+    assert client.get(f"/audio/{audio_id}", headers=member_headers).status_code == 200
+    assert client.get(f"/audio/image/{image_id}", headers=member_headers).status_code == 200
+    assert len(client.get(f"/images/album/{album['id']}", headers=member_headers).json()) == 1
+    assert _count(shard, "SELECT COUNT(*) FROM audio WHERE id = :id", id=audio_id) == 1
+    print(f"   ok: image {image_id} and audio {audio_id} on shard {shard}")
+    return image_id
+
+
+def _check_listing(client, albums, member_headers) -> None:
+    listed = client.get("/albums", headers=member_headers).json()
+    assert {album["id"] for album in listed} == {album["id"] for album in albums}, listed
+    created = [datetime.fromisoformat(album["created_at"]) for album in listed]
+    assert created == sorted(created, reverse=True), "album list is not newest first"
+    print(f"   ok: album list merges {len(listed)} albums newest first")
+
+
+def _sync_all(client, headers, cursor=None, limit=2) -> tuple:
+    pages, albums, images, deleted = 0, set(), set(), []
+    while True:
+        params = {"limit": limit, **({"since": cursor} if cursor else {})}
+        response = client.get("/sync", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages += 1
+        albums |= {album["id"] for album in page.get("albums", [])}
+        images |= {image["id"] for image in page.get("images", [])}
+        deleted += page.get("deleted", [])
+        cursor = page["cursor"]
+        if not page.get("has_more"):
+            return cursor, pages, albums, images, deleted
+        assert pages < 1000, "sync does not terminate"
+
+
+def _check_sync(client, albums, image_id, owner_headers, member_headers, shard_count: int) -> None:
+    cursor, pages, synced_albums, synced_images, _ = _sync_all(client, member_headers)
+    assert synced_albums == {album["id"] for album in albums}, synced_albums
+    assert image_id in synced_images
+    assert len(cursor.split("~")) == shard_count, cursor
+    print(f"   ok: full sync of every shard in {pages} pages")
+
+    # Changes on the last album's shard after the cursor
+    album = albums[-1]
+    url = "https://res.cloudinary.com/demo/image/upload/v1/memento/shard/late.jpg"
+    late_image = client.post("/images", json={"album_id": album["id"], "image_url": url}, headers=owner_headers).json()["id"]
+    assert client.delete(f"/images/{image_id}", headers=owner_headers).status_code == 204
+
+    _, _, _, synced_images, deleted = _sync_all(client, member_headers, cursor, limit=500)
+    assert late_image in synced_images, synced_images
+    assert any(tombstone["entity"] == "image" and tombstone["id"] == image_id for tombstone in deleted), deleted
+    print("   ok: incremental sync sees changes on every shard")
+
+
+def _check_purge(client, album, owner_headers) -> None:
+    from app.config.db import shard_router
+    from app.services import album_purge_service
+
+    assert client.delete(f"/albums/{album['id']}", headers=owner_headers).status_code == 204
+    album_purge_service.purge_pending_albums()
+    shard = shard_router.shard_for_id(album["id"])
+    assert _count(shard, "SELECT COUNT(*) FROM albums WHERE id = :id", id=album["id"]) == 0
+    assert client.get(f"/albums/{album['id']}", headers=owner_headers).status_code == 404
+    print(f"   ok: album {album['id']} purged on shard {shard}")
+
+
+def run() -> int:
+    from fastapi.testclient import TestClient
+    from app.config.db import shard_router
+    from app.jobs.migrate import migrate
+    from app.main import app
+
+    migrate()
+    shard_count = shard_router.count
+
+    with TestClient(app) as client:
+        owner, owner_headers = _register(client)
+        member, member_headers = _register(client)
+
+        print("1. Album placement")
+        albums = _check_placement(client, owner_headers, member, shard_count)
+        print("2. Members")
+        _check_members(client, albums[1], owner_headers, member_headers, member)
+        print("3. Images and audio")
+        image_id = _check_media(client, albums[1], owner, owner_headers, member_headers)
+        print("4. Album list")
+        _check_listing(client, albums, member_headers)
+        print("5. Sync")
+        _check_sync(client, albums, image_id, owner_headers, member_headers, shard_count)
+        print("6. Purge")
+        _check_purge(client, albums[-1], owner_headers)
+
+    print(f"All shard checks passed on {shard_count} databases")
+    return 0
+
+
+def main() -> None:
+    if len(SHARD_DATABASE_URLS) < 2:
+        sys.exit("Set SHARD_TEST_DATABASE_URLS to two or more comma-separated scratch databases")
+    sys.path.insert(0, str(SERVER_DIR))
+    sys.exit(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Checks for resumable uploads (app.services.upload_session_service) against a
+local Postgres database, with local media storage and a temporary staging
+directory:
+- PATCH only accepts the upload's current offset (409 with the right one)
+- a body that doesn't match its Upload-Checksum isn't counted (460)
+- bytes received before a dropped connection are kept, unless the body
+  carried a checksum
+- a body past the declared length is refused (413)
+- complete refuses unfinished uploads, checks the whole file's SHA-256 and
+  returns the same record when repeated, also concurrently
+- pruning removes part files whose session is gone
+
+Usage (from the server directory, against a scratch database that the script
+migrates on first use):
+
+    UPLOAD_TEST_DATABASE_URL=postgresql+psycopg2://postgres@localhost/memento_uploads python test_upload_sessions.py
+
+Rows are never cleaned up, so never point this at a database you care about.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import sys
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DATABASE_URL = os.environ.get("UPLOAD_TEST_DATABASE_URL", "")
+MEDIA_DIR = Path(tempfile.mkdtemp(prefix="memento-media-"))
+if DATABASE_URL:
+    # Must happen before app modules build their engines and storage from the settings
+    os.environ["DATABASE_URL"] = DATABASE_URL
+    os.environ["DATABASE_SHARD_URLS"] = ""
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["LOCAL_STORAGE_PATH"] = str(MEDIA_DIR)
+    os.environ["UPLOAD_STAGING_PATH"] = str(MEDIA_DIR / ".uploads")
+    os.environ["PUBLIC_BASE_URL"] = "http://testserver"
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+# A JPEG signature, so local storage names the file .jpg
+PHOTO = b"\xff\xd8\xff\xe0" + os.urandom(300_000)
+
+
+def _register(client) -> tuple:
+    email = f"uploads-{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post("/auth/register", json={"email": email, "password": "upload-test", "name": "Uploader"})
+    assert response.status_code == 201, response.text
+    token = client.post("/auth/login", json={"email": email, "password": "upload-test"}).json()["access_token"]
+    return response.json(), {"Authorization": f"Bearer {token}"}
+
+
+def _start(client, headers, album_id: int, data: bytes, sha256: str = None) -> int:
+    response = client.post("/upload/sessions", json={
+        "kind": "image",
+        "length": len(data),
+        "sha256": sha256 or hashlib.sha256(data).hexdigest(),
+        "album_id": album_id
+    }, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _patch(client, headers, upload_id: int, offset: int, body: bytes, checksum: bytes = None):
+    patch_headers = {**headers, "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"}
+    if checksum is not None:
+        patch_headers["Upload-Checksum"] = "sha256 " + base64.b64encode(checksum).decode()
+    return client.patch(f"/upload/sessions/{upload_id}", content=body, headers=patch_headers)
+
+
+def _offset(client, headers, upload_id: int) -> int:
+    response = client.head(f"/upload/sessions/{upload_id}", headers=headers)
+    assert response.status_code == 200, response.status_code
+    return int(response.headers["Upload-Offset"])
+
+
+def _append_then_drop(upload_id: int, user_id: int, offset: int, body: bytes, checksum: str = None) -> None:
+    """Call append with a body that breaks off after body, like a dropped connection."""
+    from app.config.db import SessionLocal
+    from app.services import upload_session_service
+
+    async def chunks():
+        yield body
+        raise ConnectionResetError("client went away")
+
+    db = SessionLocal()
+    try:
+        asyncio.run(upload_session_service.append(db, upload_id, user_id, offset, chunks(), checksum))
+    except ConnectionResetError:
+        pass
+    else:
+        raise AssertionError("append swallowed the broken body")
+    finally:
+        db.close()
+
+
+def _check_append(client, user, headers, album_id: int) -> int:
+    upload_id = _start(client, headers, album_id, PHOTO)
+
+    first = PHOTO[:100_000]
+    response = _patch(client, headers, upload_id, 0, first, hashlib.sha256(b"something else").digest())
+    assert response.status_code == 460, response.status_code
+    assert _offset(client, headers, upload_id) == 0
+    print("   ok: a body that fails its Upload-Checksum isn't counted")
+
+    response = _patch(client, headers, upload_id, 0, first, hashlib.sha256(first).digest())
+    assert response.status_code == 204, response.text
+    assert response.headers["Upload-Offset"] == "100000"
+
+    response = _patch(client, headers, upload_id, 0, first)
+    assert response.status_code == 409, response.status_code
+    assert response.headers["Upload-Offset"] == "100000"
+    print("   ok: a stale Upload-Offset gets 409 with the current offset")
+
+    dropped = PHOTO[100_000:150_000]
+    _append_then_drop(upload_id, user["id"], 100_000, dropped, "sha256 " + base64.b64encode(hashlib.sha256(dropped).digest()).decode())
+    assert _offset(client, headers, upload_id) == 100_000
+    _append_then_drop(upload_id, user["id"], 100_000, dropped)
+    assert _offset(client, headers, upload_id) == 150_000
+    print("   ok: bytes before a dropped connection are kept unless the body had a checksum")
+
+    response = _patch(client, headers, upload_id, 150_000, PHOTO[150_000:] + b"extra")
+    assert response.status_code == 413, response.status_code
+    assert _offset(client, headers, upload_id) == 150_000
+    print("   ok: a body past the declared length is refused")
+    return upload_id
+
+
+def _check_complete(client, headers, album_id: int, upload_id: int) -> None:
+    from app.services.upload_session_service import _part_path
+
+    response = client.post(f"/upload/sessions/{upload_id}/complete", headers=headers)
+    assert response.status_code == 409, response.status_code
+    print("   ok: an unfinished upload can't be completed")
+
+    response = _patch(client, headers, upload_id, 150_000, PHOTO[150_000:])
+    assert response.status_code == 204, response.text
+
+    def complete(_):
+        return client.post(f"/upload/sessions/{upload_id}/complete", headers=headers)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        responses = list(pool.map(complete, range(3)))
+    assert all(response.status_code == 200 for response in responses), [r.text for r in responses]
+    image_ids = {response.json()["image"]["id"] for response in responses}
+    assert len(image_ids) == 1, image_ids
+    assert complete(None).json()["image"]["id"] in image_ids
+    print("   ok: repeated and concurrent completes return one record")
+
+    image = responses[0].json()["image"]
+    stored = client.get("/media/" + image["image_url"].rsplit("/", 1)[1])
+    assert stored.status_code == 200 and stored.content == PHOTO
+    assert not _part_path(upload_id).exists()
+    assert not list(_part_path(upload_id).parent.glob(f"{upload_id}.*.claim"))
+    print("   ok: the verified file is in media storage and its part and claim files are gone")
+
+    other = os.urandom(1000)
+    upload_id = _start(client, headers, album_id, other, sha256=hashlib.sha256(b"not this").hexdigest())
+    assert _patch(client, headers, upload_id, 0, other).status_code == 204
+    response = client.post(f"/upload/sessions/{upload_id}/complete", headers=headers)
+    assert response.status_code == 460, response.status_code
+    assert _offset(client, headers, upload_id) == 0
+    print("   ok: a file that doesn't match its SHA-256 starts over from offset 0")
+
+
+def _check_orphans(client, headers, album_id: int) -> None:
+    from sqlalchemy import text
+    from app.config.db import engine
+    from app.services import upload_session_service
+    from app.services.upload_session_service import _part_path
+    from app.config.db import SessionLocal
+
+    orphan = _start(client, headers, album_id, b"orphan")
+    fresh_orphan = _start(client, headers, album_id, b"fresh orphan")
+    live = _start(client, headers, album_id, b"live")
+    with engine.begin() as connection:
+        # As the album_id cascade does when an album is deleted
+        connection.execute(text("DELETE FROM upload_sessions WHERE id IN (:orphan, :fresh)"), {"orphan": orphan, "fresh": fresh_orphan})
+    for upload_id in (orphan, live):
+        os.utime(_part_path(upload_id), (0, 0))
+    # A completion in progress links the part file; the link keeps its old mtime
+    claim = _part_path(live).with_suffix(".0.claim")
+    os.link(_part_path(live), claim)
+
+    db = SessionLocal()
+    try:
+        upload_session_service.delete_orphaned_parts(db, 0)
+    finally:
+        db.close()
+    assert not _part_path(orphan).exists()
+    assert _part_path(fresh_orphan).exists() and _part_path(live).exists() and claim.exists()
+    claim.unlink()
+    print("   ok: pruning removes old part files whose session is gone, not a completion's fresh claim")
+
+
+def run() -> int:
+    from fastapi.testclient import TestClient
+    from app.jobs.migrate import migrate
+    from app.main import app
+
+    migrate()
+
+    with TestClient(app) as client:
+        user, headers = _register(client)
+        response = client.post("/albums", json={"name": "Resumable uploads"}, headers=headers)
+        assert response.status_code == 201, response.text
+        album_id = response.json()["id"]
+
+        print("1. Append")
+        upload_id = _check_append(client, user, headers, album_id)
+        print("2. Complete")
+        _check_complete(client, headers, album_id, upload_id)
+        print("3. Orphaned part files")
+        _check_orphans(client, headers, album_id)
+
+    print("All upload session checks passed")
+    return 0
+
+
+def main() -> None:
+    if not DATABASE_URL:
+        sys.exit("Set UPLOAD_TEST_DATABASE_URL to a scratch database")
+    sys.path.insert(0, str(SERVER_DIR))
+    sys.exit(run())
+
+
+if __name__ == "__main__":
+    main()